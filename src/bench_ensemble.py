@@ -0,0 +1,50 @@
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+from mdn_class import MDN_reg_class
+from mdn_ensemble import MDN_ensemble_class
+
+# Train-step throughput: M separate MDN_reg_class models versus one MDN_ensemble_class
+def bench_sequential(_n_model,_x,_y,_k,_hids,_n_step):
+    tf.reset_default_graph()
+    sess = tf.Session()
+    Ms = [MDN_reg_class(_name='mdn_%d'%(m),_x_dim=_x.shape[1],_y_dim=_y.shape[1],_k=_k,_hids=_hids,
+                        _sig_max=1.0,_VECTORIZED=True,_sess=sess,_VERBOSE=False) for m in range(_n_model)]
+    for M in Ms:
+        sess.run(M.optm,feed_dict={M.x:_x,M.y:_y,M.sig_rate:1.0})
+    t_start = time.time()
+    for _ in range(_n_step):
+        for M in Ms:
+            sess.run(M.optm,feed_dict={M.x:_x,M.y:_y,M.sig_rate:1.0})
+    sess.close()
+    return (time.time()-t_start)/_n_step
+
+def bench_ensemble(_n_model,_x,_y,_k,_hids,_n_step):
+    tf.reset_default_graph()
+    sess = tf.Session()
+    E = MDN_ensemble_class(_n_model=_n_model,_x_dim=_x.shape[1],_y_dim=_y.shape[1],_k=_k,_hids=_hids,
+                           _sig_max=1.0,_sess=sess,_VERBOSE=False)
+    feeds = {E.x:_x,E.y:_y,E.sig_rate:1.0}
+    sess.run(E.optm,feed_dict=feeds)
+    t_start = time.time()
+    for _ in range(_n_step):
+        sess.run(E.optm,feed_dict=feeds)
+    sess.close()
+    return (time.time()-t_start)/_n_step
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_models',type=int,nargs='+',default=[1,4,8,16,32])
+    parser.add_argument('--k',type=int,default=20)
+    parser.add_argument('--hids',type=int,nargs='+',default=[128,128])
+    parser.add_argument('--batch_size',type=int,default=256)
+    parser.add_argument('--n_step',type=int,default=100)
+    args = parser.parse_args()
+    x = np.random.randn(args.batch_size,1).astype(np.float32)
+    y = np.random.randn(args.batch_size,2).astype(np.float32)
+    print ("%4s | %14s %14s %8s"%('M','sequential[ms]','ensemble[ms]','speedup'))
+    for n_model in args.n_models:
+        t_seq = bench_sequential(n_model,x,y,args.k,args.hids,args.n_step)
+        t_ens = bench_ensemble(n_model,x,y,args.k,args.hids,args.n_step)
+        print ("%4d | %14.2f %14.2f %7.1fx"%(n_model,1e3*t_seq,1e3*t_ens,t_seq/t_ens))
@@ -0,0 +1,34 @@
+import sys
+import argparse
+import subprocess
+
+# Import time of the core modules in a fresh interpreter, and whether a GUI/plotting stack got pulled in
+CODE = """
+import sys,time
+t_start = time.time()
+import %s
+print ('%%.4f %%d'%%(time.time()-t_start,int('matplotlib' in sys.modules)))
+"""
+
+def bench_import(_module,_n_rep=5):
+    times,mpl = [],False
+    for _ in range(_n_rep):
+        out = subprocess.check_output([sys.executable,'-c',CODE%(_module)]).decode().split()
+        times.append(float(out[0]))
+        mpl = mpl or (out[1] == '1')
+    return min(times),mpl
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modules',nargs='+',
+                        default=['util','mdn_np','mog_em','data_pipeline','mdn_class','mog_class'])
+    parser.add_argument('--n_rep',type=int,default=5)
+    parser.add_argument('--budget',type=float,default=None,help='fail if any import takes longer [sec]')
+    args = parser.parse_args()
+    FAIL = False
+    for module in args.modules:
+        t,mpl = bench_import(module,_n_rep=args.n_rep)
+        print ("%15s: %7.1fms %s"%(module,1e3*t,'(matplotlib imported!)' if mpl else ''))
+        if mpl or ((args.budget is not None) and (t > args.budget)):
+            FAIL = True
+    sys.exit(1 if FAIL else 0)
@@ -0,0 +1,52 @@
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from data_pipeline import batch_loader_class
+
+# Batches/sec of the old per-step permutation versus the epoch-based loader
+def bench_permutation(_x,_y,_batch_size,_n_step):
+    n_train = _x.shape[0]
+    t_start = time.time()
+    for _ in range(_n_step):
+        r_idx = np.random.permutation(n_train)[:_batch_size]
+        x_batch,y_batch = _x[r_idx,:],_y[r_idx,:]
+    return _n_step/(time.time()-t_start)
+
+def bench_loader(_x,_y,_batch_size,_n_step,**kwargs):
+    loader = batch_loader_class([_x,_y],_batch_size=_batch_size,**kwargs)
+    loader.next_batch() # warm up the producer
+    t_start = time.time()
+    for _ in range(_n_step):
+        x_batch,y_batch = loader.next_batch()
+    rate = _n_step/(time.time()-t_start)
+    loader.close()
+    return rate
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ns',type=int,nargs='+',default=[100000,1000000,4000000])
+    parser.add_argument('--x_dim',type=int,default=1)
+    parser.add_argument('--y_dim',type=int,default=2)
+    parser.add_argument('--batch_size',type=int,default=256)
+    parser.add_argument('--n_step',type=int,default=2000)
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp()
+    print ("%9s | %12s %12s %12s %12s %12s [batches/sec]"%
+           ('n_train','permutation','epoch','prefetch','mmap','mmap-block'))
+    for n in args.ns:
+        x = np.random.randn(n,args.x_dim).astype(np.float32)
+        y = np.random.randn(n,args.y_dim).astype(np.float32)
+        x_path,y_path = os.path.join(tmp_dir,'x.npy'),os.path.join(tmp_dir,'y.npy')
+        np.save(x_path,x); np.save(y_path,y)
+        n_step = args.n_step
+        rates = [bench_permutation(x,y,args.batch_size,n_step),
+                 bench_loader(x,y,args.batch_size,n_step,_n_prefetch=0),
+                 bench_loader(x,y,args.batch_size,n_step,_n_prefetch=4),
+                 bench_loader(x_path,y_path,args.batch_size,n_step,_n_prefetch=4),
+                 bench_loader(x_path,y_path,args.batch_size,n_step,_n_prefetch=4,
+                              _block_size=64*args.batch_size)]
+        print ("%9d | %12.0f %12.0f %12.0f %12.0f %12.0f"%((n,)+tuple(rates)))
+        os.remove(x_path); os.remove(y_path)
+    os.rmdir(tmp_dir)
@@ -0,0 +1,46 @@
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+from mdn_class import MDN_reg_class,MDN_reg_indep_class,compare_heads
+
+# Compare the tfd.Mixture head with the vectorized head over the number of mixtures
+def bench_head(_cls,_k,_VECTORIZED,_x_dim=1,_y_dim=2,_hids=[128,128],
+               _batch_size=256,_n_step=200,_n_warmup=10,_seed=0):
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.set_random_seed(_seed)
+        sess = tf.Session(graph=graph)
+        t_start = time.time()
+        M = _cls(_name='mdn',_x_dim=_x_dim,_y_dim=_y_dim,_k=_k,_hids=_hids,
+                 _sig_max=1.0,_VECTORIZED=_VECTORIZED,_sess=sess,_VERBOSE=False)
+        build_time = time.time()-t_start
+        n_op = len(graph.get_operations())
+        np.random.seed(_seed)
+        x_batch = np.random.randn(_batch_size,_x_dim).astype(np.float32)
+        y_batch = np.random.randn(_batch_size,_y_dim).astype(np.float32)
+        feeds = {M.x:x_batch,M.y:y_batch,M.sig_rate:1.0}
+        for _ in range(_n_warmup):
+            sess.run(M.optm,feed_dict=feeds)
+        t_start = time.time()
+        for _ in range(_n_step):
+            sess.run(M.optm,feed_dict=feeds)
+        step_time = (time.time()-t_start)/_n_step
+        sess.close()
+    return build_time,step_time,n_op
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ks',type=int,nargs='+',default=[5,10,20,50,100,200,512])
+    parser.add_argument('--n_step',type=int,default=200)
+    parser.add_argument('--batch_size',type=int,default=256)
+    args = parser.parse_args()
+    for cls in [MDN_reg_class,MDN_reg_indep_class]:
+        print ("==== %s ===="%(cls.__name__))
+        errs = compare_heads(cls,_k=20)
+        print ("  max abs diff (k=20) log_liks:%.2e EVs:%.2e VEs:%.2e"%tuple(errs))
+        print ("  %5s | %22s | %22s | %17s"%('k','build [s] mix/vec','step [ms] mix/vec','#ops mix/vec'))
+        for k in args.ks:
+            b0,s0,o0 = bench_head(cls,k,False,_batch_size=args.batch_size,_n_step=args.n_step)
+            b1,s1,o1 = bench_head(cls,k,True,_batch_size=args.batch_size,_n_step=args.n_step)
+            print ("  %5d | %10.3f %10.3f | %10.3f %10.3f | %8d %8d"%(k,b0,b1,1e3*s0,1e3*s1,o0,o1))
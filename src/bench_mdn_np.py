@@ -0,0 +1,57 @@
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+import tensorflow as tf
+from mdn_class import MDN_reg_class,MDN_reg_indep_class
+from mdn_np import MDN_np_class
+
+# Check that the NumPy engine matches the session path and compare their latencies
+def check_mdn_np(_cls,_x_dim=1,_y_dim=2,_k=20,_hids=[128,128],_n=10000,_n_rep=10,_seed=0):
+    tf.reset_default_graph()
+    tf.set_random_seed(_seed)
+    np.random.seed(_seed)
+    sess = tf.Session()
+    M = _cls(_name='mdn',_x_dim=_x_dim,_y_dim=_y_dim,_k=_k,_hids=_hids,
+             _sig_max=1.0,_sess=sess,_VERBOSE=False)
+    # Perturb the weights so that the comparison is not trivially near zero
+    for var in M.c_vars:
+        var.load(sess.run(var)+0.3*np.random.randn(*var.get_shape().as_list()),sess)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir,'mdn_np_check.npz')
+        M.export_params(_path=path)
+        t_start = time.time()
+        M_np = MDN_np_class.load(path)
+        load_time = time.time()-t_start
+    x = np.random.randn(_n,_x_dim).astype(np.float32)
+    y = np.random.randn(_n,_y_dim).astype(np.float32)
+    feeds = {M.x:x,M.y:y,M.sig_rate:1.0}
+    pi,mu,var,EVs,VEs,log_liks = sess.run([M.pi,M.mu,M.var,M.EVs,M.VEs,M.log_liks],feed_dict=feeds)
+    pi_np,mu_np,var_np = M_np.forward(x)
+    EVs_np,VEs_np = M_np.moments(x)
+    log_liks_np = M_np.log_liks(x,y)
+    errs = [np.max(np.abs(a-b)/(1.0+np.abs(a))) for a,b in
+            zip([pi,mu,var,EVs,VEs,log_liks],[pi_np,mu_np,var_np,EVs_np,VEs_np,log_liks_np])]
+    t_start = time.time()
+    for _ in range(_n_rep):
+        sess.run([M.pi,M.mu,M.var],feed_dict=feeds)
+    tf_time = (time.time()-t_start)/_n_rep
+    t_start = time.time()
+    for _ in range(_n_rep):
+        M_np.forward(x)
+    np_time = (time.time()-t_start)/_n_rep
+    sess.close()
+    return errs,load_time,tf_time,np_time
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n',type=int,default=10000)
+    parser.add_argument('--k',type=int,default=20)
+    args = parser.parse_args()
+    for cls in [MDN_reg_class,MDN_reg_indep_class]:
+        errs,load_time,tf_time,np_time = check_mdn_np(cls,_k=args.k,_n=args.n)
+        print ("==== %s ===="%(cls.__name__))
+        print ("  max rel err pi:%.1e mu:%.1e var:%.1e EVs:%.1e VEs:%.1e log_liks:%.1e"%tuple(errs))
+        print ("  numpy load:%.2fms / forward tf:%.2fms numpy:%.2fms (n=%d)"%
+               (1e3*load_time,1e3*tf_time,1e3*np_time,args.n))
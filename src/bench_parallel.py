@@ -0,0 +1,59 @@
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import tensorflow as tf
+from mdn_class import MDN_reg_class,MDN_reg_indep_class
+from mdn_parallel import train_parallel
+from util import cpu_sess
+
+# Scaling of mdn_parallel.train_parallel: examples/sec and held-out log likelihood versus workers
+def make_data(_n,_seed=0):
+    rng = np.random.RandomState(_seed)
+    x = rng.uniform(-1,1,size=(_n,1)).astype(np.float32)
+    y = np.concatenate([np.sin(np.pi*x),2*x],axis=1)*np.sign(rng.randn(_n,1)) # two branches
+    return x,(y+0.1*rng.randn(_n,2)).astype(np.float32)
+
+def build_model(_cls,_seed=0):
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.set_random_seed(_seed)
+        sess = cpu_sess(_graph=graph)
+        M = _cls(_name='mdn',_x_dim=1,_y_dim=2,_k=10,_hids=[64,64],_sig_max=1.0,
+                 _VECTORIZED=True,_sess=sess,_VERBOSE=False)
+    return M
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n',type=int,default=1000000)
+    parser.add_argument('--n_workers',type=int,nargs='+',default=[1,2,4,8])
+    parser.add_argument('--modes',nargs='+',default=['sync','async'])
+    parser.add_argument('--max_iter',type=int,default=2000)
+    parser.add_argument('--batch_size',type=int,default=256)
+    parser.add_argument('--indep',action='store_true')
+    args = parser.parse_args()
+    cls = MDN_reg_indep_class if args.indep else MDN_reg_class
+    tmp_dir = tempfile.mkdtemp()
+    x,y = make_data(args.n)
+    np.save(os.path.join(tmp_dir,'x.npy'),x)
+    np.save(os.path.join(tmp_dir,'y.npy'),y)
+    x_val,y_val = make_data(10000,_seed=1)
+    # Single-process reference
+    M = build_model(cls)
+    t_start = time.time()
+    M.train(os.path.join(tmp_dir,'x.npy'),os.path.join(tmp_dir,'y.npy'),_max_iter=args.max_iter,
+            _batch_size=args.batch_size,_PLOT=False)
+    sec = time.time()-t_start
+    print ("%-6s workers:%2d examples/sec:%9.0f val log_lik:%.4f"%
+           ('single',1,args.max_iter*args.batch_size/sec,M.eval_log_lik(x_val,y_val)))
+    M.sess.close()
+    for mode in args.modes:
+        for n_worker in args.n_workers:
+            M = build_model(cls)
+            res = train_parallel(M,os.path.join(tmp_dir,'x.npy'),os.path.join(tmp_dir,'y.npy'),
+                                 _n_worker=n_worker,_mode=mode,_max_iter=args.max_iter,
+                                 _batch_size=args.batch_size,_VERBOSE=False)
+            print ("%-6s workers:%2d examples/sec:%9.0f val log_lik:%.4f"%
+                   (mode,n_worker,res['examples_per_sec'],M.eval_log_lik(x_val,y_val)))
+            M.sess.close()
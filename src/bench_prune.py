@@ -0,0 +1,49 @@
+import time
+import argparse
+import numpy as np
+from mdn_np import MDN_np_class,random_params
+
+# Latency and accuracy of pruned / top-m evaluation against the full-k mixture (numpy engine)
+def random_sparse_params(_k=20,_n_alive=5,_x_dim=1,_y_dim=2,_hids=[128,128],_seed=0):
+    return random_params(_x_dim=_x_dim,_y_dim=_y_dim,_k=_k,_hids=_hids,_n_alive=_n_alive,_pi_scale=0.2,_seed=_seed)
+
+def timeit(_func,_n_rep):
+    _func()
+    t_start = time.time()
+    for _ in range(_n_rep):
+        _func()
+    return (time.time()-t_start)/_n_rep
+
+def bench(_M_ref,_M,_x,_y,_n_rep):
+    log_liks_ref,(EVs_ref,VEs_ref) = _M_ref.log_liks(_x,_y),_M_ref.moments(_x)
+    log_liks,(EVs,VEs) = _M.log_liks(_x,_y),_M.moments(_x)
+    t_log_lik = timeit(lambda:_M.log_liks(_x,_y),_n_rep)
+    t_moments = timeit(lambda:_M.moments(_x),_n_rep)
+    errs = [np.max(np.abs(log_liks-log_liks_ref)),np.max(np.abs(EVs-EVs_ref)),np.max(np.abs(VEs-VEs_ref))]
+    return t_log_lik,t_moments,errs
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path',default=None,help='exported params (random sparse model if omitted)')
+    parser.add_argument('--x',default=None,help='.npy inputs for pruning/evaluation')
+    parser.add_argument('--n',type=int,default=100000)
+    parser.add_argument('--pi_th',type=float,default=1e-3)
+    parser.add_argument('--top_ms',type=int,nargs='+',default=[1,2,3,5])
+    parser.add_argument('--n_rep',type=int,default=5)
+    args = parser.parse_args()
+    M = MDN_np_class.load(args.path) if args.path is not None else MDN_np_class(random_sparse_params())
+    x = np.load(args.x) if args.x is not None else np.random.randn(args.n,M.x_dim).astype(np.float32)
+    y = M.sample(x) # targets from the model itself
+    print ("%-12s %4s %12s %12s %10s %10s %10s %8s"%('mode','k','log_liks[ms]','moments[ms]',
+                                                  'err ll','err EVs','err VEs','min S'))
+    def report(_name,_M):
+        t_ll,t_mo,errs = bench(M,_M,x,y,args.n_rep)
+        print ("%-12s %4d %12.2f %12.2f %10.2e %10.2e %10.2e %8.4f"%
+               ((_name,_M.k if _M.top_m is None else _M.top_m,1e3*t_ll,1e3*t_mo)+tuple(errs)+
+                (_M.retained_mass(x).min(),)))
+    report('full',M)
+    M_pruned = M.prune(x,_pi_th=args.pi_th)
+    report('pruned',M_pruned)
+    for top_m in args.top_ms:
+        if top_m < M_pruned.k:
+            report('pruned+top%d'%(top_m),MDN_np_class(M_pruned.params,_top_m=top_m))
@@ -0,0 +1,57 @@
+import time
+import argparse
+import numpy as np
+from mdn_np import MDN_np_class,mog_moments,random_params
+from mixture_reduce import to_csr,from_csr
+
+# Payload size, reduction time and moment errors of per-input mixture reduction (numpy engine)
+def payload_nbytes(_arrays):
+    return sum(arr.nbytes for arr in _arrays.values())
+
+def mean_of(_pi,_mu,_INDEP):
+    return np.sum((_pi if _INDEP else _pi[:,np.newaxis,:])*_mu,axis=2) # [n x y_dim]
+
+def bench(_M,_x,_k_target,_max_kl):
+    pi,mu,var = _M.forward(_x)
+    EVs,VEs = mog_moments(pi,mu,var,_INDEP=_M.INDEP)
+    t_start = time.time()
+    reduced = _M.reduce(_x,_k_target=_k_target,_max_kl=_max_kl)
+    t_reduce = time.time()-t_start
+    csr = to_csr(reduced,_INDEP=_M.INDEP)
+    t_start = time.time()
+    from_csr(csr,_d=_M.y_dim,_INDEP=_M.INDEP)
+    t_decode = time.time()-t_start
+    EVs_r,VEs_r = mog_moments(reduced['pi'],reduced['mu'],reduced['var'],_INDEP=_M.INDEP)
+    err_mean = np.max(np.abs(mean_of(pi,mu,_M.INDEP)-mean_of(reduced['pi'],reduced['mu'],_M.INDEP)))
+    err_var = np.max(np.abs((EVs+VEs)-(EVs_r+VEs_r)))
+    fixed = dict((key,reduced[key]) for key in ['pi','mu','var'])
+    return {'t_reduce':t_reduce,'t_decode':t_decode,'bytes_full':payload_nbytes({'pi':pi,'mu':mu,'var':var}),
+            'bytes_fixed':payload_nbytes(fixed),'bytes_csr':payload_nbytes(csr),
+            'mean_count':float(np.mean(reduced['counts'])),'max_kl':float(np.max(reduced['kl'])),
+            'err_mean':err_mean,'err_var':err_var}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path',default=None,help='exported params (random model if omitted)')
+    parser.add_argument('--x',default=None,help='.npy inputs')
+    parser.add_argument('--n',type=int,default=20000)
+    parser.add_argument('--k',type=int,default=20)
+    parser.add_argument('--k_targets',type=int,nargs='+',default=[1,2,4])
+    parser.add_argument('--max_kls',type=float,nargs='+',default=[0.01,0.1])
+    args = parser.parse_args()
+    if args.path is not None:
+        M = MDN_np_class.load(args.path)
+    else:
+        M = MDN_np_class(random_params(_k=args.k,_pi_scale=0.2))
+    x = np.load(args.x) if args.x is not None else np.random.randn(args.n,M.x_dim).astype(np.float32)
+    print ("%-14s %8s %10s %10s %10s %10s %10s %10s %10s %10s"%
+           ('mode','count','reduce[s]','decode[s]','full[MB]','fixed[MB]','csr[MB]','max kl',
+            'err mean','err var'))
+    cases = [('k=%d'%(k_target),k_target,None) for k_target in args.k_targets]
+    cases += [('max_kl=%g'%(max_kl),1,max_kl) for max_kl in args.max_kls]
+    for name,k_target,max_kl in cases:
+        res = bench(M,x,k_target,max_kl)
+        print ("%-14s %8.2f %10.3f %10.3f %10.2f %10.2f %10.2f %10.4f %10.2e %10.2e"%
+               (name,res['mean_count'],res['t_reduce'],res['t_decode'],res['bytes_full']/2.0**20,
+                res['bytes_fixed']/2.0**20,res['bytes_csr']/2.0**20,res['max_kl'],
+                res['err_mean'],res['err_var']))
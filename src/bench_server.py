@@ -0,0 +1,50 @@
+import time
+import asyncio
+import argparse
+import numpy as np
+from mdn_np import MDN_np_class,random_params
+from mdn_server import micro_batcher_class,np_predict_func,start_server,mdn_client_class
+
+# Load test of mdn_server: concurrent clients sending single-row requests over local TCP
+async def run_client(_host,_port,_n_request,_x_dim,_n_distinct,_seed,_latencies):
+    rng = np.random.RandomState(_seed)
+    xs = rng.randn(_n_distinct,_x_dim) # repeated rows exercise the cache
+    client = await mdn_client_class.connect(_host,_port)
+    for i in range(_n_request):
+        t_start = time.time()
+        await client.predict(xs[[rng.randint(_n_distinct)]])
+        _latencies.append(time.time()-t_start)
+    client.close()
+
+async def load_test(_batcher,_n_client,_n_request,_n_distinct,_port):
+    server = await start_server(_batcher,'127.0.0.1',_port)
+    latencies = []
+    t_start = time.time()
+    await asyncio.gather(*[run_client('127.0.0.1',_port,_n_request,_batcher.x_dim,_n_distinct,seed,latencies)
+                           for seed in range(_n_client)])
+    total = time.time()-t_start
+    server.close()
+    await server.wait_closed()
+    await _batcher.stop()
+    return np.array(latencies),total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path',default=None,help='exported params (random weights if omitted)')
+    parser.add_argument('--n_client',type=int,default=64)
+    parser.add_argument('--n_request',type=int,default=100)
+    parser.add_argument('--max_batches',type=int,nargs='+',default=[1,64,256])
+    parser.add_argument('--max_wait',type=float,default=0.002)
+    parser.add_argument('--cache_size',type=int,default=0)
+    parser.add_argument('--n_distinct',type=int,default=100000)
+    parser.add_argument('--port',type=int,default=8765)
+    args = parser.parse_args()
+    M_np = MDN_np_class.load(args.path) if args.path is not None else MDN_np_class(random_params())
+    for max_batch in args.max_batches:
+        batcher = micro_batcher_class(np_predict_func(M_np),M_np.x_dim,_max_batch=max_batch,
+                                      _max_wait=args.max_wait,_cache_size=args.cache_size)
+        latencies,total = asyncio.run(load_test(batcher,args.n_client,args.n_request,args.n_distinct,args.port))
+        stats = batcher.stats()
+        print ("max_batch:%4d p50:%.2fms p99:%.2fms throughput:%.0f req/s mean batch:%.1f cache hits:%d"%
+               (max_batch,1e3*np.percentile(latencies,50),1e3*np.percentile(latencies,99),
+                len(latencies)/total,stats['mean_batch'],stats['n_hit']))
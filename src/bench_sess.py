@@ -0,0 +1,51 @@
+import time
+import argparse
+import itertools
+import multiprocessing
+import numpy as np
+import tensorflow as tf
+from mdn_class import MDN_reg_class
+from util import cpu_sess
+
+# MDN_reg_class train-step and inference throughput under each session setting
+def bench_setting(_setting,_k=20,_hids=[128,128],_batch_size=256,_n_infer=100000,_n_step=200):
+    graph = tf.Graph()
+    with graph.as_default():
+        sess = cpu_sess(_graph=graph,**_setting)
+        M = MDN_reg_class(_name='mdn',_x_dim=1,_y_dim=2,_k=_k,_hids=_hids,_sig_max=1.0,
+                          _VECTORIZED=True,_sess=sess,_VERBOSE=False)
+        x = np.random.randn(_batch_size,1).astype(np.float32)
+        y = np.random.randn(_batch_size,2).astype(np.float32)
+        feeds = {M.x:x,M.y:y,M.sig_rate:1.0}
+        for _ in range(10): # warm up (and JIT compile)
+            sess.run(M.optm,feed_dict=feeds)
+        t_start = time.time()
+        for _ in range(_n_step):
+            sess.run(M.optm,feed_dict=feeds)
+        train_rate = _n_step*_batch_size/(time.time()-t_start)
+        x_infer = np.random.randn(_n_infer,1).astype(np.float32)
+        M.predict(x_infer[:1000],_fetch=['pi','mu','var','EVs','VEs'])
+        t_start = time.time()
+        M.predict(x_infer,_fetch=['pi','mu','var','EVs','VEs'],_batch_size=8192)
+        infer_rate = _n_infer/(time.time()-t_start)
+        sess.close()
+    return train_rate,infer_rate
+
+if __name__ == '__main__':
+    n_core = multiprocessing.cpu_count()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_intras',type=int,nargs='+',default=sorted(set([0,1,2,4,n_core])))
+    parser.add_argument('--n_inters',type=int,nargs='+',default=[0,1,2])
+    parser.add_argument('--xla',type=int,nargs='+',default=[0,1])
+    parser.add_argument('--opt_levels',nargs='+',default=['L1'])
+    parser.add_argument('--batch_size',type=int,default=256)
+    args = parser.parse_args()
+    print ("%7s %7s %4s %4s | %16s %16s"%('n_intra','n_inter','xla','opt','train [rows/s]','infer [rows/s]'))
+    for n_intra,n_inter,xla,opt_level in itertools.product(args.n_intras,args.n_inters,args.xla,args.opt_levels):
+        setting = {'_n_intra':n_intra,'_n_inter':n_inter,'_XLA':bool(xla),'_opt_level':opt_level}
+        try:
+            train_rate,infer_rate = bench_setting(setting,_batch_size=args.batch_size)
+        except Exception as e: # e.g., XLA not compiled into this TF build
+            print ("%7d %7d %4d %4s | failed: %s"%(n_intra,n_inter,xla,opt_level,str(e).split('\n')[0]))
+            continue
+        print ("%7d %7d %4d %4s | %16.0f %16.0f"%(n_intra,n_inter,xla,opt_level,train_rate,infer_rate))
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import platform
+import numpy as np
+import tensorflow as tf
+from mdn_class import MDN_reg_class,MDN_reg_indep_class
+from mog_class import MoG_class,MoG_indep_class
+
+# Reproducible benchmark suite for the hot paths of the MDN and MoG classes
+#  Metrics (seconds, median over repeats): build (graph construction + init), train_step,
+#  log_liks, sample (y_sample / x_sample), sample_100 (MDN sample() with S=100) and
+#  moments (EVs/VEs, MDN only).
+#  Results are saved as json and compared against a stored baseline (default: bench_baseline.json
+#  next to this script); the run fails on regressions. Timings are machine-specific, so the
+#  baseline is not shipped: create it on the reference machine with --save_baseline.
+MDN_CLASSES = {'MDN_reg_class':MDN_reg_class,'MDN_reg_indep_class':MDN_reg_indep_class}
+MOG_CLASSES = {'MoG_class':MoG_class,'MoG_indep_class':MoG_indep_class}
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),'bench_baseline.json')
+PRESETS = {
+    'quick':{'k':[5,20],'dim':[[1,2]],'hids':[[128,128]],'batch_size':[256],'VECTORIZED':[False,True]},
+    'full':{'k':[5,20,100],'dim':[[1,2],[8,8]],'hids':[[32,32],[128,128],[512,512]],
+            'batch_size':[256,4096],'VECTORIZED':[False,True]},
+}
+
+# Synthetic data in the style of the demo notebooks
+def mdn_data(_n,_x_dim,_y_dim,_rng):
+    x = np.linspace(-1,1,_n).reshape((-1,1))*np.ones((1,_x_dim))
+    phase = np.linspace(0,np.pi,_y_dim)
+    y = np.sin(np.pi*x[:,:1]+phase)+2*x[:,:1]
+    y = y*np.sign(_rng.randn(_n,1))+0.1*_rng.randn(_n,_y_dim) # two branches
+    return x.astype(np.float32),y.astype(np.float32)
+
+def mog_data(_n,_x_dim,_rng):
+    centers = 3*_rng.randn(4,_x_dim)
+    idx = _rng.randint(4,size=_n)
+    return (centers[idx]+_rng.randn(_n,_x_dim)*np.sqrt([0.25,1,4,1/16])[idx,np.newaxis]).astype(np.float32)
+
+def timeit(_func,_n_rep):
+    _func() # warm up
+    times = []
+    for _ in range(_n_rep):
+        t_start = time.time()
+        _func()
+        times.append(time.time()-t_start)
+    return float(np.median(times))
+
+def bench_case(_case,_n_rep=20,_seed=0):
+    rng = np.random.RandomState(_seed)
+    x_dim,y_dim = _case['dim']
+    bs = _case['batch_size']
+    graph = tf.Graph()
+    res = {}
+    with graph.as_default():
+        tf.set_random_seed(_seed)
+        sess = tf.Session(graph=graph)
+        t_start = time.time()
+        if _case['model'] in MDN_CLASSES:
+            M = MDN_CLASSES[_case['model']](_name='mdn',_x_dim=x_dim,_y_dim=y_dim,_k=_case['k'],
+                                            _hids=_case['hids'],_sig_max=1.0,
+                                            _VECTORIZED=_case['VECTORIZED'],_sess=sess,_VERBOSE=False)
+            res['build'] = time.time()-t_start
+            x,y = mdn_data(bs,x_dim,y_dim,rng)
+            feeds = {M.x:x,M.y:y,M.sig_rate:1.0}
+            res['train_step'] = timeit(lambda:sess.run(M.optm,feed_dict=feeds),_n_rep)
+            res['log_liks'] = timeit(lambda:sess.run(M.log_liks,feed_dict=feeds),_n_rep)
+            res['sample'] = timeit(lambda:sess.run(M.y_sample,feed_dict=feeds),_n_rep)
+            res['moments'] = timeit(lambda:sess.run([M.EVs,M.VEs],feed_dict=feeds),_n_rep)
+            res['sample_100'] = timeit(lambda:M.sample(x,_n_sample=100),_n_rep) # 100 samples per input
+        else:
+            M = MOG_CLASSES[_case['model']](_name='mog',_x_dim=x_dim,_k=_case['k'],_sess=sess)
+            res['build'] = time.time()-t_start
+            x = mog_data(bs,x_dim,rng)
+            res['train_step'] = timeit(lambda:sess.run(M.optm,feed_dict={M.x:x}),_n_rep)
+            res['log_liks'] = timeit(lambda:sess.run(M.log_liks,feed_dict={M.x:x}),_n_rep)
+            res['sample'] = timeit(lambda:sess.run(M.x_sample,feed_dict={M.n_sample:bs}),_n_rep)
+        sess.close()
+    res['train_rows_per_sec'] = bs/res['train_step']
+    return res
+
+def make_cases(_preset,_models):
+    grid = PRESETS[_preset]
+    cases = []
+    for model in _models:
+        if model in MDN_CLASSES:
+            for k,dim,hids,bs,vec in itertools.product(grid['k'],grid['dim'],grid['hids'],
+                                                       grid['batch_size'],grid['VECTORIZED']):
+                cases.append({'model':model,'k':k,'dim':dim,'hids':hids,'batch_size':bs,'VECTORIZED':vec})
+        else: # MoG models: x_dim only, no hidden layers
+            for k,dim,bs in itertools.product(grid['k'],grid['dim'],grid['batch_size']):
+                cases.append({'model':model,'k':k,'dim':[dim[0]+dim[1],0],'hids':[],'batch_size':bs,
+                              'VECTORIZED':False})
+    return cases
+
+def case_key(_case):
+    return json.dumps(_case,sort_keys=True)
+
+# Metrics that got slower than the baseline by more than _tol (relative)
+def compare(_results,_baseline,_tol=0.2):
+    base = dict((case_key(r['case']),r['metrics']) for r in _baseline['results'])
+    regressions = []
+    for r in _results['results']:
+        key = case_key(r['case'])
+        if key not in base:
+            continue
+        for metric,val in r['metrics'].items():
+            if metric.endswith('_per_sec') or (metric not in base[key]):
+                continue
+            ratio = val/max(base[key][metric],1e-12)
+            if ratio > 1.0+_tol:
+                regressions.append((r['case'],metric,base[key][metric],val,ratio))
+    return regressions
+
+# Cases of _results without an entry in the baseline (not compared)
+def missing_cases(_results,_baseline):
+    base = set(case_key(r['case']) for r in _baseline['results'])
+    return [r['case'] for r in _results['results'] if case_key(r['case']) not in base]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--preset',default='quick',choices=sorted(PRESETS.keys()))
+    parser.add_argument('--models',nargs='+',default=sorted(MDN_CLASSES.keys())+sorted(MOG_CLASSES.keys()))
+    parser.add_argument('--n_rep',type=int,default=20)
+    parser.add_argument('--out',default='bench_results.json')
+    parser.add_argument('--baseline',default=BASELINE_PATH,help='json from a previous run to compare against')
+    parser.add_argument('--save_baseline',action='store_true',help='store this run as the baseline')
+    parser.add_argument('--tol',type=float,default=0.2,help='allowed relative slowdown')
+    args = parser.parse_args()
+    results = {'meta':{'preset':args.preset,'tf':tf.__version__,'numpy':np.__version__,
+                       'python':platform.python_version(),'machine':platform.machine(),
+                       'node':platform.node(),'time':time.strftime('%Y-%m-%d %H:%M:%S')},
+               'results':[]}
+    for case in make_cases(args.preset,args.models):
+        metrics = bench_case(case,_n_rep=args.n_rep)
+        results['results'].append({'case':case,'metrics':metrics})
+        print ("%s | %s"%(case_key(case),
+                          ' '.join('%s:%.3gms'%(m,1e3*v) for m,v in sorted(metrics.items()) if not m.endswith('_per_sec'))))
+    with open(args.out,'w') as f:
+        json.dump(results,f,indent=1)
+    print ("saved [%s]"%(args.out))
+    if args.save_baseline:
+        with open(args.baseline,'w') as f:
+            json.dump(results,f,indent=1)
+        print ("saved baseline [%s]"%(args.baseline))
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print ("NO BASELINE: [%s] does not exist, nothing was compared. "
+               "Run with --save_baseline on the reference machine to create it."%(args.baseline))
+        sys.exit(0 if args.baseline == BASELINE_PATH else 2)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results,baseline,_tol=args.tol)
+    for case,metric,old,new,ratio in regressions:
+        print ("REGRESSION %s %s: %.3gms -> %.3gms (x%.2f)"%(case_key(case),metric,1e3*old,1e3*new,ratio))
+    missing = missing_cases(results,baseline)
+    if len(missing) > 0:
+        print ("%d case(s) not in the baseline (not compared), e.g., %s"%(len(missing),case_key(missing[0])))
+    print ("%d regression(s) against [%s]"%(len(regressions),args.baseline))
+    sys.exit(1 if len(regressions) > 0 else 0)
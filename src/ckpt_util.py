@@ -0,0 +1,76 @@
+import os
+import json
+import numpy as np
+import tensorflow as tf
+from util import nzrs_to_dict,nzrs_from_dict,NZR_PREFIX
+
+# Compact checkpoints for the MDN / MoG classes
+#  One '.npz' per model: model variables keyed by their name under '%s/'%(name) (e.g., 'hid_0/kernel'),
+#  constructor hyperparameters as a json string ('__hyper__'), and optionally the optimizer
+#  state ('__optm__/<variable name>') together with the training iteration ('__iter__').
+#  Normalizers in _M.nzrs (util.nzr_stream) are stored under '__nzr__/<name>/' and restored on load.
+HYPER_KEY = '__hyper__'
+ITER_KEY = '__iter__'
+OPTM_PREFIX = '__optm__/'
+
+def var_key(_M,_var):
+    name = _var.op.name
+    if name.startswith('%s/'%(_M.name)):
+        name = name[len(_M.name)+1:]
+    return name
+
+# Assign numpy values to variables with a single sess.run (assign ops are cached on the model)
+def assign_vars(_M,_vars,_vals):
+    if not hasattr(_M,'assign_ops'):
+        _M.assign_ops = {}
+    feed_dict,ops = {},[]
+    for var,val in zip(_vars,_vals):
+        if var.name not in _M.assign_ops:
+            with _M.sess.graph.as_default():
+                ph = tf.placeholder(dtype=var.dtype.base_dtype,shape=var.get_shape())
+                _M.assign_ops[var.name] = (ph,tf.assign(var,ph))
+        ph,op = _M.assign_ops[var.name]
+        feed_dict[ph] = val
+        ops.append(op)
+    _M.sess.run(ops,feed_dict=feed_dict)
+
+def save_ckpt(_M,_path,_hyper,_SAVE_OPTM=False,_iter=None):
+    vals = _M.sess.run(_M.c_vars)
+    arrays = dict((var_key(_M,var),val) for var,val in zip(_M.c_vars,vals))
+    if _SAVE_OPTM and (len(_M.optm_vars) > 0):
+        optm_vals = _M.sess.run(_M.optm_vars)
+        for var,val in zip(_M.optm_vars,optm_vals):
+            arrays[OPTM_PREFIX+var_key(_M,var)] = val
+    if _iter is not None:
+        arrays[ITER_KEY] = np.array(_iter)
+    arrays.update(nzrs_to_dict(getattr(_M,'nzrs',{})))
+    arrays[HYPER_KEY] = np.array(json.dumps(_hyper))
+    # Write to a temporary file first so that a preempted job never leaves a broken checkpoint
+    tmp_path = _path+'.tmp.npz'
+    np.savez(tmp_path,**arrays)
+    os.replace(tmp_path,_path)
+
+def read_hyper(_path):
+    with np.load(_path) as npz:
+        return json.loads(str(npz[HYPER_KEY]))
+
+# Restore model variables (and optimizer slots if requested); returns the saved iteration or None
+def load_ckpt(_M,_path,_LOAD_OPTM=False):
+    with np.load(_path) as npz:
+        keys = set(npz.files)
+        vars,vals = [],[]
+        for var in _M.c_vars:
+            vars.append(var)
+            vals.append(npz[var_key(_M,var)])
+        if _LOAD_OPTM:
+            for var in _M.optm_vars:
+                key = OPTM_PREFIX+var_key(_M,var)
+                if key in keys:
+                    vars.append(var)
+                    vals.append(npz[key])
+        _iter = int(npz[ITER_KEY]) if ITER_KEY in keys else None
+        nzr_keys = [key for key in keys if key.startswith(NZR_PREFIX)]
+        if len(nzr_keys) > 0:
+            _M.nzrs = nzrs_from_dict(dict((key,npz[key]) for key in nzr_keys))
+    assign_vars(_M,vars,vals)
+    return _iter
@@ -0,0 +1,159 @@
+import queue
+import threading
+import numpy as np
+
+# Open a training array: ndarray as-is, '.npy' path as a read-only memory map (no copy)
+def open_array(_data):
+    if isinstance(_data,str):
+        return np.load(_data,mmap_mode='r')
+    return _data
+
+# Epoch-based minibatch loader with optional background prefetch
+#  _arrays: list of arrays (or .npy paths) sharing the first dimension, e.g., [x_train,y_train]
+#  _block_size: if set, shuffle contiguous blocks of _block_size rows (a multiple of _batch_size)
+#               and slice batches out of them, so batches are views of (memory-mapped) storage
+#  _n_prefetch: number of batches prepared ahead on a background thread (0: no thread)
+class batch_loader_class(object):
+    def __init__(self,_arrays,_batch_size=256,_SHUFFLE=True,_block_size=None,
+                 _n_prefetch=4,_dtype=np.float32,_seed=None):
+        self.arrays = [open_array(a) for a in _arrays]
+        self.n = self.arrays[0].shape[0]
+        for a in self.arrays:
+            assert a.shape[0] == self.n, 'all arrays must have the same number of rows'
+        self.batch_size = min(_batch_size,self.n)
+        self.SHUFFLE = _SHUFFLE
+        self.block_size = _block_size
+        if self.block_size is not None:
+            self.block_size = max(self.batch_size,(self.block_size//self.batch_size)*self.batch_size)
+        self.n_prefetch = _n_prefetch
+        self.dtype = _dtype
+        if _seed is None:
+            _seed = np.random.randint(2**31-1) # follow np.random.seed() of the caller
+        self.rng = np.random.RandomState(_seed)
+        self.epoch = 0
+        self._batches = self._batch_gen()
+        self.queue,self.thread,self.error = None,None,None
+        self.stop_event = threading.Event()
+        if self.n_prefetch > 0:
+            self.queue = queue.Queue(maxsize=self.n_prefetch)
+            self.thread = threading.Thread(target=self._producer)
+            self.thread.daemon = True
+            self.thread.start()
+
+    # Infinite generator over batches, reshuffling once per epoch
+    def _batch_gen(self):
+        bs = self.batch_size
+        while True:
+            if self.block_size is None:
+                idx = self.rng.permutation(self.n) if self.SHUFFLE else np.arange(self.n)
+                for start in range(0,self.n-bs+1,bs):
+                    r_idx = idx[start:start+bs]
+                    if self.SHUFFLE:
+                        r_idx = np.sort(r_idx) # sequential reads from memory maps
+                        yield [self._cast(a[r_idx]) for a in self.arrays]
+                    else:
+                        yield [self._cast(a[start:start+bs]) for a in self.arrays]
+            else:
+                # Batch-aligned offsets from a start in [0,n%bs] that changes every epoch, so the
+                #  last n%bs rows are not left out of every epoch
+                n_tail = self.n%bs
+                offset = self.rng.randint(n_tail+1) if self.SHUFFLE else self.epoch%(n_tail+1)
+                starts = np.arange(offset,self.n-bs+1,bs)
+                n_per_block = self.block_size//bs
+                blocks = [starts[i:i+n_per_block] for i in range(0,len(starts),n_per_block)]
+                block_order = self.rng.permutation(len(blocks)) if self.SHUFFLE else range(len(blocks))
+                for b_idx in block_order:
+                    block = blocks[b_idx]
+                    if self.SHUFFLE:
+                        block = block[self.rng.permutation(len(block))]
+                    for start in block:
+                        yield [self._cast(a[start:start+bs]) for a in self.arrays]
+            self.epoch += 1
+
+    def _cast(self,_batch):
+        if _batch.dtype == self.dtype and _batch.flags['C_CONTIGUOUS']:
+            return _batch # zero-copy
+        return np.ascontiguousarray(_batch,dtype=self.dtype)
+
+    # Errors (e.g., read failures) are handed to the consumer instead of leaving it blocked
+    def _producer(self):
+        while not self.stop_event.is_set():
+            try:
+                batch = next(self._batches)
+            except Exception as e:
+                batch = e
+            while not self.stop_event.is_set():
+                try:
+                    self.queue.put(batch,timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if isinstance(batch,Exception):
+                break
+
+    def next_batch(self):
+        if self.queue is None:
+            return next(self._batches)
+        if self.error is not None:
+            raise self.error
+        batch = self.queue.get()
+        if isinstance(batch,Exception):
+            self.error = batch
+            raise batch
+        return batch
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next_batch()
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+# Stream (x,y) chunks of _chunk_size rows out of arrays or '.npy' paths (views, no copy)
+def array_chunks(_arrays,_chunk_size=100000):
+    arrays = [open_array(a) for a in _arrays]
+    n = arrays[0].shape[0]
+    for start in range(0,n,_chunk_size):
+        yield [a[start:start+_chunk_size] for a in arrays]
+
+# Bounded uniform sample of every row seen so far (reservoir sampling, vectorized per chunk)
+#  Keeps _capacity rows of each array, e.g., [x,y], for replay during incremental training
+class reservoir_class(object):
+    def __init__(self,_capacity=100000,_dtype=np.float32,_seed=None):
+        self.capacity = _capacity
+        self.dtype = _dtype
+        self.rng = np.random.RandomState(_seed)
+        self.arrays = None
+        self.size = 0 # rows held
+        self.n_seen = 0 # rows offered
+
+    def add(self,_arrays):
+        m = _arrays[0].shape[0]
+        if self.arrays is None:
+            self.arrays = [np.empty((self.capacity,)+a.shape[1:],dtype=self.dtype) for a in _arrays]
+        # Fill the free slots first
+        n_fill = min(m,self.capacity-self.size)
+        for buf,a in zip(self.arrays,_arrays):
+            buf[self.size:self.size+n_fill] = a[:n_fill]
+        self.size += n_fill
+        # Row i (the (n_seen+i+1)-th overall) replaces a random slot with probability capacity/(n_seen+i+1)
+        if n_fill < m:
+            seen = self.n_seen+np.arange(n_fill,m)
+            slots = (self.rng.uniform(size=m-n_fill)*(seen+1)).astype(np.int64)
+            keep = np.where(slots < self.capacity)[0]
+            # With duplicate slots the later row wins, as in the sequential algorithm
+            for buf,a in zip(self.arrays,_arrays):
+                buf[slots[keep]] = a[n_fill+keep]
+        self.n_seen += m
+
+    def sample(self,_n):
+        idx = np.sort(self.rng.randint(self.size,size=_n))
+        return [buf[idx] for buf in self.arrays]
+
+    def get_arrays(self):
+        return [buf[:self.size] for buf in self.arrays]
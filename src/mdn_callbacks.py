@@ -0,0 +1,136 @@
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor,ProcessPoolExecutor
+from mdn_np import MDN_np_class
+
+# Base callback for MDN_reg_class.train() / MDN_reg_indep_class.train()
+class callback_class(object):
+    def on_step(self,_M,_iter,_cost_val,_sig_rate):
+        pass
+    def on_eval(self,_M,_iter,_cost_val,_sig_rate):
+        pass
+    def on_train_end(self,_M):
+        pass
+
+# Keep the cost history without touching the session
+class cost_history_callback(callback_class):
+    def __init__(self,_EVERY=1):
+        self.EVERY = _EVERY
+        self.iters,self.costs = [],[]
+    def on_step(self,_M,_iter,_cost_val,_sig_rate):
+        if (_iter%self.EVERY)==0:
+            self.iters.append(_iter)
+            self.costs.append(float(_cost_val))
+
+# Run a diagnostic on a background thread (or process) against a parameter snapshot
+#  _diag_func(M_np,iter,sig_rate) gets an mdn_np.MDN_np_class built from the snapshot,
+#  so it never shares the training session with the optimizer.
+#  When a diagnostic is still running, newer snapshots replace older pending ones.
+#  _member: with MDN_ensemble_class, the member whose parameters are snapshot (export_member)
+def _run_diag(_diag_func,_params,_iter,_sig_rate):
+    return _diag_func(MDN_np_class(_params),_iter,_sig_rate)
+
+class async_diag_callback(callback_class):
+    def __init__(self,_diag_func,_USE_PROCESS=False,_VERBOSE=True,_member=None):
+        self.diag_func = _diag_func
+        self.member = _member
+        self.VERBOSE = _VERBOSE
+        if _USE_PROCESS:
+            self.executor = ProcessPoolExecutor(max_workers=1)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future,self.future_iter = None,None
+        self.pending = None # latest snapshot waiting for the worker
+        self.results = [] # (iter,result)
+        self.snapshot_time = 0.0
+    def _submit(self,_params,_iter,_sig_rate):
+        self.future = self.executor.submit(_run_diag,self.diag_func,_params,_iter,_sig_rate)
+        self.future_iter = _iter
+    def _collect(self,_WAIT=False):
+        if self.future is None:
+            return
+        if (not _WAIT) and (not self.future.done()):
+            return
+        result = self.future.result()
+        self.results.append((self.future_iter,result))
+        if self.VERBOSE and (result is not None):
+            print ("  [diag %d] %s"%(self.future_iter,result))
+        self.future = None
+        if self.pending is not None:
+            params,iter,sig_rate = self.pending
+            self.pending = None
+            self._submit(params,iter,sig_rate)
+    def on_step(self,_M,_iter,_cost_val,_sig_rate):
+        if self.future is not None and self.future.done():
+            self._collect()
+    def _snapshot(self,_M):
+        if hasattr(_M,'export_params'):
+            return _M.export_params()
+        if hasattr(_M,'export_member'):
+            if self.member is None:
+                raise ValueError('async_diag_callback on [%s] needs _member (which member to diagnose)'
+                                 %(type(_M).__name__))
+            return _M.export_member(self.member)
+        raise TypeError('async_diag_callback needs a model with export_params or export_member, got [%s]'
+                        %(type(_M).__name__))
+    def on_eval(self,_M,_iter,_cost_val,_sig_rate):
+        t_start = time.time()
+        params = self._snapshot(_M) # one sess.run over the model variables
+        self.snapshot_time += time.time()-t_start
+        self._collect()
+        if self.future is None:
+            self._submit(params,_iter,_sig_rate)
+        else:
+            self.pending = (params,_iter,_sig_rate)
+    def on_train_end(self,_M):
+        while self.future is not None:
+            self._collect(_WAIT=True)
+        self.executor.shutdown(wait=True)
+
+# Diagnostic: mean held-out log likelihood (and mean EV/VE) of a snapshot
+class eval_log_lik_diag(object):
+    def __init__(self,_x,_y,_batch_size=8192):
+        self.x = _x
+        self.y = _y
+        self.batch_size = _batch_size
+    def __call__(self,_M_np,_iter,_sig_rate):
+        n = self.x.shape[0]
+        sum_log_lik,sum_EV,sum_VE = 0.0,0.0,0.0
+        for start in range(0,n,self.batch_size):
+            x,y = self.x[start:start+self.batch_size],self.y[start:start+self.batch_size]
+            log_liks = _M_np.log_liks(x,y,_sig_rate=_sig_rate)
+            EVs,VEs = _M_np.moments(x,_sig_rate=_sig_rate)
+            sum_log_lik += np.sum(log_liks)/np.prod(log_liks.shape[1:])
+            sum_EV += np.sum(EVs)
+            sum_VE += np.sum(VEs)
+        return {'log_lik':sum_log_lik/n,'EV':sum_EV/n,'VE':sum_VE/n}
+
+# Diagnostic: render the mixture of a snapshot to a png file without pyplot (thread-safe)
+class save_plot_diag(object):
+    def __init__(self,_x_test,_path_fmt='mdn_%06d.png',_pi_th=0.1,_figsize=(15,5),_ylim=[-3,+3]):
+        self.x_test = _x_test
+        self.path_fmt = _path_fmt
+        self.pi_th = _pi_th
+        self.figsize = _figsize
+        self.ylim = _ylim
+    def __call__(self,_M_np,_iter,_sig_rate):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        pi,mu,var = _M_np.forward(self.x_test,_sig_rate=_sig_rate)
+        if not _M_np.INDEP:
+            pi = np.tile(pi[:,np.newaxis,:],(1,_M_np.y_dim,1)) # [n x y_dim x k]
+        fig = Figure(figsize=self.figsize)
+        FigureCanvasAgg(fig)
+        nc = min(_M_np.y_dim,2)
+        xs = self.x_test[:,0]
+        for i in range(nc):
+            ax = fig.add_subplot(1,nc,i+1)
+            for j in range(_M_np.k):
+                idx = np.where(pi[:,i,j]>self.pi_th)[0]
+                ax.plot(xs,mu[:,i,j],'-',color=[0.8,0.8,0.8],linewidth=1)
+                ax.plot(xs[idx],mu[idx,i,j],'.',markersize=2)
+            ax.set_ylim(self.ylim)
+            ax.set_title('[%d]-th dimension'%(i+1))
+        path = self.path_fmt%(_iter)
+        fig.savefig(path)
+        return path
@@ -1,19 +1,311 @@
+import os
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
 import tensorflow as tf
-from util import plot_1d_graphs,gpu_sess
+from data_pipeline import open_array,batch_loader_class
+from ckpt_util import save_ckpt,load_ckpt,read_hyper,assign_vars
+from util import eval_log_lik,nzrs_to_dict,early_stopping_class
+from mdn_np import mog_sample as mog_sample_np,mog_cdf,mog_quantile
+from mixture_reduce import reduce_mixture,concat_reduced,to_csr
 
 tfd = tf.contrib.distributions
 tfrni = tf.random_normal_initializer
 tfci = tf.constant_initializer
 tfrui = tf.random_uniform_initializer
 
+# Run the fetches over _x in chunks of _batch_size, one sess.run per chunk
+def predict_chunks(_sess,_fetch_dict,_x_ph,_x,_batch_size,_feed_dict={}):
+    n = _x.shape[0]
+    names = list(_fetch_dict.keys())
+    tensors = [_fetch_dict[name] for name in names]
+    for start in range(0,n,_batch_size):
+        end = min(start+_batch_size,n)
+        feed_dict = dict(_feed_dict)
+        feed_dict[_x_ph] = _x[start:end]
+        outs = _sess.run(tensors,feed_dict=feed_dict)
+        yield start,end,dict(zip(names,outs))
+
+# Gather chunked outputs into (optionally preallocated) arrays, or stream them
+def predict_mdn(_M,_x,_fetch,_batch_size,_sig_rate,_out,_GENERATOR):
+    fetch_dict = dict((name,_M.fetchables[name]) for name in _fetch)
+    chunks = predict_chunks(_M.sess,fetch_dict,_M.x,_x,_batch_size,
+                            _feed_dict={_M.sig_rate:_sig_rate})
+    if _GENERATOR:
+        return chunks
+    n = _x.shape[0]
+    out = {} if _out is None else _out
+    for start,end,outs in chunks:
+        for name,val in outs.items():
+            if name not in out:
+                out[name] = np.empty((n,)+val.shape[1:],dtype=val.dtype)
+            out[name][start:end] = val
+    return out
+
+# Draw _n_sample samples per input from a single network pass ([n x S x y_dim])
+#  pi/mu/var are fetched in chunks of _batch_size inputs (default: about _max_rows samples per chunk)
+#  and the component choice plus the chosen Gaussian draws are done in numpy (mdn_np.mog_sample)
+def sample_mdn(_M,_x,_n_sample,_batch_size,_sig_rate,_out,_GENERATOR,_rng,_max_rows=2**20):
+    if _batch_size is None:
+        _batch_size = max(1,_max_rows//_n_sample)
+    chunks = predict_mdn(_M,_x,['pi','mu','var'],_batch_size,_sig_rate,None,True)
+    def sample_chunks():
+        for start,end,outs in chunks:
+            pi = outs['pi'] # [n x k] or [n x y_dim x k]
+            yield start,end,mog_sample_np(pi,outs['mu'],outs['var'],_INDEP=(pi.ndim==3),
+                                          _rng=_rng,_n_sample=_n_sample)
+    if _GENERATOR:
+        return sample_chunks()
+    out = np.empty((_x.shape[0],_n_sample,_M.y_dim),dtype=np.float32) if _out is None else _out
+    for start,end,samples in sample_chunks():
+        out[start:end] = samples
+    return out
+
+# Marginal cdfs ([n x y_dim]) and quantiles ([n x y_dim] or [n x m x y_dim]) of the predicted
+#  mixtures, one network pass per chunk and a batched root-finding in numpy (mdn_np.mog_quantile)
+def cdf_mdn(_M,_x,_y,_batch_size,_sig_rate):
+    out = np.empty((_x.shape[0],_M.y_dim),dtype=np.float32)
+    for start,end,outs in predict_mdn(_M,_x,['pi','mu','var'],_batch_size,_sig_rate,None,True):
+        pi = outs['pi']
+        out[start:end] = mog_cdf(_y[start:end],pi,outs['mu'],outs['var'],_INDEP=(pi.ndim==3))
+    return out
+
+def quantile_mdn(_M,_x,_q,_batch_size,_sig_rate,_tol):
+    n = _x.shape[0]
+    out = np.empty((n,_M.y_dim) if np.ndim(_q)==0 else (n,len(_q),_M.y_dim),dtype=np.float32)
+    for start,end,outs in predict_mdn(_M,_x,['pi','mu','var'],_batch_size,_sig_rate,None,True):
+        pi = outs['pi']
+        out[start:end] = mog_quantile(_q,pi,outs['mu'],outs['var'],_INDEP=(pi.ndim==3),_tol=_tol)
+    return out
+
+# Predicted mixtures reduced to at most _k_target components per input (or until the merge
+#  cost reaches _max_kl) by moment matching, see mixture_reduce.py; fixed-length dict or CSR
+def reduce_mdn(_M,_x,_k_target,_max_kl,_batch_size,_sig_rate,_CSR):
+    reduced_list = []
+    for start,end,outs in predict_mdn(_M,_x,['pi','mu','var'],_batch_size,_sig_rate,None,True):
+        pi = outs['pi']
+        reduced_list.append(reduce_mixture(pi,outs['mu'],outs['var'],_INDEP=(pi.ndim==3),
+                                           _k_target=_k_target,_max_kl=_max_kl))
+    reduced = concat_reduced(reduced_list)
+    return to_csr(reduced,_INDEP=(reduced['pi'].ndim==3)) if _CSR else reduced
+
+# Max absolute difference of log_liks/EVs/VEs between the tfd.Mixture head and the vectorized head
+#  under identical weights (the two heads must give the same numbers)
+def compare_heads(_cls,_k,_x_dim=1,_y_dim=2,_hids=[32,32],_n=512,_seed=0):
+    np.random.seed(_seed)
+    x = np.random.randn(_n,_x_dim).astype(np.float32)
+    y = np.random.randn(_n,_y_dim).astype(np.float32)
+    outs = []
+    weights = None
+    for VECTORIZED in [False,True]:
+        graph = tf.Graph()
+        with graph.as_default():
+            tf.set_random_seed(_seed)
+            sess = tf.Session(graph=graph)
+            M = _cls(_name='mdn',_x_dim=_x_dim,_y_dim=_y_dim,_k=_k,_hids=_hids,
+                     _sig_max=1.0,_VECTORIZED=VECTORIZED,_sess=sess,_VERBOSE=False)
+            if weights is None:
+                weights = sess.run(M.c_vars)
+            else:
+                for v,w in zip(M.c_vars,weights):
+                    v.load(w,sess)
+            outs.append(sess.run([M.log_liks,M.EVs,M.VEs],
+                                 feed_dict={M.x:x,M.y:y,M.sig_rate:1.0}))
+            sess.close()
+    return [np.max(np.abs(a-b)) for a,b in zip(outs[0],outs[1])]
+
+# Train loop shared by the MDN classes
+#  _PLOT: render plot_result/plot_variances in the loop (set False on headless servers)
+#  _callbacks: objects with on_step/on_eval/on_train_end (see mdn_callbacks.py)
+#  _x_train/_y_train: arrays or '.npy' paths (memory-mapped), batched by data_pipeline.batch_loader_class
+#  _ckpt_path: save weights and optimizer state every _CKPT_EVERY iterations;
+#              with _RESUME=True an existing checkpoint is restored and training continues from it
+#  _x_val/_y_val: held-out mean log likelihood (chunked, sig_rate=1) every _EVAL_EVERY iterations;
+#                 stop after _patience evaluations without improvement, then (_RESTORE_BEST) go back
+#                 to the best weights. History in _M.val_hist, best in _M.best_iter/_M.best_val_log_lik
+#  _sig_horizon: iterations over which sig_rate ramps up to 1 (default: _max_iter), so that
+#                _max_iter can be a generous budget when early stopping
+def train_mdn(_M,_x_train,_y_train,_x_test=None,_max_iter=10000,_batch_size=256,_pi_th=0.1,
+              _SHOW_EVERY=10,_figsize=(15,5),_ylim=[-3,+3],_PLOT=True,_callbacks=[],
+              _n_prefetch=2,_block_size=None,_ckpt_path=None,_CKPT_EVERY=1000,_RESUME=False,
+              _profiler=None,_x_val=None,_y_val=None,_EVAL_EVERY=500,_patience=None,_min_delta=0.0,
+              _RESTORE_BEST=True,_sig_horizon=None):
+    _x_train,_y_train = open_array(_x_train),open_array(_y_train)
+    PROF = _profiler is not None # see profiler.train_profiler_class
+    iter_start = 0
+    if _RESUME and (_ckpt_path is not None) and os.path.exists(_ckpt_path):
+        iter_saved = _M.restore(_ckpt_path,_LOAD_OPTM=True)
+        iter_start = 0 if iter_saved is None else iter_saved+1
+        if _M.VERBOSE:
+            print ("[%s] resumed from [%s] at iter [%d]"%(_M.name,_ckpt_path,iter_start))
+    loader = batch_loader_class([_x_train,_y_train],_batch_size=_batch_size,
+                                _block_size=_block_size,_n_prefetch=_n_prefetch)
+    sig_horizon = _max_iter if _sig_horizon is None else _sig_horizon
+    VAL = _x_val is not None
+    if VAL:
+        stopper = early_stopping_class(_patience=_patience,_min_delta=_min_delta)
+        best_vals = None
+    for iter in range(iter_start,_max_iter): 
+        if PROF: _profiler.start_step(iter)
+        iter_rate_1to0 = np.exp(-4*(min(iter+1.0,sig_horizon)/sig_horizon)**2)
+        iter_rate_0to1 = 1-iter_rate_1to0
+        if _M.SCHEDULE_SIG_MAX: # schedule sig_max
+            sig_rate = iter_rate_0to1
+        else:
+            sig_rate = iter_rate_0to1
+        x_batch,y_batch = loader.next_batch() # current batch
+        if PROF: _profiler.lap('batch')
+        # Optimize the network 
+        run_options,run_metadata = _profiler.trace_args() if PROF else (None,None)
+        _,cost_val = _M.sess.run([_M.optm,_M.cost],
+                                 feed_dict={_M.x:x_batch,_M.y:y_batch,
+                                            _M.sig_rate:sig_rate},
+                                 options=run_options,run_metadata=run_metadata)
+        if PROF:
+            _profiler.lap('run')
+            if run_metadata is not None: _profiler.write_trace(run_metadata)
+        for cb in _callbacks:
+            cb.on_step(_M,iter,cost_val,sig_rate)
+        if PROF: _profiler.lap('callbacks')
+        # Periodic checkpoint
+        if (_ckpt_path is not None) and ((((iter+1)%_CKPT_EVERY)==0) or (iter==(_max_iter-1))):
+            _M.save(_ckpt_path,_SAVE_OPTM=True,_iter=iter)
+        if PROF: _profiler.lap('ckpt')
+        # See progress
+        if ((iter%(_max_iter//_SHOW_EVERY))==0) | (iter==(_max_iter-1)):
+            if _PLOT and (_x_test is not None):
+                # Plot results
+                _M.plot_result(_x_test=_x_test,_x_train=_x_train,_y_train=_y_train,
+                               _sig_rate=sig_rate,_pi_th=_pi_th,
+                               _title='[%d/%d] Black dots:training data / Red crosses:samples'%(iter,_max_iter),
+                               _fontsize=18,_figsize=_figsize,_ylim=_ylim)
+                _M.plot_variances(_x_test=_x_test,
+                                  _title='blue:Var[E[y|x]] (epistemic) / red:E[Var[y|x]] (aleatoric)',
+                                  _figsize=_figsize)
+            for cb in _callbacks:
+                cb.on_eval(_M,iter,cost_val,sig_rate)
+            # Print-out
+            if _M.VERBOSE or _PLOT:
+                print ("[%03d/%d] cost:%.4f"%(iter,_max_iter,cost_val)) 
+        # Held-out evaluation and early stopping
+        STOP = False
+        if VAL and ((((iter+1)%_EVAL_EVERY)==0) or (iter==(_max_iter-1))):
+            val_log_lik = _M.eval_log_lik(_x_val,_y_val)
+            IMPROVED,STOP = stopper.update(iter,val_log_lik)
+            if IMPROVED and _RESTORE_BEST:
+                best_vals = _M.sess.run(_M.c_vars) # in-memory snapshot
+            if _M.VERBOSE:
+                print ("[%03d/%d] val log_lik:%.4f (best:%.4f at %s)"%
+                       (iter,_max_iter,val_log_lik,stopper.best_val,stopper.best_iter))
+        if PROF:
+            _profiler.lap('eval')
+            _profiler.end_step(x_batch.shape[0],cost_val)
+        if STOP:
+            if _M.VERBOSE:
+                print ("early stopping at [%d] (no improvement in %d evaluations)"%(iter,_patience))
+            break
+    loader.close()
+    if VAL:
+        _M.val_hist,_M.best_iter,_M.best_val_log_lik = stopper.hist,stopper.best_iter,stopper.best_val
+        if _RESTORE_BEST and (best_vals is not None):
+            assign_vars(_M,_M.c_vars,best_vals)
+            if _ckpt_path is not None:
+                _M.save(_ckpt_path,_SAVE_OPTM=True,_iter=iter)
+    if PROF and _profiler.VERBOSE:
+        _profiler.print_summary()
+    for cb in _callbacks:
+        cb.on_train_end(_M)
+
+# Incremental training on a stream of (x,y) chunks, continuing from the current weights and
+#  optimizer state (e.g., a model built with load(...,_TRAIN=True))
+#  Each chunk gets ceil(_n_epoch*n_chunk/n_new) steps, where every batch holds n_new rows of the
+#  chunk and _replay_ratio*_batch_size rows replayed from _reservoir (a data_pipeline.reservoir_class
+#  of past rows), so an update costs time proportional to the new data only.
+#  The variance schedule is assumed done (_sig_rate=1.0). Returns the last iteration.
+def train_incremental_mdn(_M,_chunks,_reservoir=None,_replay_ratio=0.5,_n_epoch=1,_batch_size=256,
+                          _sig_rate=1.0,_callbacks=[],_iter_start=0,_ckpt_path=None,_seed=None):
+    iter = _iter_start-1
+    for chunk_idx,(x_chunk,y_chunk) in enumerate(_chunks):
+        x_chunk,y_chunk = open_array(x_chunk),open_array(y_chunk)
+        n_chunk = x_chunk.shape[0]
+        if n_chunk == 0:
+            continue
+        REPLAY = (_reservoir is not None) and (_reservoir.size > 0) and (_replay_ratio > 0)
+        n_replay = int(_batch_size*_replay_ratio) if REPLAY else 0
+        n_new = max(1,min(_batch_size-n_replay,n_chunk))
+        loader = batch_loader_class([x_chunk,y_chunk],_batch_size=n_new,_n_prefetch=0,_seed=_seed)
+        n_step = int(np.ceil(_n_epoch*n_chunk/float(n_new)))
+        for _ in range(n_step):
+            iter += 1
+            x_batch,y_batch = loader.next_batch()
+            if n_replay > 0:
+                x_replay,y_replay = _reservoir.sample(n_replay)
+                x_batch,y_batch = np.concatenate([x_batch,x_replay]),np.concatenate([y_batch,y_replay])
+            _,cost_val = _M.sess.run([_M.optm,_M.cost],
+                                     feed_dict={_M.x:x_batch,_M.y:y_batch,_M.sig_rate:_sig_rate})
+            for cb in _callbacks:
+                cb.on_step(_M,iter,cost_val,_sig_rate)
+        loader.close()
+        if _reservoir is not None:
+            _reservoir.add([x_chunk,y_chunk])
+        for cb in _callbacks:
+            cb.on_eval(_M,iter,cost_val,_sig_rate)
+        if _ckpt_path is not None:
+            _M.save(_ckpt_path,_SAVE_OPTM=True,_iter=iter)
+        if _M.VERBOSE:
+            print ("[chunk %d] rows:%d steps:%d iter:%d cost:%.4f"%(chunk_idx,n_chunk,n_step,iter,cost_val))
+    for cb in _callbacks:
+        cb.on_train_end(_M)
+    return iter
+
+# Activation name used when exporting weights (see mdn_np.ACTVS)
+def get_actv_name(_actv):
+    if _actv is None:
+        return 'linear'
+    return _actv.__name__
+
+def get_actv(_actv_name):
+    if _actv_name == 'linear':
+        return None
+    return getattr(tf.nn,_actv_name)
+
+# Vectorized mixture ops (no per-component distribution objects)
+def mog_log_prob(_y,_pi_logits,_mu,_var):
+    # _y:[n x d] / _pi_logits:[n x k] / _mu:[n x d x k] / _var:[n x d x k]
+    y = _y[:,:,tf.newaxis] # [n x d x 1]
+    log_comp = -0.5*tf.reduce_sum(np.log(2*np.pi)+tf.log(_var)+tf.square(y-_mu)/_var,axis=1) # [n x k]
+    log_pi = tf.nn.log_softmax(_pi_logits,axis=1) # [n x k]
+    return tf.reduce_logsumexp(log_pi+log_comp,axis=1) # [n]
+
+def mog_indep_log_prob(_y,_pi_logits,_mu,_var):
+    # _y:[n x d] / _pi_logits:[n x d x k] / _mu:[n x d x k] / _var:[n x d x k]
+    y = _y[:,:,tf.newaxis] # [n x d x 1]
+    log_comp = -0.5*(np.log(2*np.pi)+tf.log(_var)+tf.square(y-_mu)/_var) # [n x d x k]
+    log_pi = tf.nn.log_softmax(_pi_logits,axis=2) # [n x d x k]
+    return tf.reduce_logsumexp(log_pi+log_comp,axis=2) # [n x d]
+
+def mog_sample(_pi_logits,_mu,_var):
+    # Draw one component per input and sample only that Gaussian
+    k = tf.shape(_pi_logits)[1]
+    idx = tf.squeeze(tf.multinomial(_pi_logits,1),axis=1) # [n]
+    onehot = tf.one_hot(idx,k,dtype=_mu.dtype)[:,tf.newaxis,:] # [n x 1 x k]
+    mu_sel = tf.reduce_sum(_mu*onehot,axis=2) # [n x d]
+    var_sel = tf.reduce_sum(_var*onehot,axis=2) # [n x d]
+    return mu_sel + tf.sqrt(var_sel)*tf.random_normal(tf.shape(mu_sel)) # [n x d]
+
+def mog_indep_sample(_pi_logits,_mu,_var):
+    # Draw one component per input and dimension
+    n,d,k = tf.shape(_pi_logits)[0],tf.shape(_pi_logits)[1],tf.shape(_pi_logits)[2]
+    idx = tf.multinomial(tf.reshape(_pi_logits,(-1,k)),1) # [n*d x 1]
+    onehot = tf.one_hot(tf.reshape(idx,(n,d)),k,dtype=_mu.dtype) # [n x d x k]
+    mu_sel = tf.reduce_sum(_mu*onehot,axis=2) # [n x d]
+    var_sel = tf.reduce_sum(_var*onehot,axis=2) # [n x d]
+    return mu_sel + tf.sqrt(var_sel)*tf.random_normal(tf.shape(mu_sel)) # [n x d]
+
+
 class MDN_reg_class(object):
     def __init__(self,_name='mdn',_x_dim=2,_y_dim=1,_k=5,_hids=[32,32],_actv=tf.nn.tanh,
                  _sig_max=0,_SCHEDULE_SIG_MAX=False,
                  _l2_reg_coef=1e-3,
-                 _sess=None,_VERBOSE=True):
+                 _sess=None,_VERBOSE=True,_VECTORIZED=False,_BUILD_OPTM=True):
         # Parse arguments
         self.name = _name
         self.x_dim = _x_dim
@@ -24,19 +316,24 @@ class MDN_reg_class(object):
         self.sig_max = _sig_max
         self.SCHEDULE_SIG_MAX = _SCHEDULE_SIG_MAX
         self.l2_reg_coef = _l2_reg_coef
+        self.VECTORIZED = _VECTORIZED
+        self.BUILD_OPTM = _BUILD_OPTM
         self.sess = _sess
         self.VERBOSE = _VERBOSE
         # Build graph
+        _vars_before = set(var.name for var in tf.global_variables())
         self._build_graph()
+        self.model_vars = [var for var in tf.global_variables() if var.name not in _vars_before]
         # Check parameters
         self.check_params()
         # Initialize parameters 
-        self.sess.run(tf.global_variables_initializer())
+        self.sess.run(tf.variables_initializer(self.model_vars)) # this model only
         
     # Build graph 
     def _build_graph(self):
         # Build
         with tf.variable_scope(self.name,reuse=False) as scope:
+            self.name_scope = scope.original_name_scope
             # Placeholders
             self.x = tf.placeholder(shape=[None,self.x_dim],dtype=tf.float32,name='x') # [n x x_dim]
             self.y = tf.placeholder(shape=[None,self.y_dim],dtype=tf.float32,name='y') # [n x y_dim]
@@ -52,7 +349,8 @@ class MDN_reg_class(object):
             self.pi = tf.layers.dense(self.net,self.k,activation=None,
                                       kernel_initializer=tfrni(stddev=0.01),bias_initializer=tfci(0),
                                       name='pi') # [n x k]
-            self.pi = tf.nn.softmax(1.0*self.pi,axis=1)
+            self.pi_logits = 1.0*self.pi # [n x k]
+            self.pi = tf.nn.softmax(self.pi_logits,axis=1)
             self.layers.append(self.pi)
             self.mu = tf.layers.dense(self.net,self.y_dim*self.k,activation=None,
                                       kernel_initializer=tfrni(stddev=0.01),
@@ -70,39 +368,55 @@ class MDN_reg_class(object):
             else:
                 self.var = self.sig_max*self.sig_rate*tf.nn.sigmoid(self.logvar) # [n x y_dim x k]
             self.layers.append(self.logvar)
-        # Computations 
-        self.cat = tfd.Categorical(probs=self.pi) # categorical r.v.
-        self.comps = [tfd.MultivariateNormalDiag(loc=loc,scale_diag=tf.sqrt(scale)) 
-                        for loc,scale in zip(tf.unstack(tf.transpose(self.mu,[2,0,1])),
-                                             tf.unstack(tf.transpose(self.var,[2,0,1])))]
-        self.tfd_mog = tfd.Mixture(cat=self.cat,components=self.comps) # mixture of Gaussian 
-        self.log_liks = self.tfd_mog.log_prob(self.y) # [n]
-        self.log_lik = tf.reduce_mean(self.log_liks) # [1]
-        # pi:[n x k] / mu:[n x d x k] / var:[n x d x k]
-        # compute EV and VE
-        # E[Var[y]] - Aleatoric
-        # weighted sum of mu
-        pi_axis = self.pi[:,:,tf.newaxis]
-        self.EVs = tf.squeeze(tf.matmul(self.var,pi_axis),axis=2) # [n x y_dim]
-        self.EV = tf.reduce_sum(self.EVs,axis=1) # [n]
-        # Var[E[y]] - Epistemic 
-        mu_average = tf.matmul(self.mu,self.pi[:,:,tf.newaxis]) # [n x y_dim x 1]
-        mu_diff_sq = tf.square(self.mu-mu_average) # [n x y_dim x k]
-        self.VEs = tf.squeeze(tf.matmul(mu_diff_sq,pi_axis),axis=2) # [n x y_dim]
-        self.VE = tf.reduce_sum(self.VEs,axis=1) # [n]
-        # Sampler
-        self.y_sample = tf.squeeze(self.tfd_mog.sample(1),[0]) # [n x y_dim]
+        with tf.name_scope(self.name_scope): # mixture ops under the model's name scope
+            # Computations 
+            if self.VECTORIZED: # single log-sum-exp over [n x y_dim x k] tensors
+                self.log_liks = mog_log_prob(self.y,self.pi_logits,self.mu,self.var) # [n]
+            else:
+                self.cat = tfd.Categorical(probs=self.pi) # categorical r.v.
+                self.comps = [tfd.MultivariateNormalDiag(loc=loc,scale_diag=tf.sqrt(scale)) 
+                                for loc,scale in zip(tf.unstack(tf.transpose(self.mu,[2,0,1])),
+                                                     tf.unstack(tf.transpose(self.var,[2,0,1])))]
+                self.tfd_mog = tfd.Mixture(cat=self.cat,components=self.comps) # mixture of Gaussian 
+                self.log_liks = self.tfd_mog.log_prob(self.y) # [n]
+            self.log_lik = tf.reduce_mean(self.log_liks) # [1]
+            # pi:[n x k] / mu:[n x d x k] / var:[n x d x k]
+            # compute EV and VE
+            # E[Var[y]] - Aleatoric
+            # weighted sum of mu
+            pi_axis = self.pi[:,:,tf.newaxis]
+            self.EVs = tf.squeeze(tf.matmul(self.var,pi_axis),axis=2) # [n x y_dim]
+            self.EV = tf.reduce_sum(self.EVs,axis=1) # [n]
+            # Var[E[y]] - Epistemic 
+            mu_average = tf.matmul(self.mu,self.pi[:,:,tf.newaxis]) # [n x y_dim x 1]
+            mu_diff_sq = tf.square(self.mu-mu_average) # [n x y_dim x k]
+            self.VEs = tf.squeeze(tf.matmul(mu_diff_sq,pi_axis),axis=2) # [n x y_dim]
+            self.VE = tf.reduce_sum(self.VEs,axis=1) # [n]
+            # Sampler
+            if self.VECTORIZED:
+                self.y_sample = mog_sample(self.pi_logits,self.mu,self.var) # [n x y_dim]
+            else:
+                self.y_sample = tf.squeeze(self.tfd_mog.sample(1),[0]) # [n x y_dim]
         # Optimizer
         _g_vars = tf.trainable_variables()
-        self.c_vars = [var for var in _g_vars if '%s/'%(self.name) in var.name]
+        self.c_vars = [var for var in _g_vars if var.name.startswith('%s/'%(self.name))]
         self.l2_reg = self.l2_reg_coef*tf.reduce_sum(tf.stack([tf.nn.l2_loss(v) for v in self.c_vars])) # [1]
         self.cost = -self.log_lik + self.l2_reg # [1]
-        self.optm = tf.train.RMSPropOptimizer(learning_rate=1e-3).minimize(self.cost)
+        _optm_before = set(var.name for var in tf.global_variables())
+        if self.BUILD_OPTM:
+            self.optm = tf.train.RMSPropOptimizer(learning_rate=1e-3).minimize(self.cost)
+        else: # inference only (e.g., a reloaded model)
+            self.optm = None
+        self.optm_vars = [var for var in tf.global_variables() if var.name not in _optm_before]
+        # Tensors available to predict()
+        self.fetchables = {'pi':self.pi,'mu':self.mu,'var':self.var,
+                           'EVs':self.EVs,'VEs':self.VEs,'EV':self.EV,'VE':self.VE,
+                           'y_sample':self.y_sample}
 
     # Check parameters
     def check_params(self):
         _g_vars = tf.global_variables()
-        self.g_vars = [var for var in _g_vars if '%s/'%(self.name) in var.name]
+        self.g_vars = [var for var in _g_vars if var.name.startswith('%s/'%(self.name))]
         if self.VERBOSE:
             print ("==== Global Variables ====")
         for i in range(len(self.g_vars)):
@@ -116,108 +430,122 @@ class MDN_reg_class(object):
             n_layers = len(self.layers)
             for i in range(n_layers):
                 print ("  [%0d/%d] %s %s"%(i,n_layers,self.layers[i].name,self.layers[i].shape))
+
+    # Constructor hyperparameters stored with checkpoints
+    def get_hyper(self):
+        return {'x_dim':self.x_dim,'y_dim':self.y_dim,'k':self.k,'hids':list(self.hids),
+                'actv':get_actv_name(self.actv),'sig_max':self.sig_max,
+                'SCHEDULE_SIG_MAX':self.SCHEDULE_SIG_MAX,'l2_reg_coef':self.l2_reg_coef,
+                'VECTORIZED':self.VECTORIZED}
+
+    # Save model variables (and the optimizer state to resume training) to a '.npz' file
+    def save(self,_path,_SAVE_OPTM=False,_iter=None):
+        save_ckpt(self,_path,self.get_hyper(),_SAVE_OPTM=_SAVE_OPTM,_iter=_iter)
+
+    # Restore variables saved by save(); returns the saved iteration (or None)
+    def restore(self,_path,_LOAD_OPTM=False):
+        return load_ckpt(self,_path,_LOAD_OPTM=_LOAD_OPTM and self.BUILD_OPTM)
+
+    # Build a model from a checkpoint (the optimizer is built only when _TRAIN=True)
+    @classmethod
+    def load(cls,_path,_sess,_name='mdn',_TRAIN=False,_VERBOSE=False):
+        hyper = read_hyper(_path)
+        M = cls(_name=_name,_x_dim=hyper['x_dim'],_y_dim=hyper['y_dim'],_k=hyper['k'],
+                _hids=hyper['hids'],_actv=get_actv(hyper['actv']),_sig_max=hyper['sig_max'],
+                _SCHEDULE_SIG_MAX=hyper['SCHEDULE_SIG_MAX'],_l2_reg_coef=hyper['l2_reg_coef'],
+                _VECTORIZED=hyper['VECTORIZED'],_BUILD_OPTM=_TRAIN,_sess=_sess,_VERBOSE=_VERBOSE)
+        M.restore(_path,_LOAD_OPTM=_TRAIN)
+        return M
+
+    # Export dense-layer weights for the NumPy inference engine (mdn_np.MDN_np_class)
+    def export_params(self,_path=None):
+        params = {'INDEP':False,'x_dim':self.x_dim,'y_dim':self.y_dim,'k':self.k,
+                  'n_hid':len(self.hids),'sig_max':self.sig_max,'actv':get_actv_name(self.actv)}
+        for var,val in zip(self.c_vars,self.sess.run(self.c_vars)):
+            params[var.op.name[len(self.name)+1:]] = val # e.g., 'hid_0/kernel'
+        params.update(nzrs_to_dict(getattr(self,'nzrs',{}))) # normalizers, if attached
+        if _path is not None:
+            np.savez(_path,**params)
+        return params
                 
-    # Plot results
+    # Predict any mix of pi/mu/var/EVs/VEs/EV/VE/y_sample with one sess.run per chunk
+    #  _out: dict of preallocated arrays (e.g., np.memmap) to write into
+    #  _GENERATOR: yield (start,end,outputs) per chunk instead of gathering
+    def predict(self,_x,_fetch=['pi','mu','var'],_batch_size=4096,_sig_rate=1.0,
+                _out=None,_GENERATOR=False):
+        return predict_mdn(self,_x,_fetch,_batch_size,_sig_rate,_out,_GENERATOR)
+
+    # Many samples per input ([n x S x y_dim]); _GENERATOR=True yields (start,end,samples) chunks
+    def sample(self,_x,_n_sample=100,_batch_size=None,_sig_rate=1.0,_out=None,_GENERATOR=False,
+               _rng=np.random):
+        return sample_mdn(self,_x,_n_sample,_batch_size,_sig_rate,_out,_GENERATOR,_rng)
+
+    # Continue training on a stream of (x,y) chunks (see train_incremental_mdn)
+    def train_incremental(self,_chunks,_reservoir=None,_replay_ratio=0.5,_n_epoch=1,_batch_size=256,
+                          _sig_rate=1.0,_callbacks=[],_iter_start=0,_ckpt_path=None,_seed=None):
+        return train_incremental_mdn(self,_chunks,_reservoir=_reservoir,_replay_ratio=_replay_ratio,
+                                     _n_epoch=_n_epoch,_batch_size=_batch_size,_sig_rate=_sig_rate,
+                                     _callbacks=_callbacks,_iter_start=_iter_start,
+                                     _ckpt_path=_ckpt_path,_seed=_seed)
+
+    # Marginal cdf of y per output dimension ([n x y_dim])
+    def cdf(self,_x,_y,_batch_size=4096,_sig_rate=1.0):
+        return cdf_mdn(self,_x,_y,_batch_size,_sig_rate)
+
+    # Marginal quantiles: scalar _q -> [n x y_dim], list of m levels -> [n x m x y_dim]
+    def quantile(self,_x,_q,_batch_size=4096,_sig_rate=1.0,_tol=1e-6):
+        return quantile_mdn(self,_x,_q,_batch_size,_sig_rate,_tol)
+
+    # Central prediction interval with the given coverage (lower,upper: [n x y_dim])
+    def predict_interval(self,_x,_coverage=0.95,_batch_size=4096,_sig_rate=1.0,_tol=1e-6):
+        bounds = self.quantile(_x,[(1-_coverage)/2,(1+_coverage)/2],_batch_size,_sig_rate,_tol)
+        return bounds[:,0,:],bounds[:,1,:]
+
+    # Compact mixtures for downstream consumers (same mean and EVs+VEs per dimension)
+    def reduce(self,_x,_k_target=1,_max_kl=None,_batch_size=4096,_sig_rate=1.0,_CSR=False):
+        return reduce_mdn(self,_x,_k_target,_max_kl,_batch_size,_sig_rate,_CSR)
+
+    # Mean log likelihood over a held-out set, evaluated in chunks
+    def eval_log_lik(self,_x,_y,_batch_size=8192,_sig_rate=1.0):
+        return eval_log_lik(self.sess,self.log_liks,{self.x:_x,self.y:_y},_batch_size,
+                            _feed_dict={self.sig_rate:_sig_rate})
+
+    # Plot results (matplotlib is imported only when plotting)
     def plot_result(self,_x_test,_title='MDN result',_fontsize=18,
                     _figsize=(15,5),_wspace=0.1,_hspace=0.05,_sig_rate=1.0,_pi_th=0.0,
                     _x_train=None,_y_train=None,
                     _ylim=[-3,+3]):
-        # sample
-        y_sample = self.sess.run(self.y_sample,feed_dict={self.x:_x_test,self.sig_rate:_sig_rate}) # [n x y_dim] 
-        mu,var,pi = self.sess.run([self.mu,self.var,self.pi],feed_dict={self.x:_x_test,self.sig_rate:_sig_rate})
-        # plot per each output dimensions (self.y_dim)
-        nr,nc = 1,self.y_dim
-        if nc>2: nc=2 # Upper limit on the number of columns
-        gs  = gridspec.GridSpec(nr,nc)
-        gs.update(wspace=_wspace, hspace=_hspace)
-        fig = plt.figure(figsize=_figsize)
-        fig.suptitle(_title, size=_fontsize)
-        for i in range(nr*nc): # per each dimension
-            ax = plt.subplot(gs[i])
-            cmap = plt.get_cmap('gist_rainbow')
-            colors = [cmap(ii) for ii in np.linspace(0,1,self.k)]
-            if _x_train is not None:
-                plt.plot(_x_train[:,0],_y_train[:,i],'k.')
-            plt.plot(_x_test[:,0],y_sample[:,i],'rx') # plot samples per each dimension
-            for j in range(self.k): # per each mixture, plot variance
-                idx = np.where(pi[:,j]<_pi_th)[0]
-                plt.fill_between(_x_test[idx,0],mu[idx,i,j]-2*np.sqrt(var[idx,i,j]),mu[idx,i,j]+2*np.sqrt(var[idx,i,j]),
-                             facecolor='k', interpolate=True, alpha=0.05)            
-                idx = np.where(pi[:,j]>_pi_th)[0]
-                plt.fill_between(_x_test[idx,0],mu[idx,i,j]-2*np.sqrt(var[idx,i,j]),mu[idx,i,j]+2*np.sqrt(var[idx,i,j]),
-                             facecolor=colors[j], interpolate=True, alpha=0.3)
-            for j in range(self.k): # per each mixture, plot mu
-                idx = np.where(pi[:,j]>_pi_th)[0]
-                plt.plot(_x_test[:,0],mu[:,i,j],'-',color=[0.8,0.8,0.8],linewidth=1)
-                plt.plot(_x_test[idx,0],mu[idx,i,j],'-',color=colors[j],linewidth=3)
-            plt.xlim([_x_test.min(),_x_test.max()])
-            plt.ylim(_ylim)
-            plt.xlabel('Input',fontsize=13)
-            plt.ylabel('Output',fontsize=13)
-            plt.title('[%d]-th dimension'%(i+1),fontsize=13)
-        plt.show()
+        from plot_util import plot_mdn_result
+        plot_mdn_result(self,_x_test,_title=_title,_fontsize=_fontsize,_figsize=_figsize,
+                        _wspace=_wspace,_hspace=_hspace,_sig_rate=_sig_rate,_pi_th=_pi_th,
+                        _x_train=_x_train,_y_train=_y_train,_ylim=_ylim)
 
     # Plot
     def plot_variances(self,_x_test,_title='blue:Var[E[y|x]] / red:E[Var[y|x]]',_fontsize=18,
                        _figsize=(15,5),_wspace=0.1,_hspace=0.05):
-        # Plot EV and VE
-        VEs,EVs = self.sess.run([self.VEs,self.EVs],feed_dict={self.x:_x_test,self.sig_rate:1.0}) # sig_rate
-        VEs = 0.1*VEs # scale V[E[y|x]] to match that of E[V[y|x]]
-        # plot per each output dimensions (self.y_dim)
-        nr,nc = 1,self.y_dim
-        if nc>2: nc=2 # Upper limit on the number of columns
-        gs  = gridspec.GridSpec(nr,nc)
-        gs.update(wspace=_wspace, hspace=_hspace)
-        fig = plt.figure(figsize=_figsize)
-        fig.suptitle(_title, size=_fontsize)
-        for i in range(nr*nc): # per each dimension
-            ax = plt.subplot(gs[i])
-            plt.plot(_x_test.squeeze(),VEs[:,i],'b-')
-            plt.plot(_x_test.squeeze(),EVs[:,i],'r-')
-            plt.xlim([_x_test.min(),_x_test.max()])
-            plt.xlabel('Input',fontsize=13)
-            plt.ylabel('Output',fontsize=13)
-            plt.title('[%d]-th dimension'%(i+1),fontsize=13)
-        plt.show()
-        
+        from plot_util import plot_mdn_variances
+        plot_mdn_variances(self,_x_test,_title=_title,_fontsize=_fontsize,_figsize=_figsize,
+                           _wspace=_wspace,_hspace=_hspace)
     
     # Train the mixture of density network
-    def train(self,_x_train,_y_train,_x_test,_max_iter=10000,_batch_size=256,_pi_th=0.1,
-              _SHOW_EVERY=10,_figsize=(15,5),_ylim=[-3,+3]):    
-        n_train = _x_train.shape[0]
-        for iter in range(_max_iter): 
-            iter_rate_1to0 = np.exp(-4*((iter+1.0)/_max_iter)**2)
-            iter_rate_0to1 = 1-iter_rate_1to0
-            if self.SCHEDULE_SIG_MAX: # schedule sig_max
-                sig_rate = iter_rate_0to1
-            else:
-                sig_rate = iter_rate_0to1
-            r_idx = np.random.permutation(n_train)[:_batch_size]
-            x_batch,y_batch = _x_train[r_idx,:],_y_train[r_idx,:] # current batch
-            # Optimize the network 
-            _,cost_val = self.sess.run([self.optm,self.cost],
-                                       feed_dict={self.x:x_batch,self.y:y_batch,
-                                                  self.sig_rate:sig_rate})
-            # See progress
-            if ((iter%(_max_iter//_SHOW_EVERY))==0) | (iter==(_max_iter-1)):
-                # Plot results
-                self.plot_result(_x_test=_x_test,_x_train=_x_train,_y_train=_y_train,
-                                 _sig_rate=sig_rate,_pi_th=_pi_th,
-                                 _title='[%d/%d] Black dots:training data / Red crosses:samples'%(iter,_max_iter),
-                                 _fontsize=18,_figsize=_figsize,_ylim=_ylim)
-                self.plot_variances(_x_test=_x_test,
-                                    _title='blue:Var[E[y|x]] (epistemic) / red:E[Var[y|x]] (aleatoric)',
-                                    _figsize=_figsize)
-                
-                # Print-out
-                print ("[%03d/%d] cost:%.4f"%(iter,_max_iter,cost_val)) 
+    def train(self,_x_train,_y_train,_x_test=None,_max_iter=10000,_batch_size=256,_pi_th=0.1,
+              _SHOW_EVERY=10,_figsize=(15,5),_ylim=[-3,+3],_PLOT=True,_callbacks=[],
+              _n_prefetch=2,_block_size=None,_ckpt_path=None,_CKPT_EVERY=1000,_RESUME=False,
+              _profiler=None,_x_val=None,_y_val=None,_EVAL_EVERY=500,_patience=None,_min_delta=0.0,
+              _RESTORE_BEST=True,_sig_horizon=None):
+        train_mdn(self,_x_train,_y_train,_x_test=_x_test,_max_iter=_max_iter,_batch_size=_batch_size,
+                  _pi_th=_pi_th,_SHOW_EVERY=_SHOW_EVERY,_figsize=_figsize,_ylim=_ylim,
+                  _PLOT=_PLOT,_callbacks=_callbacks,_n_prefetch=_n_prefetch,_block_size=_block_size,
+                  _ckpt_path=_ckpt_path,_CKPT_EVERY=_CKPT_EVERY,_RESUME=_RESUME,_profiler=_profiler,
+                  _x_val=_x_val,_y_val=_y_val,_EVAL_EVERY=_EVAL_EVERY,_patience=_patience,
+                  _min_delta=_min_delta,_RESTORE_BEST=_RESTORE_BEST,_sig_horizon=_sig_horizon)
 
                 
 class MDN_reg_indep_class(object):
     def __init__(self,_name='mdn',_x_dim=2,_y_dim=1,_k=5,_hids=[32,32],_actv=tf.nn.tanh,
                  _sig_max=0,_SCHEDULE_SIG_MAX=False,
                  _l2_reg_coef=1e-3,
-                 _sess=None,_VERBOSE=True):
+                 _sess=None,_VERBOSE=True,_VECTORIZED=False,_BUILD_OPTM=True):
         # Parse arguments
         self.name = _name
         self.x_dim = _x_dim
@@ -228,19 +556,24 @@ class MDN_reg_indep_class(object):
         self.sig_max = _sig_max
         self.SCHEDULE_SIG_MAX = _SCHEDULE_SIG_MAX
         self.l2_reg_coef = _l2_reg_coef
+        self.VECTORIZED = _VECTORIZED
+        self.BUILD_OPTM = _BUILD_OPTM
         self.sess = _sess
         self.VERBOSE = _VERBOSE
         # Build graph
+        _vars_before = set(var.name for var in tf.global_variables())
         self._build_graph()
+        self.model_vars = [var for var in tf.global_variables() if var.name not in _vars_before]
         # Check parameters
         self.check_params()
         # Initialize parameters 
-        self.sess.run(tf.global_variables_initializer())
+        self.sess.run(tf.variables_initializer(self.model_vars)) # this model only
         
     # Build graph 
     def _build_graph(self):
         # Build
         with tf.variable_scope(self.name,reuse=False) as scope:
+            self.name_scope = scope.original_name_scope
             # Placeholders
             self.x = tf.placeholder(shape=[None,self.x_dim],dtype=tf.float32,name='x') # [n x x_dim]
             self.y = tf.placeholder(shape=[None,self.y_dim],dtype=tf.float32,name='y') # [n x y_dim]
@@ -256,8 +589,8 @@ class MDN_reg_indep_class(object):
             self.pi = tf.layers.dense(self.net,self.y_dim*self.k,activation=None,
                                       kernel_initializer=tfrni(stddev=0.01),bias_initializer=tfci(0),
                                       name='pi') 
-            self.pi = tf.reshape(self.pi,shape=(-1,self.y_dim,self.k)) # [n x y_dim x k]
-            self.pi = tf.nn.softmax(self.pi,axis=2)
+            self.pi_logits = tf.reshape(self.pi,shape=(-1,self.y_dim,self.k)) # [n x y_dim x k]
+            self.pi = tf.nn.softmax(self.pi_logits,axis=2)
             self.layers.append(self.pi) # append pi
             self.mu = tf.layers.dense(self.net,self.y_dim*self.k,activation=None,
                                       kernel_initializer=tfrni(stddev=0.01),
@@ -276,44 +609,60 @@ class MDN_reg_indep_class(object):
                 self.var = self.sig_max*self.sig_rate*tf.nn.sigmoid(self.logvar) # [n x y_dim x k]
             self.layers.append(self.var) # append var
         
-        # Computations
-        self.cat = tfd.Categorical(probs=self.pi) # categorical r.v.
-        self.comps = [tfd.Normal(loc=loc,scale=tf.sqrt(scale))
-                        for loc,scale in zip(tf.unstack(tf.transpose(self.mu,[2,0,1])),
-                                             tf.unstack(tf.transpose(self.var,[2,0,1]))
-                                             )
-                      ]
-        self.tfd_mog = tfd.Mixture(cat=self.cat,components=self.comps) # mixture of Gaussian [n x d]
-        self.log_liks = self.tfd_mog.log_prob(self.y) # [n x 2]
-        self.log_lik = tf.reduce_mean(self.log_liks) # [1]
+        with tf.name_scope(self.name_scope): # mixture ops under the model's name scope
+            # Computations
+            if self.VECTORIZED: # single log-sum-exp over [n x y_dim x k] tensors
+                self.log_liks = mog_indep_log_prob(self.y,self.pi_logits,self.mu,self.var) # [n x y_dim]
+            else:
+                self.cat = tfd.Categorical(probs=self.pi) # categorical r.v.
+                self.comps = [tfd.Normal(loc=loc,scale=tf.sqrt(scale))
+                                for loc,scale in zip(tf.unstack(tf.transpose(self.mu,[2,0,1])),
+                                                     tf.unstack(tf.transpose(self.var,[2,0,1]))
+                                                     )
+                              ]
+                self.tfd_mog = tfd.Mixture(cat=self.cat,components=self.comps) # mixture of Gaussian [n x d]
+                self.log_liks = self.tfd_mog.log_prob(self.y) # [n x 2]
+            self.log_lik = tf.reduce_mean(self.log_liks) # [1]
         
-        # compute EV and VE
-        # pi:[n x d x k] / mu:[n x d x k] / var:[n x d x k]
-        # E[Var[y]] - Aleatoric
-        # weighted sum of mu
-        self.EVs = tf.reduce_sum(tf.multiply(self.var,self.pi),axis=2) # [n x y_dim]
-        self.EV = tf.reduce_sum(self.EVs,axis=1) # [n]
-        # Var[E[y]] - Epistemic 
-        mu_average = tf.reduce_sum(tf.multiply(self.mu,self.pi),axis=2) # [n x y_dim x k] => [n x y_dim]
-        mu_diff_sq = tf.square(self.mu-tf.tile(mu_average[:,:,tf.newaxis],[1,1,self.k])) # [n x y_dim x k]
-        self.VEs = tf.reduce_sum(tf.multiply(mu_diff_sq,self.pi),axis=2) # [n x y_dim]
-        self.VE = tf.reduce_sum(self.VEs,axis=1) # [n]
+            # compute EV and VE
+            # pi:[n x d x k] / mu:[n x d x k] / var:[n x d x k]
+            # E[Var[y]] - Aleatoric
+            # weighted sum of mu
+            self.EVs = tf.reduce_sum(tf.multiply(self.var,self.pi),axis=2) # [n x y_dim]
+            self.EV = tf.reduce_sum(self.EVs,axis=1) # [n]
+            # Var[E[y]] - Epistemic 
+            mu_average = tf.reduce_sum(tf.multiply(self.mu,self.pi),axis=2) # [n x y_dim x k] => [n x y_dim]
+            mu_diff_sq = tf.square(self.mu-tf.tile(mu_average[:,:,tf.newaxis],[1,1,self.k])) # [n x y_dim x k]
+            self.VEs = tf.reduce_sum(tf.multiply(mu_diff_sq,self.pi),axis=2) # [n x y_dim]
+            self.VE = tf.reduce_sum(self.VEs,axis=1) # [n]
         
-        # Sampler
-        self.y_sample = tf.squeeze(self.tfd_mog.sample(1),[0]) # [n x y_dim]
+            # Sampler
+            if self.VECTORIZED:
+                self.y_sample = mog_indep_sample(self.pi_logits,self.mu,self.var) # [n x y_dim]
+            else:
+                self.y_sample = tf.squeeze(self.tfd_mog.sample(1),[0]) # [n x y_dim]
         
         # Optimizer
         _g_vars = tf.trainable_variables()
-        self.c_vars = [var for var in _g_vars if '%s/'%(self.name) in var.name]
+        self.c_vars = [var for var in _g_vars if var.name.startswith('%s/'%(self.name))]
         self.l2_reg = self.l2_reg_coef*tf.reduce_sum(tf.stack([tf.nn.l2_loss(v) for v in self.c_vars])) # [1]
         self.cost = -self.log_lik + self.l2_reg # [1]
-        self.optm = tf.train.RMSPropOptimizer(learning_rate=1e-3).minimize(self.cost)
+        _optm_before = set(var.name for var in tf.global_variables())
+        if self.BUILD_OPTM:
+            self.optm = tf.train.RMSPropOptimizer(learning_rate=1e-3).minimize(self.cost)
+        else: # inference only (e.g., a reloaded model)
+            self.optm = None
+        self.optm_vars = [var for var in tf.global_variables() if var.name not in _optm_before]
+        # Tensors available to predict()
+        self.fetchables = {'pi':self.pi,'mu':self.mu,'var':self.var,
+                           'EVs':self.EVs,'VEs':self.VEs,'EV':self.EV,'VE':self.VE,
+                           'y_sample':self.y_sample}
         
 
     # Check parameters
     def check_params(self):
         _g_vars = tf.global_variables()
-        self.g_vars = [var for var in _g_vars if '%s/'%(self.name) in var.name]
+        self.g_vars = [var for var in _g_vars if var.name.startswith('%s/'%(self.name))]
         if self.VERBOSE:
             print ("==== Global Variables ====")
         for i in range(len(self.g_vars)):
@@ -327,99 +676,113 @@ class MDN_reg_indep_class(object):
             n_layers = len(self.layers)
             for i in range(n_layers):
                 print ("  [%0d/%d] %s %s"%(i,n_layers,self.layers[i].name,self.layers[i].shape))
+
+    # Constructor hyperparameters stored with checkpoints
+    def get_hyper(self):
+        return {'x_dim':self.x_dim,'y_dim':self.y_dim,'k':self.k,'hids':list(self.hids),
+                'actv':get_actv_name(self.actv),'sig_max':self.sig_max,
+                'SCHEDULE_SIG_MAX':self.SCHEDULE_SIG_MAX,'l2_reg_coef':self.l2_reg_coef,
+                'VECTORIZED':self.VECTORIZED}
+
+    # Save model variables (and the optimizer state to resume training) to a '.npz' file
+    def save(self,_path,_SAVE_OPTM=False,_iter=None):
+        save_ckpt(self,_path,self.get_hyper(),_SAVE_OPTM=_SAVE_OPTM,_iter=_iter)
+
+    # Restore variables saved by save(); returns the saved iteration (or None)
+    def restore(self,_path,_LOAD_OPTM=False):
+        return load_ckpt(self,_path,_LOAD_OPTM=_LOAD_OPTM and self.BUILD_OPTM)
+
+    # Build a model from a checkpoint (the optimizer is built only when _TRAIN=True)
+    @classmethod
+    def load(cls,_path,_sess,_name='mdn',_TRAIN=False,_VERBOSE=False):
+        hyper = read_hyper(_path)
+        M = cls(_name=_name,_x_dim=hyper['x_dim'],_y_dim=hyper['y_dim'],_k=hyper['k'],
+                _hids=hyper['hids'],_actv=get_actv(hyper['actv']),_sig_max=hyper['sig_max'],
+                _SCHEDULE_SIG_MAX=hyper['SCHEDULE_SIG_MAX'],_l2_reg_coef=hyper['l2_reg_coef'],
+                _VECTORIZED=hyper['VECTORIZED'],_BUILD_OPTM=_TRAIN,_sess=_sess,_VERBOSE=_VERBOSE)
+        M.restore(_path,_LOAD_OPTM=_TRAIN)
+        return M
+
+    # Export dense-layer weights for the NumPy inference engine (mdn_np.MDN_np_class)
+    def export_params(self,_path=None):
+        params = {'INDEP':True,'x_dim':self.x_dim,'y_dim':self.y_dim,'k':self.k,
+                  'n_hid':len(self.hids),'sig_max':self.sig_max,'actv':get_actv_name(self.actv)}
+        for var,val in zip(self.c_vars,self.sess.run(self.c_vars)):
+            params[var.op.name[len(self.name)+1:]] = val # e.g., 'hid_0/kernel'
+        params.update(nzrs_to_dict(getattr(self,'nzrs',{}))) # normalizers, if attached
+        if _path is not None:
+            np.savez(_path,**params)
+        return params
                 
-    # Plot results
+    # Predict any mix of pi/mu/var/EVs/VEs/EV/VE/y_sample with one sess.run per chunk
+    #  _out: dict of preallocated arrays (e.g., np.memmap) to write into
+    #  _GENERATOR: yield (start,end,outputs) per chunk instead of gathering
+    def predict(self,_x,_fetch=['pi','mu','var'],_batch_size=4096,_sig_rate=1.0,
+                _out=None,_GENERATOR=False):
+        return predict_mdn(self,_x,_fetch,_batch_size,_sig_rate,_out,_GENERATOR)
+
+    # Many samples per input ([n x S x y_dim]); _GENERATOR=True yields (start,end,samples) chunks
+    def sample(self,_x,_n_sample=100,_batch_size=None,_sig_rate=1.0,_out=None,_GENERATOR=False,
+               _rng=np.random):
+        return sample_mdn(self,_x,_n_sample,_batch_size,_sig_rate,_out,_GENERATOR,_rng)
+
+    # Continue training on a stream of (x,y) chunks (see train_incremental_mdn)
+    def train_incremental(self,_chunks,_reservoir=None,_replay_ratio=0.5,_n_epoch=1,_batch_size=256,
+                          _sig_rate=1.0,_callbacks=[],_iter_start=0,_ckpt_path=None,_seed=None):
+        return train_incremental_mdn(self,_chunks,_reservoir=_reservoir,_replay_ratio=_replay_ratio,
+                                     _n_epoch=_n_epoch,_batch_size=_batch_size,_sig_rate=_sig_rate,
+                                     _callbacks=_callbacks,_iter_start=_iter_start,
+                                     _ckpt_path=_ckpt_path,_seed=_seed)
+
+    # Marginal cdf of y per output dimension ([n x y_dim])
+    def cdf(self,_x,_y,_batch_size=4096,_sig_rate=1.0):
+        return cdf_mdn(self,_x,_y,_batch_size,_sig_rate)
+
+    # Marginal quantiles: scalar _q -> [n x y_dim], list of m levels -> [n x m x y_dim]
+    def quantile(self,_x,_q,_batch_size=4096,_sig_rate=1.0,_tol=1e-6):
+        return quantile_mdn(self,_x,_q,_batch_size,_sig_rate,_tol)
+
+    # Central prediction interval with the given coverage (lower,upper: [n x y_dim])
+    def predict_interval(self,_x,_coverage=0.95,_batch_size=4096,_sig_rate=1.0,_tol=1e-6):
+        bounds = self.quantile(_x,[(1-_coverage)/2,(1+_coverage)/2],_batch_size,_sig_rate,_tol)
+        return bounds[:,0,:],bounds[:,1,:]
+
+    # Compact mixtures for downstream consumers (same mean and EVs+VEs per dimension)
+    def reduce(self,_x,_k_target=1,_max_kl=None,_batch_size=4096,_sig_rate=1.0,_CSR=False):
+        return reduce_mdn(self,_x,_k_target,_max_kl,_batch_size,_sig_rate,_CSR)
+
+    # Mean log likelihood over a held-out set, evaluated in chunks
+    def eval_log_lik(self,_x,_y,_batch_size=8192,_sig_rate=1.0):
+        return eval_log_lik(self.sess,self.log_liks,{self.x:_x,self.y:_y},_batch_size,
+                            _feed_dict={self.sig_rate:_sig_rate})
+
+    # Plot results (matplotlib is imported only when plotting)
     def plot_result(self,_x_test,_title='MDN result',_fontsize=18,
                     _figsize=(15,5),_wspace=0.1,_hspace=0.05,_sig_rate=1.0,_pi_th=0.0,
                     _x_train=None,_y_train=None,
                     _ylim=[-3,+3]):
-        # sample
-        y_sample = self.sess.run(self.y_sample,feed_dict={self.x:_x_test,self.sig_rate:_sig_rate}) # [n x y_dim] 
-        mu,var,pi = self.sess.run([self.mu,self.var,self.pi],feed_dict={self.x:_x_test,self.sig_rate:_sig_rate})
-        # plot per each output dimensions (self.y_dim)
-        nr,nc = 1,self.y_dim
-        if nc>2: nc=2 # Upper limit on the number of columns
-        gs  = gridspec.GridSpec(nr,nc)
-        gs.update(wspace=_wspace, hspace=_hspace)
-        fig = plt.figure(figsize=_figsize)
-        fig.suptitle(_title, size=_fontsize)
-        for i in range(nr*nc): # per each dimension
-            ax = plt.subplot(gs[i])
-            cmap = plt.get_cmap('gist_rainbow')
-            colors = [cmap(ii) for ii in np.linspace(0,1,self.k)]
-            if _x_train is not None:
-                plt.plot(_x_train[:,0],_y_train[:,i],'k.')
-            plt.plot(_x_test[:,0],y_sample[:,i],'rx') # plot samples per each dimension
-            for j in range(self.k): # per each mixture, plot variance
-                idx = np.where(pi[:,i,j]<_pi_th)[0]
-                plt.fill_between(_x_test[idx,0],mu[idx,i,j]-2*np.sqrt(var[idx,i,j]),mu[idx,i,j]+2*np.sqrt(var[idx,i,j]),
-                             facecolor='k', interpolate=True, alpha=0.05)            
-                idx = np.where(pi[:,i,j]>_pi_th)[0]
-                plt.fill_between(_x_test[idx,0],mu[idx,i,j]-2*np.sqrt(var[idx,i,j]),mu[idx,i,j]+2*np.sqrt(var[idx,i,j]),
-                             facecolor=colors[j], interpolate=True, alpha=0.3)
-            for j in range(self.k): # per each mixture, plot mu
-                idx = np.where(pi[:,i,j]>_pi_th)[0]
-                plt.plot(_x_test[:,0],mu[:,i,j],'-',color=[0.8,0.8,0.8],linewidth=1)
-                plt.plot(_x_test[idx,0],mu[idx,i,j],'-',color=colors[j],linewidth=3)
-            plt.xlim([_x_test.min(),_x_test.max()])
-            plt.ylim(_ylim)
-            plt.xlabel('Input',fontsize=13)
-            plt.ylabel('Output',fontsize=13)
-            plt.title('[%d]-th dimension'%(i+1),fontsize=13)
-        plt.show()
+        from plot_util import plot_mdn_result
+        plot_mdn_result(self,_x_test,_title=_title,_fontsize=_fontsize,_figsize=_figsize,
+                        _wspace=_wspace,_hspace=_hspace,_sig_rate=_sig_rate,_pi_th=_pi_th,
+                        _x_train=_x_train,_y_train=_y_train,_ylim=_ylim)
 
     # Plot
     def plot_variances(self,_x_test,_title='blue:Var[E[y|x]] / red:E[Var[y|x]]',_fontsize=18,
                        _figsize=(15,5),_wspace=0.1,_hspace=0.05):
-        # Plot EV and VE
-        VEs,EVs = self.sess.run([self.VEs,self.EVs],feed_dict={self.x:_x_test,self.sig_rate:1.0}) # sig_rate
-        VEs = 0.1*VEs # scale V[E[y|x]] to match that of E[V[y|x]]
-        # plot per each output dimensions (self.y_dim)
-        nr,nc = 1,self.y_dim
-        if nc>2: nc=2 # Upper limit on the number of columns
-        gs = gridspec.GridSpec(nr,nc)
-        gs.update(wspace=_wspace, hspace=_hspace)
-        fig = plt.figure(figsize=_figsize)
-        fig.suptitle(_title, size=_fontsize)
-        for i in range(nr*nc): # per each dimension
-            ax = plt.subplot(gs[i])
-            plt.plot(_x_test.squeeze(),VEs[:,i],'b-')
-            plt.plot(_x_test.squeeze(),EVs[:,i],'r-')
-            plt.xlim([_x_test.min(),_x_test.max()])
-            plt.xlabel('Input',fontsize=13)
-            plt.ylabel('Output',fontsize=13)
-            plt.title('[%d]-th dimension'%(i+1),fontsize=13)
-        plt.show()
-        
+        from plot_util import plot_mdn_variances
+        plot_mdn_variances(self,_x_test,_title=_title,_fontsize=_fontsize,_figsize=_figsize,
+                           _wspace=_wspace,_hspace=_hspace)
     
     # Train the mixture of density network
-    def train(self,_x_train,_y_train,_x_test,_max_iter=10000,_batch_size=256,_pi_th=0.1,
-              _SHOW_EVERY=10,_figsize=(15,5),_ylim=[-3,+3]):    
-        n_train = _x_train.shape[0]
-        for iter in range(_max_iter): 
-            iter_rate_1to0 = np.exp(-4*((iter+1.0)/_max_iter)**2)
-            iter_rate_0to1 = 1-iter_rate_1to0
-            if self.SCHEDULE_SIG_MAX: # schedule sig_max
-                sig_rate = iter_rate_0to1
-            else:
-                sig_rate = iter_rate_0to1
-            r_idx = np.random.permutation(n_train)[:_batch_size]
-            x_batch,y_batch = _x_train[r_idx,:],_y_train[r_idx,:] # current batch
-            # Optimize the network 
-            _,cost_val = self.sess.run([self.optm,self.cost],
-                                       feed_dict={self.x:x_batch,self.y:y_batch,
-                                                  self.sig_rate:sig_rate})
-            # See progress
-            if ((iter%(_max_iter//_SHOW_EVERY))==0) | (iter==(_max_iter-1)):
-                # Plot results
-                self.plot_result(_x_test=_x_test,_x_train=_x_train,_y_train=_y_train,
-                                 _sig_rate=sig_rate,_pi_th=_pi_th,
-                                 _title='[%d/%d] Black dots:training data / Red crosses:samples'%(iter,_max_iter),
-                                 _fontsize=18,_figsize=_figsize,_ylim=_ylim)
-                self.plot_variances(_x_test=_x_test,
-                                    _title='blue:Var[E[y|x]] (epistemic) / red:E[Var[y|x]] (aleatoric)',
-                                    _figsize=_figsize)
-                
-                # Print-out
-                print ("[%03d/%d] cost:%.4f"%(iter,_max_iter,cost_val)) 
+    def train(self,_x_train,_y_train,_x_test=None,_max_iter=10000,_batch_size=256,_pi_th=0.1,
+              _SHOW_EVERY=10,_figsize=(15,5),_ylim=[-3,+3],_PLOT=True,_callbacks=[],
+              _n_prefetch=2,_block_size=None,_ckpt_path=None,_CKPT_EVERY=1000,_RESUME=False,
+              _profiler=None,_x_val=None,_y_val=None,_EVAL_EVERY=500,_patience=None,_min_delta=0.0,
+              _RESTORE_BEST=True,_sig_horizon=None):
+        train_mdn(self,_x_train,_y_train,_x_test=_x_test,_max_iter=_max_iter,_batch_size=_batch_size,
+                  _pi_th=_pi_th,_SHOW_EVERY=_SHOW_EVERY,_figsize=_figsize,_ylim=_ylim,
+                  _PLOT=_PLOT,_callbacks=_callbacks,_n_prefetch=_n_prefetch,_block_size=_block_size,
+                  _ckpt_path=_ckpt_path,_CKPT_EVERY=_CKPT_EVERY,_RESUME=_RESUME,_profiler=_profiler,
+                  _x_val=_x_val,_y_val=_y_val,_EVAL_EVERY=_EVAL_EVERY,_patience=_patience,
+                  _min_delta=_min_delta,_RESTORE_BEST=_RESTORE_BEST,_sig_horizon=_sig_horizon)
      
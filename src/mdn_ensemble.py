@@ -0,0 +1,193 @@
+import numpy as np
+import tensorflow as tf
+from mdn_class import (mog_log_prob,mog_indep_log_prob,mog_sample,mog_indep_sample,
+                       predict_mdn,train_mdn,get_actv_name,get_actv)
+from ckpt_util import save_ckpt,load_ckpt,read_hyper
+from util import eval_log_lik
+
+tfrni = tf.random_normal_initializer
+tfci = tf.constant_initializer
+tfrui = tf.random_uniform_initializer
+
+# Ensemble of M identical MDNs trained in a single graph
+#  Every weight carries a leading [M] axis and the layers are batched matmuls, so one sess.run
+#  updates all members. Members differ by their random initialization and l2_reg_coef.
+class MDN_ensemble_class(object):
+    def __init__(self,_name='mdn_ens',_n_model=5,_x_dim=2,_y_dim=1,_k=5,_hids=[32,32],_actv=tf.nn.tanh,
+                 _sig_max=0,_SCHEDULE_SIG_MAX=False,
+                 _l2_reg_coef=1e-3,_INDEP=False,_BUILD_OPTM=True,
+                 _sess=None,_VERBOSE=True):
+        # Parse arguments
+        self.name = _name
+        self.n_model = _n_model
+        self.x_dim = _x_dim
+        self.y_dim = _y_dim
+        self.k = _k
+        self.hids = _hids
+        self.actv = _actv
+        self.sig_max = _sig_max
+        self.SCHEDULE_SIG_MAX = _SCHEDULE_SIG_MAX
+        self.l2_reg_coefs = np.broadcast_to(np.asarray(_l2_reg_coef,dtype=np.float32),(self.n_model,)).copy()
+        self.INDEP = _INDEP
+        self.BUILD_OPTM = _BUILD_OPTM
+        self.sess = _sess
+        self.VERBOSE = _VERBOSE
+        # Build graph
+        _vars_before = set(var.name for var in tf.global_variables())
+        self._build_graph()
+        self.model_vars = [var for var in tf.global_variables() if var.name not in _vars_before]
+        # Initialize parameters
+        self.sess.run(tf.variables_initializer(self.model_vars)) # this model only
+        if self.VERBOSE:
+            for var in self.c_vars:
+                print ("  Name:[%s] Shape:[%s]"%(var.name,var.get_shape().as_list()))
+
+    # Batched dense layer: [M x n x d_in] => [M x n x d_out]
+    def _dense(self,_net,_d_out,_name,_actv=None,_bias_initializer=tfci(0)):
+        d_in = _net.get_shape().as_list()[-1]
+        with tf.variable_scope(_name):
+            W = tf.get_variable('kernel',shape=(self.n_model,d_in,_d_out),initializer=tfrni(stddev=0.01))
+            b = tf.get_variable('bias',shape=(self.n_model,1,_d_out),initializer=_bias_initializer)
+        net = tf.matmul(_net,W)+b
+        if _actv is not None:
+            net = _actv(net)
+        return net
+
+    # Build graph
+    def _build_graph(self):
+        M,k,y_dim = self.n_model,self.k,self.y_dim
+        with tf.variable_scope(self.name,reuse=False) as scope:
+            self.name_scope = scope.original_name_scope
+            # Placeholders (all members see the same batch)
+            self.x = tf.placeholder(shape=[None,self.x_dim],dtype=tf.float32,name='x') # [n x x_dim]
+            self.y = tf.placeholder(shape=[None,self.y_dim],dtype=tf.float32,name='y') # [n x y_dim]
+            self.sig_rate = tf.placeholder(shape=[],dtype=tf.float32,name='sig_rate') # [1]
+            self.net = tf.tile(self.x[tf.newaxis,:,:],[M,1,1]) # [M x n x x_dim]
+            for h_idx,hid in enumerate(self.hids):
+                self.net = self._dense(self.net,hid,'hid_%d'%(h_idx),_actv=self.actv) # [M x n x hid]
+            if self.INDEP:
+                self.pi_logits = tf.reshape(self._dense(self.net,y_dim*k,'pi'),(M,-1,y_dim,k)) # [M x n x y_dim x k]
+            else:
+                self.pi_logits = self._dense(self.net,k,'pi') # [M x n x k]
+            self.pi = tf.nn.softmax(self.pi_logits,axis=-1)
+            self.mu = tf.reshape(self._dense(self.net,y_dim*k,'mu',_bias_initializer=tfrui(minval=-1,maxval=+1)),
+                                 (M,-1,y_dim,k)) # [M x n x y_dim x k]
+            self.logvar = tf.reshape(self._dense(self.net,y_dim*k,'logvar'),(M,-1,y_dim,k)) # [M x n x y_dim x k]
+            if self.sig_max == 0:
+                self.var = tf.exp(self.logvar) # [M x n x y_dim x k]
+            else:
+                self.var = self.sig_max*self.sig_rate*tf.nn.sigmoid(self.logvar) # [M x n x y_dim x k]
+        self.c_vars = [var for var in tf.trainable_variables() if var.name.startswith('%s/'%(self.name))]
+        with tf.name_scope(self.name_scope): # mixture ops under the model's name scope
+            # Log likelihood per member: fold [M x n] into the batch axis of the vectorized head
+            y_tile = tf.reshape(tf.tile(self.y[tf.newaxis,:,:],[M,1,1]),(-1,y_dim)) # [M*n x y_dim]
+            mu_flat,var_flat = tf.reshape(self.mu,(-1,y_dim,k)),tf.reshape(self.var,(-1,y_dim,k))
+            if self.INDEP:
+                pi_logits_flat = tf.reshape(self.pi_logits,(-1,y_dim,k))
+                self.log_liks = tf.reshape(mog_indep_log_prob(y_tile,pi_logits_flat,mu_flat,var_flat),(M,-1,y_dim)) # [M x n x y_dim]
+                self.log_lik_members = tf.reduce_mean(self.log_liks,axis=[1,2]) # [M]
+                self.y_sample = tf.reshape(mog_indep_sample(pi_logits_flat,mu_flat,var_flat),(M,-1,y_dim)) # [M x n x y_dim]
+            else:
+                pi_logits_flat = tf.reshape(self.pi_logits,(-1,k))
+                self.log_liks = tf.reshape(mog_log_prob(y_tile,pi_logits_flat,mu_flat,var_flat),(M,-1)) # [M x n]
+                self.log_lik_members = tf.reduce_mean(self.log_liks,axis=1) # [M]
+                self.y_sample = tf.reshape(mog_sample(pi_logits_flat,mu_flat,var_flat),(M,-1,y_dim)) # [M x n x y_dim]
+            self.log_lik = tf.reduce_mean(self.log_lik_members) # [1]
+            # EV and VE per member
+            pi_d = self.pi if self.INDEP else self.pi[:,:,tf.newaxis,:] # [M x n x y_dim x k]
+            self.EVs_members = tf.reduce_sum(pi_d*self.var,axis=3) # [M x n x y_dim] E[Var[y]] - Aleatoric
+            mu_average = tf.reduce_sum(pi_d*self.mu,axis=3) # [M x n x y_dim]
+            self.VEs_members = tf.reduce_sum(pi_d*tf.square(self.mu-mu_average[:,:,:,tf.newaxis]),axis=3) # [M x n x y_dim]
+            # Ensemble-aggregated moments (uniform mixture over members)
+            mu_ens = tf.reduce_mean(mu_average,axis=0) # [n x y_dim]
+            self.EVs = tf.reduce_mean(self.EVs_members,axis=0) # [n x y_dim]
+            self.VEs_between = tf.reduce_mean(tf.square(mu_average-mu_ens),axis=0) # [n x y_dim] member disagreement
+            self.VEs = tf.reduce_mean(self.VEs_members,axis=0)+self.VEs_between # [n x y_dim]
+            self.EV = tf.reduce_sum(self.EVs,axis=1) # [n]
+            self.VE = tf.reduce_sum(self.VEs,axis=1) # [n]
+        # Per-member l2 regularizer: the members' costs are independent, so summing them
+        # gives each member the gradient it would get when trained alone
+        self.l2_regs = tf.add_n([tf.reduce_sum(tf.square(v),axis=list(range(1,len(v.get_shape()))))/2.0
+                                 for v in self.c_vars]) # [M]
+        self.cost_members = -self.log_lik_members+self.l2_reg_coefs*self.l2_regs # [M]
+        self.cost = tf.reduce_sum(self.cost_members) # [1]
+        _optm_before = set(var.name for var in tf.global_variables())
+        if self.BUILD_OPTM:
+            self.optm = tf.train.RMSPropOptimizer(learning_rate=1e-3).minimize(self.cost)
+        else:
+            self.optm = None
+        self.optm_vars = [var for var in tf.global_variables() if var.name not in _optm_before]
+        # Tensors available to predict() (member tensors have a leading [M] axis, moved to axis 1)
+        self.fetchables = {'EVs':self.EVs,'VEs':self.VEs,'EV':self.EV,'VE':self.VE,
+                           'VEs_between':self.VEs_between,
+                           'pi_members':tf.transpose(self.pi,[1,0]+list(range(2,len(self.pi.get_shape())))),
+                           'mu_members':tf.transpose(self.mu,[1,0,2,3]),
+                           'var_members':tf.transpose(self.var,[1,0,2,3]),
+                           'EVs_members':tf.transpose(self.EVs_members,[1,0,2]),
+                           'VEs_members':tf.transpose(self.VEs_members,[1,0,2]),
+                           'y_sample':tf.transpose(self.y_sample,[1,0,2])}
+
+    # Predict with one sess.run per chunk (see mdn_class.predict_mdn)
+    def predict(self,_x,_fetch=['EVs','VEs'],_batch_size=4096,_sig_rate=1.0,
+                _out=None,_GENERATOR=False):
+        return predict_mdn(self,_x,_fetch,_batch_size,_sig_rate,_out,_GENERATOR)
+
+    # Train all members at once (headless; see mdn_class.train_mdn)
+    def train(self,_x_train,_y_train,_max_iter=10000,_batch_size=256,_SHOW_EVERY=10,_callbacks=[],
+              _n_prefetch=2,_block_size=None,_ckpt_path=None,_CKPT_EVERY=1000,_RESUME=False,
+              _profiler=None,_x_val=None,_y_val=None,_EVAL_EVERY=500,_patience=None,_min_delta=0.0,
+              _RESTORE_BEST=True,_sig_horizon=None):
+        train_mdn(self,_x_train,_y_train,_max_iter=_max_iter,_batch_size=_batch_size,
+                  _SHOW_EVERY=_SHOW_EVERY,_PLOT=False,_callbacks=_callbacks,
+                  _n_prefetch=_n_prefetch,_block_size=_block_size,
+                  _ckpt_path=_ckpt_path,_CKPT_EVERY=_CKPT_EVERY,_RESUME=_RESUME,_profiler=_profiler,
+                  _x_val=_x_val,_y_val=_y_val,_EVAL_EVERY=_EVAL_EVERY,_patience=_patience,
+                  _min_delta=_min_delta,_RESTORE_BEST=_RESTORE_BEST,_sig_horizon=_sig_horizon)
+
+    # Held-out log likelihood averaged over the members (used for early stopping in train())
+    def eval_log_lik(self,_x,_y,_batch_size=8192,_sig_rate=1.0):
+        return eval_log_lik(self.sess,self.log_liks,{self.x:_x,self.y:_y},_batch_size,
+                            _feed_dict={self.sig_rate:_sig_rate})
+
+    # Per-member held-out log likelihood (e.g., to pick l2_reg_coef in a sweep)
+    def eval_log_lik_members(self,_x,_y,_batch_size=4096,_sig_rate=1.0):
+        n = _x.shape[0]
+        total = np.zeros(self.n_model)
+        for start in range(0,n,_batch_size):
+            x,y = _x[start:start+_batch_size],_y[start:start+_batch_size]
+            total += x.shape[0]*self.sess.run(self.log_lik_members,
+                                              feed_dict={self.x:x,self.y:y,self.sig_rate:_sig_rate})
+        return total/n # [M]
+
+    def get_hyper(self):
+        return {'n_model':self.n_model,'x_dim':self.x_dim,'y_dim':self.y_dim,'k':self.k,
+                'hids':list(self.hids),'actv':get_actv_name(self.actv),'sig_max':self.sig_max,
+                'SCHEDULE_SIG_MAX':self.SCHEDULE_SIG_MAX,'l2_reg_coef':self.l2_reg_coefs.tolist(),
+                'INDEP':self.INDEP}
+
+    def save(self,_path,_SAVE_OPTM=False,_iter=None):
+        save_ckpt(self,_path,self.get_hyper(),_SAVE_OPTM=_SAVE_OPTM,_iter=_iter)
+
+    def restore(self,_path,_LOAD_OPTM=False):
+        return load_ckpt(self,_path,_LOAD_OPTM=_LOAD_OPTM and self.BUILD_OPTM)
+
+    @classmethod
+    def load(cls,_path,_sess,_name='mdn_ens',_TRAIN=False,_VERBOSE=False):
+        hyper = read_hyper(_path)
+        M = cls(_name=_name,_n_model=hyper['n_model'],_x_dim=hyper['x_dim'],_y_dim=hyper['y_dim'],
+                _k=hyper['k'],_hids=hyper['hids'],_actv=get_actv(hyper['actv']),_sig_max=hyper['sig_max'],
+                _SCHEDULE_SIG_MAX=hyper['SCHEDULE_SIG_MAX'],_l2_reg_coef=hyper['l2_reg_coef'],
+                _INDEP=hyper['INDEP'],_BUILD_OPTM=_TRAIN,_sess=_sess,_VERBOSE=_VERBOSE)
+        M.restore(_path,_LOAD_OPTM=_TRAIN)
+        return M
+
+    # Export one member in the format of MDN_reg_class.export_params (for mdn_np.MDN_np_class)
+    def export_member(self,_m,_path=None):
+        params = {'INDEP':self.INDEP,'x_dim':self.x_dim,'y_dim':self.y_dim,'k':self.k,
+                  'n_hid':len(self.hids),'sig_max':self.sig_max,'actv':get_actv_name(self.actv)}
+        for var,val in zip(self.c_vars,self.sess.run(self.c_vars)):
+            key = var.op.name[len(self.name)+1:] # e.g., 'hid_0/kernel'
+            params[key] = val[_m,0] if key.endswith('/bias') else val[_m]
+        if _path is not None:
+            np.savez(_path,**params)
+        return params
@@ -0,0 +1,281 @@
+import numpy as np
+from util import nzrs_from_dict
+from mixture_reduce import reduce_mixture,to_csr
+try:
+    from scipy.special import ndtr
+except ImportError: # fall back to the rational approximation in norm_cdf
+    ndtr = None
+
+# Pure NumPy mixture density network inference (no TensorFlow needed)
+ACTVS = {'linear':lambda x:x,
+         'tanh':np.tanh,
+         'relu':lambda x:np.maximum(x,0),
+         'sigmoid':lambda x:1.0/(1.0+np.exp(-x)),
+         'softplus':lambda x:np.logaddexp(x,0),
+         'elu':lambda x:np.where(x>0,x,np.expm1(np.minimum(x,0)))}
+LOG_2PI = float(np.log(2*np.pi))
+
+def softmax(_x,axis=-1):
+    e = np.exp(_x-np.max(_x,axis=axis,keepdims=True))
+    return e/np.sum(e,axis=axis,keepdims=True)
+
+def log_softmax(_x,axis=-1):
+    x = _x-np.max(_x,axis=axis,keepdims=True)
+    return x-np.log(np.sum(np.exp(x),axis=axis,keepdims=True))
+
+def logsumexp(_x,axis=-1):
+    x_max = np.max(_x,axis=axis,keepdims=True)
+    return np.squeeze(x_max,axis=axis)+np.log(np.sum(np.exp(_x-x_max),axis=axis))
+
+# pi:[n x k] (joint) or [n x d x k] (indep) / mu,var:[n x d x k]
+def mog_log_prob(_y,_log_pi,_mu,_var,_INDEP=False):
+    log_comp = -0.5*(LOG_2PI+np.log(_var)+np.square(_y[:,:,np.newaxis]-_mu)/_var) # [n x d x k]
+    if _INDEP:
+        return logsumexp(_log_pi+log_comp,axis=2) # [n x d]
+    return logsumexp(_log_pi+np.sum(log_comp,axis=1),axis=1) # [n]
+
+def mog_moments(_pi,_mu,_var,_INDEP=False):
+    pi = _pi if _INDEP else _pi[:,np.newaxis,:] # [n x d x k]
+    EVs = np.sum(pi*_var,axis=2) # [n x d] E[Var[y]] - Aleatoric
+    mu_average = np.sum(pi*_mu,axis=2,keepdims=True) # [n x d x 1]
+    VEs = np.sum(pi*np.square(_mu-mu_average),axis=2) # [n x d] Var[E[y]] - Epistemic
+    return EVs,VEs
+
+def mog_sample(_pi,_mu,_var,_INDEP=False,_rng=np.random,_n_sample=None):
+    # Pick components by inverse cdf (per dimension if _INDEP), then draw only the chosen Gaussians
+    #  returns [n x d], or [n x S x d] with _n_sample=S (one network pass, S draws per input)
+    n,d,k = _mu.shape
+    S = 1 if _n_sample is None else _n_sample
+    cdf = np.cumsum(_pi,axis=-1) # [n x k] or [n x d x k]
+    if _INDEP:
+        cdf = cdf[:,np.newaxis,:,:] # [n x 1 x d x k]
+    else:
+        cdf = cdf[:,np.newaxis,:] # [n x 1 x k]
+    u = _rng.uniform(size=(n,S)+cdf.shape[2:-1]+(1,))*cdf[...,-1:]
+    idx = np.minimum(np.sum(u>cdf,axis=-1),k-1) # [n x S] or [n x S x d]
+    if _INDEP:
+        sel = (np.arange(n)[:,np.newaxis,np.newaxis],np.arange(d)[np.newaxis,np.newaxis,:],idx)
+    else:
+        sel = (np.arange(n)[:,np.newaxis],slice(None),idx)
+    mu_sel,var_sel = _mu[sel],_var[sel] # [n x S x d]
+    samples = mu_sel+np.sqrt(var_sel)*_rng.standard_normal(size=mu_sel.shape).astype(mu_sel.dtype)
+    if _n_sample is None:
+        return samples[:,0,:] # [n x d]
+    return samples # [n x S x d]
+
+# Standard normal cdf (scipy's ndtr if available, otherwise the Chebyshev fit of erfc from
+#  Numerical Recipes, fractional error below 1.2e-7 everywhere, including the tails)
+def norm_cdf(_z):
+    if ndtr is not None:
+        return ndtr(_z)
+    z = np.abs(_z)/np.sqrt(2.0)
+    t = 1.0/(1.0+0.5*z)
+    erfc = t*np.exp(-z*z-1.26551223+t*(1.00002368+t*(0.37409196+t*(0.09678418+t*(-0.18628806+
+           t*(0.27886807+t*(-1.13520398+t*(1.48851587+t*(-0.82215223+t*0.17087277)))))))))
+    return np.where(_z>=0,1.0-0.5*erfc,0.5*erfc)
+
+# Marginal cdf per output dimension: _y:[n x d] -> [n x d]
+def mog_cdf(_y,_pi,_mu,_var,_INDEP=False):
+    pi = _pi if _INDEP else _pi[:,np.newaxis,:] # [n x d x k]
+    z = (_y[:,:,np.newaxis]-_mu)/np.sqrt(_var) # [n x d x k]
+    return np.sum(pi*norm_cdf(z),axis=2)
+
+# Marginal quantiles per output dimension, all inputs / dimensions / levels solved at once
+#  _q: scalar -> [n x d] or array [m] -> [n x m x d]
+#  Newton steps on F(y)=q safeguarded by a bracket that shrinks every iteration (bisection when a
+#  Newton step leaves it). The root is located to within _tol (in units of y), up to the accuracy
+#  of norm_cdf (about 1e-7 in F without scipy, i.e., 1e-7/pdf in y).
+def mog_quantile(_q,_pi,_mu,_var,_INDEP=False,_tol=1e-6,_max_iter=100):
+    q = np.clip(np.asarray(_q,dtype=np.float64),1e-15,1-1e-15)
+    SCALAR = (q.ndim == 0)
+    q = q.reshape((1,-1,1)) # [1 x m x 1]
+    pi = (_pi if _INDEP else _pi[:,np.newaxis,:])[:,np.newaxis,:,:].astype(np.float64) # [n x 1 x d x k]
+    pi = pi/np.sum(pi,axis=-1,keepdims=True)
+    mu = _mu[:,np.newaxis,:,:].astype(np.float64) # [n x 1 x d x k]
+    sig = np.sqrt(_var[:,np.newaxis,:,:].astype(np.float64))
+    shape = (mu.shape[0],q.shape[1],mu.shape[2]) # [n x m x d]
+    # Every quantile in (1e-15,1-1e-15) lies within 10 stds of some component
+    lo = np.broadcast_to(np.min(mu-10*sig,axis=-1),shape).copy()
+    hi = np.broadcast_to(np.max(mu+10*sig,axis=-1),shape).copy()
+    y = np.broadcast_to(np.sum(pi*mu,axis=-1),shape).copy() # start from the mixture mean
+    for _ in range(_max_iter):
+        z = (y[...,np.newaxis]-mu)/sig
+        F = np.sum(pi*norm_cdf(z),axis=-1)-q
+        f = np.sum(pi*np.exp(-0.5*z*z)/(np.sqrt(2*np.pi)*sig),axis=-1)
+        above = F>0
+        hi = np.where(above,y,hi)
+        lo = np.where(above,lo,y)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            y_new = y-F/f
+        bisect = ~((y_new>lo)&(y_new<hi)) # also catches f==0 (inf/nan)
+        y_new = np.where(bisect,0.5*(lo+hi),y_new)
+        DONE = np.all((np.abs(y_new-y)<_tol)|((hi-lo)<_tol))
+        y = y_new
+        if DONE:
+            break
+    y = y.astype(_mu.dtype)
+    return y[:,0,:] if SCALAR else y
+
+# Keep the _m components with the largest pi per input (per dimension if _INDEP)
+#  Returns the selected logits (their softmax is pi renormalized over the kept components), the
+#  matching mu/var ([n x d x m]) and log S, the log of the retained mass ([n] or [n x d]).
+#  With S the retained mass: EVs and the mixture mean move by at most (1-S) times the spread of the
+#  component variances / means, and the truncated (not renormalized) log likelihood log(S)+log_liks_m
+#  is a lower bound of the full one.
+def top_m_components(_pi_logits,_mu,_var,_m,_INDEP=False):
+    idx = np.argpartition(-_pi_logits,_m-1,axis=-1)[...,:_m] # [n x m] or [n x d x m]
+    logits = np.take_along_axis(_pi_logits,idx,axis=-1)
+    if not _INDEP:
+        idx = np.broadcast_to(idx[:,np.newaxis,:],(idx.shape[0],_mu.shape[1],_m)) # [n x d x m]
+    mu = np.take_along_axis(_mu,idx,axis=-1)
+    var = np.take_along_axis(_var,idx,axis=-1)
+    log_S = logsumexp(logits,axis=-1)-logsumexp(_pi_logits,axis=-1)
+    return logits,mu,var,log_S
+
+# Remove components whose pi stays below _pi_th on every row of _x (e.g., the training inputs)
+#  from the pi/mu/logvar heads of exported params; the softmax over the remaining logits
+#  re-normalizes pi. Returns (params,kept component indices,max pi per component).
+def prune_params(_params,_x,_pi_th=0.01,_sig_rate=1.0,_batch_size=8192):
+    M = MDN_np_class(_params)
+    k,y_dim = M.k,M.y_dim
+    max_pi = np.zeros(k)
+    for start in range(0,_x.shape[0],_batch_size):
+        pi = M.forward(_x[start:start+_batch_size],_sig_rate=_sig_rate)[0]
+        max_pi = np.maximum(max_pi,pi.reshape((-1,k)).max(axis=0))
+    keep = np.where(max_pi >= _pi_th)[0]
+    if len(keep) == 0:
+        keep = np.array([np.argmax(max_pi)])
+    cols_d = (np.arange(y_dim)[:,np.newaxis]*k+keep[np.newaxis,:]).ravel() # [y_dim x k] layout
+    params = dict(M.params)
+    for name in ['pi','mu','logvar']:
+        cols = cols_d if (name != 'pi') or M.INDEP else keep
+        params['%s/kernel'%(name)] = M.params['%s/kernel'%(name)][:,cols]
+        params['%s/bias'%(name)] = M.params['%s/bias'%(name)][cols]
+    params['k'] = np.array(len(keep))
+    return params,keep,max_pi
+
+# Random exported params in the layout of export_params (benchmarks and tests)
+#  _n_alive: only the first _n_alive components get mass (the others look pruned-away after training)
+def random_params(_x_dim=1,_y_dim=2,_k=20,_hids=[128,128],_n_alive=None,_pi_scale=1.0,_INDEP=False,
+                  _actv='tanh',_seed=0):
+    rng = np.random.RandomState(_seed)
+    params = {'INDEP':_INDEP,'x_dim':_x_dim,'y_dim':_y_dim,'k':_k,'n_hid':len(_hids),
+              'sig_max':1.0,'actv':_actv}
+    dims = [_x_dim]+list(_hids)
+    for h_idx in range(len(_hids)):
+        params['hid_%d/kernel'%(h_idx)] = (rng.randn(dims[h_idx],dims[h_idx+1])/np.sqrt(dims[h_idx])).astype(np.float32)
+        params['hid_%d/bias'%(h_idx)] = np.zeros(dims[h_idx+1],dtype=np.float32)
+    pi_dim = _y_dim*_k if _INDEP else _k
+    for name,out_dim,scale in [('pi',pi_dim,_pi_scale),('mu',_y_dim*_k,1.0),('logvar',_y_dim*_k,1.0)]:
+        params['%s/kernel'%(name)] = (scale*rng.randn(dims[-1],out_dim)).astype(np.float32)
+        params['%s/bias'%(name)] = np.zeros(out_dim,dtype=np.float32)
+    if _n_alive is not None:
+        params['pi/bias'].reshape((-1,_k))[:,_n_alive:] = -12
+    return params
+
+class MDN_np_class(object):
+    def __init__(self,_params,_top_m=None):
+        # Parse exported parameters (see MDN_reg_class.export_params)
+        #  _top_m: evaluate only the _top_m most probable components per input (see top_m_components)
+        self.top_m = _top_m
+        self.params = {key:np.asarray(val) for key,val in _params.items()}
+        self.INDEP = bool(self.params['INDEP'])
+        self.x_dim = int(self.params['x_dim'])
+        self.y_dim = int(self.params['y_dim'])
+        self.k = int(self.params['k'])
+        self.n_hid = int(self.params['n_hid'])
+        self.sig_max = float(self.params['sig_max'])
+        self.actv_name = str(self.params['actv'])
+        self.actv = ACTVS[self.actv_name]
+        self.Ws = [self.params['hid_%d/kernel'%(h_idx)] for h_idx in range(self.n_hid)]
+        self.bs = [self.params['hid_%d/bias'%(h_idx)] for h_idx in range(self.n_hid)]
+        self.nzrs = nzrs_from_dict(self.params) # e.g., {'x':nzr_stream,'y':nzr_stream} if exported
+
+    @classmethod
+    def load(cls,_path):
+        with np.load(_path) as npz:
+            params = {key:npz[key] for key in npz.files}
+        return cls(params)
+
+    def save(self,_path):
+        np.savez(_path,**self.params)
+
+    # Forward pass: pi:[n x k] or [n x y_dim x k] / mu,var:[n x y_dim x k]
+    #  With exported normalizers, _x is normalized by nzrs['x'] and mu/var are mapped back to the
+    #  units of y by nzrs['y'] (kept normalized with _NZD_Y)
+    #  _top_m: top-m mode for this call (self.top_m if None, all components if >= k)
+    def forward(self,_x,_sig_rate=1.0,_RETURN_LOGITS=False,_NZD_Y=False,_top_m=None):
+        net = np.asarray(_x,dtype=np.float32)
+        if 'x' in self.nzrs:
+            net = self.nzrs['x'].get_nzdval(net).astype(np.float32)
+        for W,b in zip(self.Ws,self.bs):
+            net = self.actv(np.dot(net,W)+b)
+        p = self.params
+        pi_logits = np.dot(net,p['pi/kernel'])+p['pi/bias']
+        if self.INDEP:
+            pi_logits = pi_logits.reshape((-1,self.y_dim,self.k))
+        mu = (np.dot(net,p['mu/kernel'])+p['mu/bias']).reshape((-1,self.y_dim,self.k))
+        logvar = (np.dot(net,p['logvar/kernel'])+p['logvar/bias']).reshape((-1,self.y_dim,self.k))
+        if self.sig_max == 0:
+            var = np.exp(logvar)
+        else:
+            var = (self.sig_max*_sig_rate/(1.0+np.exp(-logvar))).astype(np.float32)
+        top_m = self.top_m if _top_m is None else _top_m
+        if (top_m is not None) and (top_m < self.k):
+            pi_logits,mu,var,_ = top_m_components(pi_logits,mu,var,top_m,_INDEP=self.INDEP)
+        if ('y' in self.nzrs) and (not _NZD_Y):
+            N = self.nzrs['y']
+            scale = (N.std+N.eps).astype(np.float32)[:,np.newaxis] # [y_dim x 1]
+            mu = mu*scale+N.mu.astype(np.float32)[:,np.newaxis]
+            var = var*np.square(scale)
+        if _RETURN_LOGITS:
+            return pi_logits,mu,var
+        return softmax(pi_logits,axis=-1),mu,var
+
+    # Mixture mass kept by the top-m mode ([n] or [n x y_dim]); 1 means exact
+    def retained_mass(self,_x,_top_m=None):
+        top_m = self.top_m if _top_m is None else _top_m
+        pi_logits,mu,var = self.forward(_x,_RETURN_LOGITS=True,_top_m=self.k) # all components
+        if (top_m is None) or (top_m >= self.k):
+            return np.ones(pi_logits.shape[:-1])
+        return np.exp(top_m_components(pi_logits,mu,var,top_m,_INDEP=self.INDEP)[3])
+
+    # Smaller model without the components that are dead on _x (see prune_params)
+    def prune(self,_x,_pi_th=0.01,_sig_rate=1.0):
+        params,keep,max_pi = prune_params(self.params,_x,_pi_th=_pi_th,_sig_rate=_sig_rate)
+        return MDN_np_class(params,_top_m=self.top_m)
+
+    # log p(y|x) in the units of _y: [n] or [n x y_dim] (_INDEP)
+    def log_liks(self,_x,_y,_sig_rate=1.0):
+        pi_logits,mu,var = self.forward(_x,_sig_rate=_sig_rate,_RETURN_LOGITS=True,_NZD_Y=True)
+        log_pi = log_softmax(pi_logits,axis=-1)
+        y,log_jac = np.asarray(_y,dtype=np.float32),0.0
+        if 'y' in self.nzrs: # density of the normalized y times |dy_nzd/dy|
+            N = self.nzrs['y']
+            y = N.get_nzdval(y).astype(np.float32)
+            log_jac = -np.log(N.std+N.eps) # [y_dim]
+            if not self.INDEP:
+                log_jac = np.sum(log_jac)
+        return mog_log_prob(y,log_pi,mu,var,_INDEP=self.INDEP)+log_jac
+
+    def moments(self,_x,_sig_rate=1.0):
+        pi,mu,var = self.forward(_x,_sig_rate=_sig_rate)
+        return mog_moments(pi,mu,var,_INDEP=self.INDEP) # EVs,VEs
+
+    def cdf(self,_x,_y,_sig_rate=1.0):
+        pi,mu,var = self.forward(_x,_sig_rate=_sig_rate)
+        return mog_cdf(_y,pi,mu,var,_INDEP=self.INDEP) # [n x y_dim]
+
+    def quantile(self,_x,_q,_sig_rate=1.0,_tol=1e-6):
+        pi,mu,var = self.forward(_x,_sig_rate=_sig_rate)
+        return mog_quantile(_q,pi,mu,var,_INDEP=self.INDEP,_tol=_tol) # [n x y_dim] or [n x m x y_dim]
+
+    def sample(self,_x,_sig_rate=1.0,_rng=np.random,_n_sample=None):
+        pi,mu,var = self.forward(_x,_sig_rate=_sig_rate)
+        return mog_sample(pi,mu,var,_INDEP=self.INDEP,_rng=_rng,_n_sample=_n_sample) # [n x (S x) y_dim]
+
+    # Moment-matched reduction of the predicted mixtures (see mixture_reduce.py)
+    def reduce(self,_x,_k_target=1,_max_kl=None,_sig_rate=1.0,_CSR=False):
+        pi,mu,var = self.forward(_x,_sig_rate=_sig_rate)
+        reduced = reduce_mixture(pi,mu,var,_INDEP=self.INDEP,_k_target=_k_target,_max_kl=_max_kl)
+        return to_csr(reduced,_INDEP=self.INDEP) if _CSR else reduced
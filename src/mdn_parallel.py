@@ -0,0 +1,154 @@
+import os
+import time
+import queue
+import numpy as np
+import multiprocessing
+
+# Data-parallel training of MDN_reg_class / MDN_reg_indep_class over local worker processes
+#  The rows are split into one contiguous shard per worker. Every worker builds the same graph
+#  (without an optimizer) plus tf.gradients(cost,c_vars) and returns gradients for the weights it
+#  is sent. The parent owns the weights and applies RMSProp in numpy with the defaults of
+#  tf.train.RMSPropOptimizer (decay 0.9, no momentum, eps 1e-10, ms initialized to ones).
+#   'sync' : all-reduce; each step the global batch is split over the workers and their mean
+#            gradients are averaged, i.e., the same update as single-process training
+#   'async': parameter-server stand-in; each worker runs full batches on possibly stale weights
+#            and the parent applies every gradient as soon as it arrives
+#  Pass the training data as '.npy' paths so that the workers memory-map them instead of
+#  receiving pickled copies.
+THREAD_ENV_KEYS = ['OMP_NUM_THREADS','MKL_NUM_THREADS','OPENBLAS_NUM_THREADS']
+
+class rmsprop_np_class(object):
+    def __init__(self,_vals,_lr=1e-3,_decay=0.9,_eps=1e-10):
+        self.lr,self.decay,self.eps = _lr,_decay,_eps
+        self.ms = [np.ones_like(val) for val in _vals]
+    def apply(self,_vals,_grads):
+        for val,ms,grad in zip(_vals,self.ms,_grads):
+            ms *= self.decay
+            ms += (1.0-self.decay)*np.square(grad)
+            val -= self.lr*grad/np.sqrt(ms+self.eps)
+
+def sig_rate_at(_iter,_sig_horizon):
+    return 1.0-np.exp(-4*(min(_iter+1.0,_sig_horizon)/_sig_horizon)**2)
+
+# Next worker result; fails instead of hanging when a worker died (e.g., crashed while importing
+#  TensorFlow or running out of memory) or when nothing arrived within _timeout seconds
+def get_result(_out_queue,_procs,_timeout=None,_poll=1.0):
+    t_start = time.time()
+    while True:
+        try:
+            return _out_queue.get(timeout=_poll)
+        except queue.Empty:
+            pass
+        for w_idx,proc in enumerate(_procs):
+            if not proc.is_alive():
+                raise RuntimeError('parallel worker %d exited with code %s'%(w_idx,proc.exitcode))
+        if (_timeout is not None) and (time.time()-t_start > _timeout):
+            raise RuntimeError('no worker result within %.1fs'%(_timeout))
+
+def parallel_worker(_worker_id,_cls_name,_hyper,_name,_data,_shard,_batch_size,_n_thread,_seed,
+                    _in_queue,_out_queue):
+    # Pin the thread pools before TensorFlow gets imported (kept out of the module imports for this)
+    for key in THREAD_ENV_KEYS:
+        os.environ[key] = str(_n_thread)
+    import tensorflow as tf
+    import mdn_class
+    from util import cpu_sess
+    from ckpt_util import assign_vars
+    from data_pipeline import open_array,batch_loader_class
+    start,end = _shard
+    x,y = [open_array(d)[start:end] for d in _data]
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.set_random_seed(_seed+_worker_id)
+        sess = cpu_sess(_n_intra=_n_thread,_n_inter=1,_graph=graph)
+        M = getattr(mdn_class,_cls_name)(_name=_name,_x_dim=_hyper['x_dim'],_y_dim=_hyper['y_dim'],
+                    _k=_hyper['k'],_hids=_hyper['hids'],_actv=mdn_class.get_actv(_hyper['actv']),
+                    _sig_max=_hyper['sig_max'],_SCHEDULE_SIG_MAX=_hyper['SCHEDULE_SIG_MAX'],
+                    _l2_reg_coef=_hyper['l2_reg_coef'],_VECTORIZED=_hyper['VECTORIZED'],
+                    _BUILD_OPTM=False,_sess=sess,_VERBOSE=False)
+        grads = tf.gradients(M.cost,M.c_vars)
+    loader = batch_loader_class([x,y],_batch_size=_batch_size,_n_prefetch=2,_seed=_seed+_worker_id)
+    while True:
+        msg = _in_queue.get()
+        if msg is None:
+            break
+        vals,sig_rate = msg
+        assign_vars(M,M.c_vars,vals)
+        x_batch,y_batch = loader.next_batch()
+        outs = sess.run(grads+[M.cost],feed_dict={M.x:x_batch,M.y:y_batch,M.sig_rate:sig_rate})
+        _out_queue.put((_worker_id,outs[:-1],outs[-1],x_batch.shape[0]))
+    loader.close()
+    sess.close()
+
+# Train _M (its current weights are the starting point) and write the result back into it
+#  _batch_size: global batch ('sync', split over the workers) or per-update batch ('async')
+#  _timeout: seconds to wait for a worker result (None: as long as all workers are alive)
+#  Returns a dict with the cost history, examples/sec and wall time.
+def train_parallel(_M,_x_train,_y_train,_n_worker=4,_mode='sync',_max_iter=10000,_batch_size=256,
+                   _sig_horizon=None,_n_thread=1,_seed=0,_SHOW_EVERY=10,_timeout=None,_VERBOSE=True):
+    from data_pipeline import open_array
+    from ckpt_util import assign_vars
+    assert _mode in ['sync','async'], 'unknown mode [%s]'%(_mode)
+    sig_horizon = _max_iter if _sig_horizon is None else _sig_horizon
+    n = open_array(_x_train).shape[0]
+    bounds = np.linspace(0,n,_n_worker+1).astype(np.int64)
+    worker_batch = max(1,_batch_size//_n_worker) if _mode == 'sync' else _batch_size
+    vals = [np.array(val,dtype=np.float32) for val in _M.sess.run(_M.c_vars)]
+    optm = rmsprop_np_class(vals)
+    ctx = multiprocessing.get_context('spawn') # fresh interpreters, no TF state inherited
+    out_queue = ctx.Queue()
+    in_queues,procs = [],[]
+    for w_idx in range(_n_worker):
+        in_queue = ctx.Queue()
+        proc = ctx.Process(target=parallel_worker,
+                           args=(w_idx,type(_M).__name__,_M.get_hyper(),_M.name,(_x_train,_y_train),
+                                 (bounds[w_idx],bounds[w_idx+1]),worker_batch,_n_thread,_seed,
+                                 in_queue,out_queue))
+        proc.daemon = True
+        proc.start()
+        in_queues.append(in_queue)
+        procs.append(proc)
+    costs,n_example = [],0
+    try:
+        if _mode == 'sync':
+            # One step (to warm up the workers) before the clock starts
+            t_start = None
+            for iter in range(-1,_max_iter):
+                sig_rate = sig_rate_at(max(iter,0),sig_horizon)
+                for in_queue in in_queues:
+                    in_queue.put((vals,sig_rate))
+                results = [get_result(out_queue,procs,_timeout) for _ in range(_n_worker)]
+                if iter < 0:
+                    t_start = time.time()
+                    continue
+                grads = [np.mean([res[1][v_idx] for res in results],axis=0) for v_idx in range(len(vals))]
+                optm.apply(vals,grads)
+                costs.append(float(np.mean([res[2] for res in results])))
+                n_example += sum(res[3] for res in results)
+                if _VERBOSE and ((iter%max(_max_iter//_SHOW_EVERY,1))==0):
+                    print ("[%d/%d] cost:%.4f"%(iter,_max_iter,costs[-1]))
+        else:
+            for in_queue in in_queues[:_max_iter]:
+                in_queue.put(([val.copy() for val in vals],sig_rate_at(0,sig_horizon)))
+            t_start = time.time()
+            for iter in range(_max_iter):
+                w_idx,grads,cost_val,n_rows = get_result(out_queue,procs,_timeout)
+                optm.apply(vals,grads)
+                costs.append(float(cost_val))
+                n_example += n_rows
+                if iter < _max_iter-_n_worker: # keep every worker busy until the last updates
+                    # copies: the queue pickles on a feeder thread while vals keep changing
+                    in_queues[w_idx].put(([val.copy() for val in vals],sig_rate_at(iter+1,sig_horizon)))
+                if _VERBOSE and ((iter%max(_max_iter//_SHOW_EVERY,1))==0):
+                    print ("[%d/%d] cost:%.4f"%(iter,_max_iter,cost_val))
+        total = time.time()-t_start
+    finally:
+        for in_queue in in_queues:
+            in_queue.put(None)
+        for proc in procs: # workers still busy after a failure elsewhere are terminated
+            proc.join(timeout=10.0)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+    assign_vars(_M,_M.c_vars,vals)
+    return {'costs':costs,'examples_per_sec':n_example/max(total,1e-12),'sec':total}
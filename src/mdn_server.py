@@ -0,0 +1,180 @@
+import json
+import asyncio
+import argparse
+import collections
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from mdn_np import MDN_np_class,mog_moments
+
+# Micro-batching inference server for trained MDNs
+#  Concurrent requests are queued and merged into one forward pass (at most _max_batch rows,
+#  waiting at most _max_wait seconds after the first queued row), then split back to the callers.
+#  Protocol: one json object per line over TCP, {"x":[[...],...]} -> {"pi":...,"mu":...,...}
+#  (or {"error":...}); each input row is batched independently.
+FETCH = ['pi','mu','var','EVs','VEs']
+
+# Batched predict functions: x:[n x x_dim] -> {name:[n x ...]}
+def np_predict_func(_M_np,_fetch=FETCH):
+    def predict(_x):
+        pi,mu,var = _M_np.forward(_x)
+        EVs,VEs = mog_moments(pi,mu,var,_INDEP=_M_np.INDEP)
+        outs = {'pi':pi,'mu':mu,'var':var,'EVs':EVs,'VEs':VEs}
+        return dict((name,outs[name]) for name in _fetch)
+    return predict
+
+def tf_predict_func(_M,_fetch=FETCH):
+    def predict(_x):
+        return _M.predict(_x,_fetch=_fetch,_batch_size=_x.shape[0])
+    return predict
+
+class micro_batcher_class(object):
+    def __init__(self,_predict_func,_x_dim,_max_batch=256,_max_wait=0.002,_cache_size=0):
+        self.predict_func = _predict_func
+        self.x_dim = _x_dim
+        self.max_batch = _max_batch
+        self.max_wait = _max_wait
+        self.cache_size = _cache_size
+        self.cache = collections.OrderedDict() # LRU: row bytes -> {name:row output}
+        self.queue = None
+        # A single worker keeps the forward passes serialized (the engine owns its own threads)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.n_batch,self.n_row,self.n_hit = 0,0,0
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.executor.shutdown()
+
+    # Outputs for a single row ({name:array})
+    async def predict(self,_x_row):
+        x_row = np.ascontiguousarray(_x_row,dtype=np.float32).reshape(self.x_dim)
+        key = x_row.tobytes() if self.cache_size > 0 else None
+        if (key is not None) and (key in self.cache):
+            self.cache.move_to_end(key)
+            self.n_hit += 1
+            return self.cache[key]
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((x_row,future))
+        out = await future
+        if key is not None: # copies: the row outputs are views of the whole batch output
+            self.cache[key] = dict((name,np.array(val)) for name,val in out.items())
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return out
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time()+self.max_wait
+            while len(items) < self.max_batch:
+                timeout = deadline-loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(),timeout))
+                except asyncio.TimeoutError:
+                    break
+            x = np.stack([x_row for x_row,_ in items]) # [n x x_dim]
+            try:
+                outs = await loop.run_in_executor(self.executor,self.predict_func,x)
+            except Exception as e:
+                for _,future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.n_batch += 1
+            self.n_row += len(items)
+            for i,(_,future) in enumerate(items):
+                if not future.done(): # the caller may have gone away
+                    future.set_result(dict((name,val[i]) for name,val in outs.items()))
+
+    def stats(self):
+        return {'n_batch':self.n_batch,'n_row':self.n_row,'n_hit':self.n_hit,
+                'mean_batch':self.n_row/max(self.n_batch,1)}
+
+async def handle_client(_batcher,_reader,_writer):
+    while True:
+        line = await _reader.readline()
+        if not line:
+            break
+        try:
+            x = np.asarray(json.loads(line)['x'],dtype=np.float32).reshape((-1,_batcher.x_dim))
+            rows = await asyncio.gather(*[_batcher.predict(x_row) for x_row in x])
+            res = dict((name,[row[name].tolist() for row in rows]) for name in rows[0].keys())
+        except Exception as e:
+            res = {'error':repr(e)}
+        _writer.write((json.dumps(res)+'\n').encode())
+        await _writer.drain()
+    _writer.close()
+
+async def start_server(_batcher,_host='127.0.0.1',_port=8765):
+    await _batcher.start()
+    return await asyncio.start_server(lambda r,w:handle_client(_batcher,r,w),_host,_port)
+
+async def serve(_batcher,_host,_port,_path):
+    server = await start_server(_batcher,_host,_port)
+    print ("serving [%s] on %s:%d"%(_path,_host,_port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await _batcher.stop()
+
+# Minimal client: one request in flight per connection
+class mdn_client_class(object):
+    def __init__(self,_reader,_writer):
+        self.reader,self.writer = _reader,_writer
+
+    @classmethod
+    async def connect(cls,_host='127.0.0.1',_port=8765):
+        reader,writer = await asyncio.open_connection(_host,_port)
+        return cls(reader,writer)
+
+    async def predict(self,_x):
+        self.writer.write((json.dumps({'x':np.asarray(_x).tolist()})+'\n').encode())
+        await self.writer.drain()
+        res = json.loads(await self.reader.readline())
+        if 'error' in res:
+            raise RuntimeError(res['error'])
+        return res
+
+    def close(self):
+        self.writer.close()
+
+def load_predict_func(_path,_engine,_INDEP=False):
+    if _engine == 'np': # parameters exported with export_params()
+        M_np = MDN_np_class.load(_path)
+        return np_predict_func(M_np),M_np.x_dim
+    import tensorflow as tf # checkpoint written with save()
+    from mdn_class import MDN_reg_class,MDN_reg_indep_class
+    cls = MDN_reg_indep_class if _INDEP else MDN_reg_class
+    M = cls.load(_path,tf.Session())
+    return tf_predict_func(M),M.x_dim
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-batching MDN inference server')
+    parser.add_argument('--path',required=True)
+    parser.add_argument('--engine',default='np',choices=['np','tf'])
+    parser.add_argument('--indep',action='store_true',help='MDN_reg_indep_class checkpoint (tf engine)')
+    parser.add_argument('--host',default='127.0.0.1')
+    parser.add_argument('--port',type=int,default=8765)
+    parser.add_argument('--max_batch',type=int,default=256)
+    parser.add_argument('--max_wait',type=float,default=0.002,help='seconds')
+    parser.add_argument('--cache_size',type=int,default=0)
+    args = parser.parse_args()
+    predict_func,x_dim = load_predict_func(args.path,args.engine,_INDEP=args.indep)
+    batcher = micro_batcher_class(predict_func,x_dim,_max_batch=args.max_batch,
+                                  _max_wait=args.max_wait,_cache_size=args.cache_size)
+    try:
+        asyncio.run(serve(batcher,args.host,args.port,args.path))
+    except KeyboardInterrupt:
+        pass
+    print (batcher.stats())
@@ -0,0 +1,137 @@
+import numpy as np
+
+# Per-input reduction of predicted mixtures (MDN_reg_class / MDN_reg_indep_class outputs)
+#  Components are merged greedily by moment matching, the pair with the smallest Runnalls cost
+#  (an upper bound on the KL divergence added by the merge) first, until _k_target components
+#  remain or the summed cost would exceed _max_kl. A moment-matched merge keeps the weight, mean
+#  and per-dimension variance of the pair, so the mixture mean and EVs+VEs per dimension are
+#  preserved (up to floating point); only the split of the variance between EV and VE changes.
+#  pi:[n x k] (joint, diagonal Gaussians over y_dim) or [n x y_dim x k] (_INDEP, 1-D per dimension)
+#  mu,var:[n x y_dim x k]
+
+# Moment-matched merge of components i and j: weights [r x ...], mu,var [r x d x ...]
+def _moment_merge(_wi,_mui,_vari,_wj,_muj,_varj):
+    w = _wi+_wj
+    ai = np.where(w>0,_wi/np.where(w>0,w,1.0),0.5)[:,np.newaxis] # equal split of two empty components
+    aj = 1.0-ai
+    mu = ai*_mui+aj*_muj
+    var = ai*_vari+aj*_varj+ai*aj*np.square(_mui-_muj)
+    return w,mu,var
+
+# Runnalls' bound: 0.5*[w*log|V_ij| - wi*log|V_i| - wj*log|V_j|] (diagonal covariances)
+def _merge_cost(_wi,_ldi,_wj,_ldj,_w,_var):
+    return 0.5*(_w*np.sum(np.log(_var),axis=1)-_wi*_ldi-_wj*_ldj)
+
+# Cost of merging component _i with every component: [r x k], inf for itself and inactive ones
+def _costs_to(_pi,_mu,_var,_logdet,_active,_i):
+    r_idx = np.arange(_pi.shape[0])
+    wi,ldi = _pi[r_idx,_i][:,np.newaxis],_logdet[r_idx,_i][:,np.newaxis] # [r x 1]
+    mui,vari = _mu[r_idx,:,_i][:,:,np.newaxis],_var[r_idx,:,_i][:,:,np.newaxis] # [r x d x 1]
+    w,_,var = _moment_merge(wi,mui,vari,_pi,_mu,_var)
+    cost = _merge_cost(wi,ldi,_pi,_logdet,w,var)
+    valid = _active&_active[r_idx,_i][:,np.newaxis]&(np.arange(_pi.shape[1])[np.newaxis,:] != _i[:,np.newaxis])
+    return np.where(valid,cost,np.inf)
+
+def _reduce_rows(_pi,_mu,_var,_k_target,_max_kl):
+    pi,mu,var = _pi.astype(np.float64),_mu.astype(np.float64),_var.astype(np.float64)
+    n,d,k = mu.shape
+    active = pi > 0
+    active[np.arange(n),np.argmax(pi,axis=1)] = True # at least one component per row
+    logdet = np.sum(np.log(var),axis=1) # [n x k]
+    # Pairwise merge costs [n x k x k] (symmetric), updated only for the merged component
+    cost = np.stack([_costs_to(pi,mu,var,logdet,active,np.full(n,i)) for i in range(k)],axis=1)
+    kl = np.zeros(n)
+    done = np.zeros(n,dtype=bool)
+    for _ in range(k-1):
+        done |= np.sum(active,axis=1) <= _k_target
+        rows = np.where(~done)[0]
+        if len(rows) == 0:
+            break
+        best = np.argmin(cost[rows].reshape((-1,k*k)),axis=1)
+        i,j = best//k,best%k
+        c = cost[rows,i,j]
+        if _max_kl is not None:
+            ok = kl[rows]+c <= _max_kl
+            done[rows[~ok]] = True
+            rows,i,j,c = rows[ok],i[ok],j[ok],c[ok]
+            if len(rows) == 0:
+                break
+        kl[rows] += c
+        w,mu_ij,var_ij = _moment_merge(pi[rows,i],mu[rows,:,i],var[rows,:,i],
+                                       pi[rows,j],mu[rows,:,j],var[rows,:,j])
+        pi[rows,i],mu[rows,:,i],var[rows,:,i] = w,mu_ij,var_ij
+        logdet[rows,i] = np.sum(np.log(var_ij),axis=1)
+        pi[rows,j],active[rows,j] = 0.0,False
+        cost[rows,j,:],cost[rows,:,j] = np.inf,np.inf
+        cost_i = _costs_to(pi[rows],mu[rows],var[rows],logdet[rows],active[rows],i)
+        cost[rows,i,:],cost[rows,:,i] = cost_i,cost_i
+    # Active components first, by decreasing weight; pad with pi=0, mu=0, var=1
+    counts = np.sum(active,axis=1)
+    m = int(np.max(counts))
+    order = np.argsort(np.where(active,-pi,np.inf),axis=1)[:,:m] # [n x m]
+    pi = np.take_along_axis(pi,order,axis=1)
+    idx = np.broadcast_to(order[:,np.newaxis,:],(n,d,m))
+    mu,var = np.take_along_axis(mu,idx,axis=2),np.take_along_axis(var,idx,axis=2)
+    pad = np.arange(m)[np.newaxis,:] >= counts[:,np.newaxis] # [n x m]
+    pi[pad] = 0.0
+    mu = np.where(pad[:,np.newaxis,:],0.0,mu)
+    var = np.where(pad[:,np.newaxis,:],1.0,var)
+    return pi,mu,var,counts,kl
+
+# Pad reduced chunks to the largest number of slots and stack them along the inputs
+def concat_reduced(_reduced_list):
+    m = max(reduced['pi'].shape[-1] for reduced in _reduced_list)
+    def pad(_a,_val): # to m slots
+        width = [(0,0)]*(_a.ndim-1)+[(0,m-_a.shape[-1])]
+        return np.pad(_a,width,mode='constant',constant_values=_val)
+    out = {}
+    for key,val in [('pi',0.0),('mu',0.0),('var',1.0)]:
+        out[key] = np.concatenate([pad(reduced[key],val) for reduced in _reduced_list])
+    for key in ['counts','kl']:
+        out[key] = np.concatenate([reduced[key] for reduced in _reduced_list])
+    return out
+
+# Fixed-length encoding: {'pi','mu','var'} with m = max remaining count slots, 'counts' (components
+#  kept per row) and 'kl' (summed merge costs); shapes follow the inputs with k replaced by m
+def reduce_mixture(_pi,_mu,_var,_INDEP=False,_k_target=1,_max_kl=None,_batch_size=4096):
+    reduced_list = []
+    for start in range(0,_mu.shape[0],_batch_size):
+        pi,mu,var = _pi[start:start+_batch_size],_mu[start:start+_batch_size],_var[start:start+_batch_size]
+        n,d,k = mu.shape
+        if _INDEP: # every output dimension is its own 1-D mixture
+            pi,mu,var = pi.reshape((n*d,k)),mu.reshape((n*d,1,k)),var.reshape((n*d,1,k))
+        pi_r,mu_r,var_r,counts,kl = _reduce_rows(pi,mu,var,_k_target,_max_kl)
+        m = pi_r.shape[1]
+        if _INDEP:
+            pi_r,counts,kl = pi_r.reshape((n,d,m)),counts.reshape((n,d)),kl.reshape((n,d))
+        reduced_list.append({'pi':pi_r.astype(_pi.dtype),'mu':mu_r.reshape((n,d,m)).astype(_mu.dtype),
+                             'var':var_r.reshape((n,d,m)).astype(_var.dtype),'counts':counts,'kl':kl})
+    return concat_reduced(reduced_list)
+
+# Variable-length (CSR) encoding: components of row r are offsets[r]:offsets[r+1] of
+#  pi:[nnz], mu:[nnz x d], var:[nnz x d] (rows are inputs, or (input,dimension) pairs if _INDEP)
+def to_csr(_reduced,_INDEP=False):
+    pi,mu,var,counts = _reduced['pi'],_reduced['mu'],_reduced['var'],_reduced['counts']
+    if _INDEP:
+        n,d,m = mu.shape
+        pi,mu,var,counts = pi.reshape((n*d,m)),mu.reshape((n*d,1,m)),var.reshape((n*d,1,m)),counts.ravel()
+    mask = np.arange(pi.shape[1])[np.newaxis,:] < counts[:,np.newaxis] # [rows x m]
+    return {'offsets':np.concatenate([[0],np.cumsum(counts)]).astype(np.int64),
+            'pi':pi[mask],'mu':np.transpose(mu,[0,2,1])[mask],'var':np.transpose(var,[0,2,1])[mask]}
+
+def from_csr(_csr,_d=None,_INDEP=False):
+    offsets = _csr['offsets']
+    counts = np.diff(offsets)
+    rows,m = len(counts),int(np.max(counts)) if len(counts) > 0 else 0
+    dim = _csr['mu'].shape[1]
+    mask = np.arange(m)[np.newaxis,:] < counts[:,np.newaxis]
+    pi = np.zeros((rows,m),dtype=_csr['pi'].dtype)
+    mu = np.zeros((rows,m,dim),dtype=_csr['mu'].dtype)
+    var = np.ones((rows,m,dim),dtype=_csr['var'].dtype)
+    pi[mask],mu[mask],var[mask] = _csr['pi'],_csr['mu'],_csr['var']
+    mu,var = np.transpose(mu,[0,2,1]),np.transpose(var,[0,2,1]) # [rows x dim x m]
+    if _INDEP: # rows are (input,dimension) pairs
+        n = rows//_d
+        return {'pi':pi.reshape((n,_d,m)),'mu':mu.reshape((n,_d,m)),'var':var.reshape((n,_d,m)),
+                'counts':counts.reshape((n,_d))}
+    return {'pi':pi,'mu':mu,'var':var,'counts':counts}
@@ -0,0 +1,99 @@
+import time
+import threading
+import collections
+import numpy as np
+import tensorflow as tf
+import mdn_class,mog_class,mdn_ensemble
+
+# Host many MDN / MoG models in one process
+#  Every model gets its own tf.Graph and session (no shared variables or initializers), is built
+#  lazily from its checkpoint on first use, and least recently used models are evicted when the
+#  number of resident models or their variable memory exceeds the limits.
+MODEL_CLASSES = {'MDN_reg_class':mdn_class.MDN_reg_class,
+                 'MDN_reg_indep_class':mdn_class.MDN_reg_indep_class,
+                 'MDN_ensemble_class':mdn_ensemble.MDN_ensemble_class,
+                 'MoG_class':mog_class.MoG_class,
+                 'MoG_indep_class':mog_class.MoG_indep_class}
+
+# Bytes held by the variables of a graph (weights and optimizer slots)
+def graph_nbytes(_graph):
+    with _graph.as_default():
+        return int(sum(np.prod(var.get_shape().as_list())*var.dtype.base_dtype.size
+                       for var in tf.global_variables()))
+
+class model_registry_class(object):
+    def __init__(self,_max_models=16,_max_bytes=None,_sess_func=None,_VERBOSE=False):
+        self.max_models = _max_models
+        self.max_bytes = _max_bytes
+        self.sess_func = _sess_func # _sess_func(_graph) -> session (e.g., util.cpu_sess with _graph)
+        self.VERBOSE = _VERBOSE
+        self.specs = {} # key -> (class name,path,kwargs)
+        self.models = collections.OrderedDict() # key -> (M,graph,nbytes), least recently used first
+        self.lock = threading.RLock()
+        self.n_load,self.n_evict = 0,0
+
+    def register(self,_key,_cls_name,_path,**_kwargs):
+        assert _cls_name in MODEL_CLASSES, 'unknown model class [%s]'%(_cls_name)
+        with self.lock:
+            self.specs[_key] = (_cls_name,_path,_kwargs)
+            if _key in self.models: # re-registered: reload on next use
+                self.evict(_key)
+
+    def _load(self,_key):
+        cls_name,path,kwargs = self.specs[_key]
+        t_start = time.time()
+        graph = tf.Graph()
+        with graph.as_default():
+            sess = self.sess_func(graph) if self.sess_func is not None else tf.Session(graph=graph)
+            M = MODEL_CLASSES[cls_name].load(path,sess,**kwargs)
+        nbytes = graph_nbytes(graph)
+        self.n_load += 1
+        if self.VERBOSE:
+            print ("[%s] loaded [%s] from [%s] (%.1fMB, %.2fs)"%
+                   (_key,cls_name,path,nbytes/2.0**20,time.time()-t_start))
+        return M,graph,nbytes
+
+    # The model for _key (loaded if needed); keep the returned object only for the current call
+    def get(self,_key):
+        with self.lock:
+            if _key in self.models:
+                self.models.move_to_end(_key)
+                return self.models[_key][0]
+            if _key not in self.specs:
+                raise KeyError('model [%s] is not registered'%(_key))
+            self.models[_key] = self._load(_key)
+            self._shrink(_keep=_key)
+            return self.models[_key][0]
+
+    def _shrink(self,_keep=None):
+        while len(self.models) > 1:
+            over_count = len(self.models) > self.max_models
+            over_bytes = (self.max_bytes is not None) and (self.nbytes() > self.max_bytes)
+            if not (over_count or over_bytes):
+                break
+            key = next(iter(self.models))
+            if key == _keep:
+                break
+            self.evict(key)
+
+    def evict(self,_key):
+        with self.lock:
+            M,graph,nbytes = self.models.pop(_key)
+            M.sess.close()
+            self.n_evict += 1
+            if self.VERBOSE:
+                print ("[%s] evicted (%.1fMB)"%(_key,nbytes/2.0**20))
+
+    def nbytes(self):
+        return sum(nbytes for _,_,nbytes in self.models.values())
+
+    def stats(self):
+        with self.lock:
+            return {'n_registered':len(self.specs),'n_resident':len(self.models),
+                    'resident':list(self.models.keys()),'nbytes':self.nbytes(),
+                    'n_load':self.n_load,'n_evict':self.n_evict}
+
+    def close(self):
+        with self.lock:
+            for key in list(self.models.keys()):
+                self.evict(key)
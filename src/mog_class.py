@@ -1,172 +1,297 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
 import tensorflow as tf
+from mog_em import fit_em,fit_em_stream
+from ckpt_util import save_ckpt,load_ckpt,read_hyper,assign_vars
+from util import eval_log_lik,early_stopping_class
+from data_pipeline import batch_loader_class
+from mdn_np import mog_cdf,mog_quantile
 
 tfd = tf.contrib.distributions
+
+# Gradient training shared by the MoG classes (Adam on minibatches of _x_train)
+#  With _x_val, the held-out mean log likelihood is evaluated (in chunks) every _EVAL_EVERY steps;
+#  training stops after _patience evaluations without improvement and the best weights are restored
+def train_mog(_M,_x_train,_x_val=None,_max_iter=1000,_batch_size=256,_EVAL_EVERY=50,_patience=None,
+              _min_delta=0.0,_RESTORE_BEST=True,_n_prefetch=2,_VERBOSE=False):
+    loader = batch_loader_class([_x_train],_batch_size=_batch_size,_n_prefetch=_n_prefetch)
+    VAL = _x_val is not None
+    stopper = early_stopping_class(_patience=_patience,_min_delta=_min_delta)
+    best_vals = None
+    n_iter = 0 # iterations run
+    for it in range(_max_iter):
+        x_batch, = loader.next_batch()
+        _,cost_val = _M.sess.run([_M.optm,_M.cost],feed_dict={_M.x:x_batch})
+        n_iter = it+1
+        if VAL and ((((it+1)%_EVAL_EVERY)==0) or (it==(_max_iter-1))):
+            val_log_lik = _M.eval_log_lik(_x_val)
+            IMPROVED,STOP = stopper.update(it,val_log_lik)
+            if IMPROVED and _RESTORE_BEST:
+                best_vals = _M.sess.run(_M.c_vars)
+            if _VERBOSE:
+                print ("[%d/%d] cost:%.4f val log_lik:%.4f"%(it,_max_iter,cost_val,val_log_lik))
+            if STOP:
+                break
+    loader.close()
+    if VAL and _RESTORE_BEST and (best_vals is not None):
+        assign_vars(_M,_M.c_vars,best_vals)
+    _M.val_hist,_M.best_iter,_M.best_val_log_lik = stopper.hist,stopper.best_iter,stopper.best_val
+    return n_iter
+
 class MoG_class(object):
-    def __init__(self,_x_dim=2,_k=5,_sess=None):
+    def __init__(self,_x_dim=2,_k=5,_sess=None,_name='mog',_BUILD_OPTM=True):
+        self.name = _name
         self.x_dim = _x_dim 
         self.k = _k # number of mixture
+        self.BUILD_OPTM = _BUILD_OPTM
         self.sess = _sess
+        _vars_before = set(var.name for var in tf.global_variables())
         self._build_graph()
+        self.model_vars = [var for var in tf.global_variables() if var.name not in _vars_before]
         # Initialize parameters 
-        self.sess.run(tf.global_variables_initializer())
+        self.sess.run(tf.variables_initializer(self.model_vars)) # this model only
     def _build_graph(self):
-        # Placeholder
-        self.x = tf.placeholder(dtype=tf.float32,shape=(None,self.x_dim),
-                                name='x') # [N x x_dim]
-        self.n = tf.shape(self.x)[0] # number of batch
-        # Define pi, mu ,and variance
-        pi_speed = 100
-        pi_initializer = tf.truncated_normal_initializer(stddev=np.sqrt(0.1/pi_speed)) # make each mu to follow Gaussian with var=0.1
-        self.pi_mtx = tf.get_variable(name='pi_mtx',shape=(pi_speed,self.k),
-                        dtype=tf.float32,initializer=pi_initializer)
-        self.pi = tf.reduce_sum(self.pi_mtx,axis=0,name='pi') # [k]
-        self.pi = tf.nn.softmax(self.pi) # [k] sum to one
-        mu_speed = 100
-        mu_initializer = tf.truncated_normal_initializer(stddev=np.sqrt(1.0/mu_speed)) # make each mu to follow unit Gaussian
-        self.mu_mtx = tf.get_variable(name='mu_mtx',shape=(mu_speed,self.x_dim,self.k),
-                        dtype=tf.float32,initializer=mu_initializer)
-        self.mu = tf.reduce_sum(self.mu_mtx,axis=0,name='mu') # [x_dim x k]
-        logvar_speed = 100
-        # logvar_initializer = tf.truncated_normal_initializer(stddev=0.01)
-        logvar_initializer = tf.constant_initializer(value=-3.0/logvar_speed)
-        self.logvar_mtx = tf.get_variable(name='logvar_mtx',
-                            shape=(logvar_speed,self.x_dim,self.k),
-                            dtype=tf.float32,initializer=logvar_initializer) # [N x x_dim]
-        self.logvar = tf.reduce_sum(self.logvar_mtx,axis=0,name='logvar') # [x_dim x k]
-        self.var = tf.exp(self.logvar) # [x_dim x k]
+        with tf.variable_scope(self.name,reuse=False) as scope:
+            self.name_scope = scope.original_name_scope
+            # Placeholder
+            self.x = tf.placeholder(dtype=tf.float32,shape=(None,self.x_dim),
+                                    name='x') # [N x x_dim]
+            self.n = tf.shape(self.x)[0] # number of batch
+            # Define pi, mu ,and variance
+            pi_speed = self.pi_speed = 100
+            pi_initializer = tf.truncated_normal_initializer(stddev=np.sqrt(0.1/pi_speed)) # make each mu to follow Gaussian with var=0.1
+            self.pi_mtx = tf.get_variable(name='pi_mtx',shape=(pi_speed,self.k),
+                            dtype=tf.float32,initializer=pi_initializer)
+            self.pi = tf.reduce_sum(self.pi_mtx,axis=0,name='pi') # [k]
+            self.pi = tf.nn.softmax(self.pi) # [k] sum to one
+            mu_speed = self.mu_speed = 100
+            mu_initializer = tf.truncated_normal_initializer(stddev=np.sqrt(1.0/mu_speed)) # make each mu to follow unit Gaussian
+            self.mu_mtx = tf.get_variable(name='mu_mtx',shape=(mu_speed,self.x_dim,self.k),
+                            dtype=tf.float32,initializer=mu_initializer)
+            self.mu = tf.reduce_sum(self.mu_mtx,axis=0,name='mu') # [x_dim x k]
+            logvar_speed = self.logvar_speed = 100
+            # logvar_initializer = tf.truncated_normal_initializer(stddev=0.01)
+            logvar_initializer = tf.constant_initializer(value=-3.0/logvar_speed)
+            self.logvar_mtx = tf.get_variable(name='logvar_mtx',
+                                shape=(logvar_speed,self.x_dim,self.k),
+                                dtype=tf.float32,initializer=logvar_initializer) # [N x x_dim]
+            self.logvar = tf.reduce_sum(self.logvar_mtx,axis=0,name='logvar') # [x_dim x k]
+            self.var = tf.exp(self.logvar) # [x_dim x k]
+        self.c_vars = [var for var in tf.trainable_variables() if var.name.startswith('%s/'%(self.name))]
         
-        # Sampler 
-        self.n_sample = tf.placeholder(dtype=tf.int32,name='N_sample')
-        cat = tfd.Categorical(probs=self.pi)
-        components = [tfd.MultivariateNormalDiag(loc=self.mu[:,i],
-                          scale_diag=tf.sqrt(self.var[:,i])) for i in range(self.k)]
-        self.tfd_mog = tfd.Mixture(cat=cat,components=components)
-        self.x_sample = self.tfd_mog.sample(self.n_sample) # [n x d]
+        with tf.name_scope(self.name_scope): # mixture ops under the model's name scope
+            # Sampler 
+            self.n_sample = tf.placeholder(dtype=tf.int32,name='N_sample')
+            cat = tfd.Categorical(probs=self.pi)
+            components = [tfd.MultivariateNormalDiag(loc=self.mu[:,i],
+                              scale_diag=tf.sqrt(self.var[:,i])) for i in range(self.k)]
+            self.tfd_mog = tfd.Mixture(cat=cat,components=components)
+            self.x_sample = self.tfd_mog.sample(self.n_sample) # [n x d]
         
-        # Log likelihood
-        self.log_liks = self.tfd_mog.log_prob(self.x)
-        self.log_lik = tf.reduce_mean(self.log_liks)
-        self.cost = -self.log_lik
+            # Log likelihood
+            self.log_liks = self.tfd_mog.log_prob(self.x)
+            self.log_lik = tf.reduce_mean(self.log_liks)
+            self.cost = -self.log_lik
         
         # Optimizer
-        self.optm = tf.train.AdamOptimizer(learning_rate=1e-3).minimize(self.cost)
+        _optm_before = set(var.name for var in tf.global_variables())
+        if self.BUILD_OPTM:
+            self.optm = tf.train.AdamOptimizer(learning_rate=1e-3).minimize(self.cost)
+        else: # inference only (e.g., a reloaded model)
+            self.optm = None
+        self.optm_vars = [var for var in tf.global_variables() if var.name not in _optm_before]
+
+    # Minibatch training with optional early stopping (see train_mog); returns the number of iterations run
+    def train(self,_x_train,_x_val=None,_max_iter=1000,_batch_size=256,_EVAL_EVERY=50,_patience=None,
+              _min_delta=0.0,_RESTORE_BEST=True,_n_prefetch=2,_VERBOSE=False):
+        return train_mog(self,_x_train,_x_val=_x_val,_max_iter=_max_iter,_batch_size=_batch_size,
+                         _EVAL_EVERY=_EVAL_EVERY,_patience=_patience,_min_delta=_min_delta,
+                         _RESTORE_BEST=_RESTORE_BEST,_n_prefetch=_n_prefetch,_VERBOSE=_VERBOSE)
+
+    # Mean log likelihood over a held-out set, evaluated in chunks
+    def eval_log_lik(self,_x,_batch_size=8192):
+        return eval_log_lik(self.sess,self.log_liks,{self.x:_x},_batch_size)
+
+    # Save model variables (and the optimizer state to resume training) to a '.npz' file
+    def save(self,_path,_SAVE_OPTM=False,_iter=None):
+        save_ckpt(self,_path,{'x_dim':self.x_dim,'k':self.k},_SAVE_OPTM=_SAVE_OPTM,_iter=_iter)
+
+    # Restore variables saved by save(); returns the saved iteration (or None)
+    def restore(self,_path,_LOAD_OPTM=False):
+        return load_ckpt(self,_path,_LOAD_OPTM=_LOAD_OPTM and self.BUILD_OPTM)
+
+    # Build a model from a checkpoint (the optimizer is built only when _TRAIN=True)
+    @classmethod
+    def load(cls,_path,_sess,_name='mog',_TRAIN=False):
+        hyper = read_hyper(_path)
+        M = cls(_name=_name,_x_dim=hyper['x_dim'],_k=hyper['k'],_BUILD_OPTM=_TRAIN,_sess=_sess)
+        M.restore(_path,_LOAD_OPTM=_TRAIN)
+        return M
+
+    # Overwrite pi:[k], mu:[x_dim x k], var:[x_dim x k] through the reparameterized variables
+    def set_params(self,_pi,_mu,_var):
+        assign_vars(self,[self.pi_mtx,self.mu_mtx,self.logvar_mtx],
+                    [np.tile(np.log(_pi)/self.pi_speed,(self.pi_speed,)+(1,)*np.ndim(_pi)),
+                     np.tile(_mu/self.mu_speed,(self.mu_speed,1,1)),
+                     np.tile(np.log(_var)/self.logvar_speed,(self.logvar_speed,1,1))])
+
+    # Fit with closed-form EM (k-means++ seeding, several restarts) and write the result back
+    def fit_em(self,_x,_max_iter=100,_tol=1e-6,_n_restart=5,_var_floor=1e-6,_seed=None):
+        pi,mu,var,log_lik_hist = fit_em(_x,self.k,_INDEP=False,_max_iter=_max_iter,_tol=_tol,
+                                        _n_restart=_n_restart,_var_floor=_var_floor,_seed=_seed)
+        self.set_params(pi,mu,var)
+        return log_lik_hist
+
+    # Fit with out-of-core EM over chunks of an array or a '.npy' file (see mog_em.fit_em_stream)
+    def fit_em_stream(self,_data,_chunk_size=100000,_max_iter=100,_tol=1e-6,_n_proc=1,
+                      _ONLINE=False,_var_floor=1e-6,_seed=None,_VERBOSE=False):
+        pi,mu,var,log_lik_hist = fit_em_stream(_data,self.k,_INDEP=False,_chunk_size=_chunk_size,
+                                               _max_iter=_max_iter,_tol=_tol,_n_proc=_n_proc,
+                                               _ONLINE=_ONLINE,_var_floor=_var_floor,
+                                               _seed=_seed,_VERBOSE=_VERBOSE)
+        self.set_params(pi,mu,var)
+        return log_lik_hist
         
+    # Plot samples (matplotlib is imported only when plotting)
     def plot_samples(self,_n_sample=1000,_x_train=None,_title_str=None):
-        x_sample = self.sess.run(self.x_sample,feed_dict={self.n_sample:_n_sample})
-        pi,mu,var = self.sess.run([self.pi,self.mu,self.var]) # [k], [x_dim x k], [x_dim x k]
-        dim = x_sample.shape[1] # dimension 
-        plt.figure(figsize=(8,6));plt.grid(True)
-        if _x_train is not None:
-            plt.plot(_x_train[:,0],_x_train[:,1],'r.') # plot training data
-        plt.plot(x_sample[:,0],x_sample[:,1],'bx') # plot samples 
-        if _title_str is not None:
-            plt.title(_title_str,fontsize=15)
-        plt.axis('equal'); plt.show()
+        from plot_util import plot_mog_samples
+        plot_mog_samples(self,_n_sample=_n_sample,_x_train=_x_train,_title_str=_title_str)
         
 
 
 class MoG_indep_class(object):
-    def __init__(self,_x_dim=2,_k=5,_sess=None):
+    def __init__(self,_x_dim=2,_k=5,_sess=None,_name='mog',_BUILD_OPTM=True):
+        self.name = _name
         self.x_dim = _x_dim 
         self.k = _k # number of mixture
+        self.BUILD_OPTM = _BUILD_OPTM
         self.sess = _sess
+        _vars_before = set(var.name for var in tf.global_variables())
         self._build_graph()
+        self.model_vars = [var for var in tf.global_variables() if var.name not in _vars_before]
         # Initialize parameters 
-        self.sess.run(tf.global_variables_initializer())
+        self.sess.run(tf.variables_initializer(self.model_vars)) # this model only
     def _build_graph(self):
-        # Placeholder
-        self.x = tf.placeholder(dtype=tf.float32,shape=(None,self.x_dim),
-                                name='x') # [N x x_dim]
-        self.n = tf.shape(self.x)[0] # number of batch
-        # Define pi, mu ,and variance
-        pi_speed = 100
-        pi_initializer = tf.truncated_normal_initializer(stddev=np.sqrt(0.1/pi_speed)) # make each mu to follow Gaussian with var=0.1
-        self.pi_mtx = tf.get_variable(name='pi_mtx',shape=(pi_speed,self.x_dim,self.k),
-                        dtype=tf.float32,initializer=pi_initializer)
-        self.pi = tf.reduce_sum(self.pi_mtx,axis=0,name='pi') # [x_dim x k]
-        self.pi = tf.nn.softmax(self.pi) # [k] sum to one
-        mu_speed = 100
-        mu_initializer = tf.truncated_normal_initializer(stddev=np.sqrt(1.0/mu_speed)) # make each mu to follow unit Gaussian
-        self.mu_mtx = tf.get_variable(name='mu_mtx',shape=(mu_speed,self.x_dim,self.k),
-                        dtype=tf.float32,initializer=mu_initializer)
-        self.mu = tf.reduce_sum(self.mu_mtx,axis=0,name='mu') # [x_dim x k]
-        logvar_speed = 100
-        # logvar_initializer = tf.truncated_normal_initializer(stddev=0.01)
-        logvar_initializer = tf.constant_initializer(value=-3.0/logvar_speed)
-        self.logvar_mtx = tf.get_variable(name='logvar_mtx',
-                            shape=(logvar_speed,self.x_dim,self.k),
-                            dtype=tf.float32,initializer=logvar_initializer) 
-        self.logvar = tf.reduce_sum(self.logvar_mtx,axis=0,name='logvar') # [x_dim x k]
-        self.var = tf.exp(self.logvar) # [x_dim x k]
+        with tf.variable_scope(self.name,reuse=False) as scope:
+            self.name_scope = scope.original_name_scope
+            # Placeholder
+            self.x = tf.placeholder(dtype=tf.float32,shape=(None,self.x_dim),
+                                    name='x') # [N x x_dim]
+            self.n = tf.shape(self.x)[0] # number of batch
+            # Define pi, mu ,and variance
+            pi_speed = self.pi_speed = 100
+            pi_initializer = tf.truncated_normal_initializer(stddev=np.sqrt(0.1/pi_speed)) # make each mu to follow Gaussian with var=0.1
+            self.pi_mtx = tf.get_variable(name='pi_mtx',shape=(pi_speed,self.x_dim,self.k),
+                            dtype=tf.float32,initializer=pi_initializer)
+            self.pi = tf.reduce_sum(self.pi_mtx,axis=0,name='pi') # [x_dim x k]
+            self.pi = tf.nn.softmax(self.pi) # [k] sum to one
+            mu_speed = self.mu_speed = 100
+            mu_initializer = tf.truncated_normal_initializer(stddev=np.sqrt(1.0/mu_speed)) # make each mu to follow unit Gaussian
+            self.mu_mtx = tf.get_variable(name='mu_mtx',shape=(mu_speed,self.x_dim,self.k),
+                            dtype=tf.float32,initializer=mu_initializer)
+            self.mu = tf.reduce_sum(self.mu_mtx,axis=0,name='mu') # [x_dim x k]
+            logvar_speed = self.logvar_speed = 100
+            # logvar_initializer = tf.truncated_normal_initializer(stddev=0.01)
+            logvar_initializer = tf.constant_initializer(value=-3.0/logvar_speed)
+            self.logvar_mtx = tf.get_variable(name='logvar_mtx',
+                                shape=(logvar_speed,self.x_dim,self.k),
+                                dtype=tf.float32,initializer=logvar_initializer) 
+            self.logvar = tf.reduce_sum(self.logvar_mtx,axis=0,name='logvar') # [x_dim x k]
+            self.var = tf.exp(self.logvar) # [x_dim x k]
+        self.c_vars = [var for var in tf.trainable_variables() if var.name.startswith('%s/'%(self.name))]
         
-        # Sampler 
-        self.n_sample = tf.placeholder(dtype=tf.int32,name='N_sample')
-        cat = tfd.Categorical(probs=self.pi)
-        components = [tfd.Normal(loc=self.mu[:,i],
-                          scale=tf.sqrt(self.var[:,i])) for i in range(self.k)]
-        self.tfd_mog = tfd.Mixture(cat=cat,components=components)
-        self.x_sample = self.tfd_mog.sample(self.n_sample) # [n x d]
+        with tf.name_scope(self.name_scope): # mixture ops under the model's name scope
+            # Sampler 
+            self.n_sample = tf.placeholder(dtype=tf.int32,name='N_sample')
+            cat = tfd.Categorical(probs=self.pi)
+            components = [tfd.Normal(loc=self.mu[:,i],
+                              scale=tf.sqrt(self.var[:,i])) for i in range(self.k)]
+            self.tfd_mog = tfd.Mixture(cat=cat,components=components)
+            self.x_sample = self.tfd_mog.sample(self.n_sample) # [n x d]
         
-        # Log likelihood
-        self.log_liks = self.tfd_mog.log_prob(self.x)
-        self.log_lik = tf.reduce_mean(self.log_liks)
-        self.cost = -self.log_lik
+            # Log likelihood
+            self.log_liks = self.tfd_mog.log_prob(self.x)
+            self.log_lik = tf.reduce_mean(self.log_liks)
+            self.cost = -self.log_lik
         
         # Optimizer
-        self.optm = tf.train.AdamOptimizer(learning_rate=1e-3).minimize(self.cost)
+        _optm_before = set(var.name for var in tf.global_variables())
+        if self.BUILD_OPTM:
+            self.optm = tf.train.AdamOptimizer(learning_rate=1e-3).minimize(self.cost)
+        else: # inference only (e.g., a reloaded model)
+            self.optm = None
+        self.optm_vars = [var for var in tf.global_variables() if var.name not in _optm_before]
+
+    # Minibatch training with optional early stopping (see train_mog); returns the number of iterations run
+    def train(self,_x_train,_x_val=None,_max_iter=1000,_batch_size=256,_EVAL_EVERY=50,_patience=None,
+              _min_delta=0.0,_RESTORE_BEST=True,_n_prefetch=2,_VERBOSE=False):
+        return train_mog(self,_x_train,_x_val=_x_val,_max_iter=_max_iter,_batch_size=_batch_size,
+                         _EVAL_EVERY=_EVAL_EVERY,_patience=_patience,_min_delta=_min_delta,
+                         _RESTORE_BEST=_RESTORE_BEST,_n_prefetch=_n_prefetch,_VERBOSE=_VERBOSE)
+
+    # Mean log likelihood over a held-out set, evaluated in chunks
+    def eval_log_lik(self,_x,_batch_size=8192):
+        return eval_log_lik(self.sess,self.log_liks,{self.x:_x},_batch_size)
+
+    # Save model variables (and the optimizer state to resume training) to a '.npz' file
+    def save(self,_path,_SAVE_OPTM=False,_iter=None):
+        save_ckpt(self,_path,{'x_dim':self.x_dim,'k':self.k},_SAVE_OPTM=_SAVE_OPTM,_iter=_iter)
+
+    # Restore variables saved by save(); returns the saved iteration (or None)
+    def restore(self,_path,_LOAD_OPTM=False):
+        return load_ckpt(self,_path,_LOAD_OPTM=_LOAD_OPTM and self.BUILD_OPTM)
+
+    # Build a model from a checkpoint (the optimizer is built only when _TRAIN=True)
+    @classmethod
+    def load(cls,_path,_sess,_name='mog',_TRAIN=False):
+        hyper = read_hyper(_path)
+        M = cls(_name=_name,_x_dim=hyper['x_dim'],_k=hyper['k'],_BUILD_OPTM=_TRAIN,_sess=_sess)
+        M.restore(_path,_LOAD_OPTM=_TRAIN)
+        return M
+
+    # Overwrite pi:[x_dim x k], mu:[x_dim x k], var:[x_dim x k] through the reparameterized variables
+    def set_params(self,_pi,_mu,_var):
+        assign_vars(self,[self.pi_mtx,self.mu_mtx,self.logvar_mtx],
+                    [np.tile(np.log(_pi)/self.pi_speed,(self.pi_speed,)+(1,)*np.ndim(_pi)),
+                     np.tile(_mu/self.mu_speed,(self.mu_speed,1,1)),
+                     np.tile(np.log(_var)/self.logvar_speed,(self.logvar_speed,1,1))])
+
+    # Fit with closed-form EM (k-means++ seeding, several restarts) and write the result back
+    def fit_em(self,_x,_max_iter=100,_tol=1e-6,_n_restart=5,_var_floor=1e-6,_seed=None):
+        pi,mu,var,log_lik_hist = fit_em(_x,self.k,_INDEP=True,_max_iter=_max_iter,_tol=_tol,
+                                        _n_restart=_n_restart,_var_floor=_var_floor,_seed=_seed)
+        self.set_params(pi,mu,var)
+        return log_lik_hist
+
+    # Fit with out-of-core EM over chunks of an array or a '.npy' file (see mog_em.fit_em_stream)
+    def fit_em_stream(self,_data,_chunk_size=100000,_max_iter=100,_tol=1e-6,_n_proc=1,
+                      _ONLINE=False,_var_floor=1e-6,_seed=None,_VERBOSE=False):
+        pi,mu,var,log_lik_hist = fit_em_stream(_data,self.k,_INDEP=True,_chunk_size=_chunk_size,
+                                               _max_iter=_max_iter,_tol=_tol,_n_proc=_n_proc,
+                                               _ONLINE=_ONLINE,_var_floor=_var_floor,
+                                               _seed=_seed,_VERBOSE=_VERBOSE)
+        self.set_params(pi,mu,var)
+        return log_lik_hist
+
+    # Per-dimension cdf of _x ([n x x_dim]), computed in numpy from the current parameters
+    def cdf(self,_x):
+        pi,mu,var = self.sess.run([self.pi,self.mu,self.var]) # [x_dim x k]
+        n = _x.shape[0]
+        return mog_cdf(_x,np.broadcast_to(pi,(n,)+pi.shape),np.broadcast_to(mu,(n,)+mu.shape),
+                       np.broadcast_to(var,(n,)+var.shape),_INDEP=True) # [n x x_dim]
+
+    # Per-dimension quantiles: scalar _q -> [x_dim], list of m levels -> [m x x_dim]
+    def quantile(self,_q,_tol=1e-6):
+        pi,mu,var = self.sess.run([self.pi,self.mu,self.var])
+        return mog_quantile(_q,pi[np.newaxis],mu[np.newaxis],var[np.newaxis],_INDEP=True,_tol=_tol)[0]
+
+    # Central interval with the given coverage per dimension (lower,upper: [x_dim])
+    def predict_interval(self,_coverage=0.95,_tol=1e-6):
+        bounds = self.quantile([(1-_coverage)/2,(1+_coverage)/2],_tol=_tol)
+        return bounds[0],bounds[1]
         
+    # Plot samples (matplotlib is imported only when plotting)
     def plot_samples(self,_n_sample=1000,_x_train=None,_title_str=None,_fontsize=15,
                      _figsize=(12,5),_wspace=0.1,_hspace=0.05):
-        
-        x_sample = self.sess.run(self.x_sample,feed_dict={self.n_sample:_n_sample}) # [n x d]
-        pi,mu,var = self.sess.run([self.pi,self.mu,self.var]) # [d x k], [d x k], [d x k]
-        dim = x_sample.shape[1] # dimension 
-        nr,nc = 1,dim
-        if nc>2: nc=2 # Upper limit on the number of columns
-        gs = gridspec.GridSpec(nr,nc)
-        gs.update(wspace=_wspace, hspace=_hspace)
-        fig = plt.figure(figsize=_figsize)
-        if _title_str is not None:
-            fig.suptitle(_title_str, size=_fontsize)
-        for i in range(nr*nc): # per each dimension            
-            ax = plt.subplot(gs[i])
-            # Plot GMM
-            x_min,x_max = x_sample[:,i].min(),x_sample[:,i].max()
-            xs = np.linspace(x_min,x_max,1000)
-            curr_pi = pi[i,:] # [k]
-            curr_mu = mu[i,:] # [k]
-            curr_var = var[i,:] # [k]
-            def pdf_Gaussian(_in,_mu,_var):
-                prob = 1/(np.sqrt(2*np.pi*_var))*np.exp(-0.5/_var*(_in-_mu)**2)
-                return prob
-            def pdf_GMM(_ins,_pis,_mus,_vars):
-                probs = np.zeros_like(_ins)
-                for idx,_in in enumerate(_ins): # for each input
-                    prob = 0
-                    for j in range(self.k): # for each mixture
-                        prob += _pis[j]*pdf_Gaussian(_in,_mus[j],_vars[j])
-                    probs[idx] = prob 
-                return probs
-            # Plot histogram
-            x_train_i = _x_train[:,i]
-            x_sample_i = x_sample[:,i]
-            plt.hist([x_train_i,x_sample_i],bins=20,
-                     color=['r','b'],label=['train','sample'],density=True,alpha=0.5)
-            plt.title('[%d]-th dimension'%(i+1),fontsize=13)
-            # Plot each mixture Gaussian pdf
-            cmap = plt.get_cmap('gist_rainbow')
-            colors = [cmap(ii) for ii in np.linspace(0,1,self.k)]
-            for j in range(self.k): # per each mixture
-                j_th_probs = curr_pi[j]*pdf_Gaussian(xs,curr_mu[j],curr_var[j])
-                plt.plot(xs,j_th_probs,'-',color='k',linewidth=1)
-            # Plot the total GMM pdf
-            gmm_probs = pdf_GMM(xs,curr_pi,curr_mu,curr_var) # compute GMM pdf 
-            plt.fill_between(xs,np.zeros_like(gmm_probs),gmm_probs,
-                             facecolor='g',interpolate=True, alpha=0.3)    
-        plt.show()        
-        
-        
-        
\ No newline at end of file
+        from plot_util import plot_mog_indep_samples
+        plot_mog_indep_samples(self,_n_sample=_n_sample,_x_train=_x_train,_title_str=_title_str,
+                               _fontsize=_fontsize,_figsize=_figsize,_wspace=_wspace,_hspace=_hspace)
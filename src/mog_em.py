@@ -0,0 +1,218 @@
+import mmap
+import collections
+import numpy as np
+
+# Closed-form EM for diagonal Gaussian mixtures (NumPy only)
+#  Parameters follow the layout of MoG_class / MoG_indep_class:
+#   joint (MoG_class):       pi:[k]       / mu:[x_dim x k] / var:[x_dim x k]
+#   indep (MoG_indep_class): pi:[x_dim x k] / mu:[x_dim x k] / var:[x_dim x k]
+LOG_2PI = float(np.log(2*np.pi))
+
+def logsumexp(_x,axis=-1):
+    x_max = np.max(_x,axis=axis,keepdims=True)
+    return np.squeeze(x_max,axis=axis)+np.log(np.sum(np.exp(_x-x_max),axis=axis))
+
+# k-means++ seeding: each next center is drawn proportional to the squared distance
+def kmeanspp_init(_x,_k,_rng=np.random):
+    n = _x.shape[0]
+    centers = [_x[_rng.randint(n)]]
+    d2 = np.sum(np.square(_x-centers[0]),axis=1) # [n]
+    for _ in range(1,_k):
+        if np.sum(d2) <= 0:
+            idx = _rng.randint(n)
+        else:
+            idx = _rng.choice(n,p=d2/np.sum(d2))
+        centers.append(_x[idx])
+        d2 = np.minimum(d2,np.sum(np.square(_x-_x[idx]),axis=1))
+    return np.stack(centers,axis=1) # [x_dim x k]
+
+def init_params(_x,_k,_INDEP=False,_rng=np.random):
+    x_dim = _x.shape[1]
+    var0 = np.var(_x,axis=0)[:,np.newaxis]/_k+1e-6 # [x_dim x 1]
+    if _INDEP:
+        mu = np.concatenate([kmeanspp_init(_x[:,d:d+1],_k,_rng) for d in range(x_dim)],axis=0) # [x_dim x k]
+        pi = np.ones((x_dim,_k))/_k
+    else:
+        mu = kmeanspp_init(_x,_k,_rng) # [x_dim x k]
+        pi = np.ones(_k)/_k
+    var = np.tile(var0,(1,_k)) # [x_dim x k]
+    return pi,mu,var
+
+# E-step: log responsibilities and per-row log likelihoods
+def e_step(_x,_pi,_mu,_var,_INDEP=False):
+    if _INDEP:
+        diff_sq = np.square(_x[:,:,np.newaxis]-_mu) # [n x x_dim x k]
+        log_p = np.log(_pi)-0.5*(LOG_2PI+np.log(_var)+diff_sq/_var) # [n x x_dim x k]
+        log_liks = logsumexp(log_p,axis=2) # [n x x_dim]
+        log_resp = log_p-log_liks[:,:,np.newaxis]
+    else:
+        prec = 1.0/_var # [x_dim x k]
+        maha = (np.dot(np.square(_x),prec)-2*np.dot(_x,_mu*prec)
+                +np.sum(np.square(_mu)*prec,axis=0)) # [n x k]
+        log_p = np.log(_pi)-0.5*(_x.shape[1]*LOG_2PI+np.sum(np.log(_var),axis=0)+maha) # [n x k]
+        log_liks = logsumexp(log_p,axis=1) # [n]
+        log_resp = log_p-log_liks[:,np.newaxis]
+    return log_resp,log_liks
+
+# Sufficient statistics: responsibility sums, first and second moments
+def suff_stats(_x,_resp,_INDEP=False):
+    if _INDEP:
+        s0 = np.sum(_resp,axis=0) # [x_dim x k]
+        s1 = np.sum(_resp*_x[:,:,np.newaxis],axis=0) # [x_dim x k]
+        s2 = np.sum(_resp*np.square(_x)[:,:,np.newaxis],axis=0) # [x_dim x k]
+    else:
+        s0 = np.sum(_resp,axis=0) # [k]
+        s1 = np.dot(_x.T,_resp) # [x_dim x k]
+        s2 = np.dot(np.square(_x).T,_resp) # [x_dim x k]
+    return s0,s1,s2
+
+# M-step from (accumulated) sufficient statistics
+def m_step(_s0,_s1,_s2,_var_floor=1e-6):
+    s0 = np.maximum(_s0,1e-12)
+    pi = s0/np.sum(s0,axis=-1,keepdims=True)
+    mu = _s1/s0
+    var = np.maximum(_s2/s0-np.square(mu),_var_floor)
+    return pi,mu,var
+
+def em(_x,_k,_INDEP=False,_max_iter=100,_tol=1e-6,_var_floor=1e-6,_init=None,_rng=np.random):
+    x = np.asarray(_x,dtype=np.float64)
+    pi,mu,var = init_params(x,_k,_INDEP=_INDEP,_rng=_rng) if _init is None else _init
+    log_lik_prev,log_lik_hist = -np.inf,[]
+    for _ in range(_max_iter):
+        log_resp,log_liks = e_step(x,pi,mu,var,_INDEP=_INDEP)
+        log_lik = np.sum(log_liks)/log_liks.size # mean per row (and per dimension)
+        log_lik_hist.append(log_lik)
+        pi,mu,var = m_step(*suff_stats(x,np.exp(log_resp),_INDEP=_INDEP),_var_floor=_var_floor)
+        if abs(log_lik-log_lik_prev) < _tol*max(1.0,abs(log_lik)):
+            break
+        log_lik_prev = log_lik
+    return pi,mu,var,log_lik_hist
+
+# Run EM from several k-means++ initializations and keep the best log likelihood
+def fit_em(_x,_k,_INDEP=False,_max_iter=100,_tol=1e-6,_n_restart=5,_var_floor=1e-6,_seed=None):
+    rng = np.random.RandomState(_seed)
+    best = None
+    for _ in range(_n_restart):
+        pi,mu,var,log_lik_hist = em(_x,_k,_INDEP=_INDEP,_max_iter=_max_iter,_tol=_tol,
+                                    _var_floor=_var_floor,_rng=rng)
+        if (best is None) or (log_lik_hist[-1] > best[3][-1]):
+            best = (pi,mu,var,log_lik_hist)
+    return best
+
+# Out-of-core EM: stream row chunks of a (memory-mapped) array and accumulate statistics
+#  _data: ndarray, np.memmap, or a '.npy' path (opened with mmap_mode='r' in each worker)
+def open_rows(_data):
+    if isinstance(_data,str):
+        return np.load(_data,mmap_mode='r')
+    if isinstance(_data,tuple): # memmap_spec
+        filename,dtype,shape,offset,order = _data
+        return np.memmap(filename,dtype=dtype,mode='r',shape=shape,offset=offset,order=order)
+    return _data
+
+# What the pool workers open: '.npy' paths and whole memmaps by file (each worker maps the file
+#  and slices its own chunks); other arrays are handed to each worker once at pool start-up
+#  (inherited without a copy under fork)
+def memmap_spec(_data):
+    if isinstance(_data,np.memmap) and isinstance(_data.base,mmap.mmap): # not a view
+        order = 'F' if (_data.flags['F_CONTIGUOUS'] and not _data.flags['C_CONTIGUOUS']) else 'C'
+        return (_data.filename,_data.dtype,_data.shape,_data.offset,order)
+    return _data
+
+def chunk_ranges(_n,_chunk_size):
+    return [(start,min(start+_chunk_size,_n)) for start in range(0,_n,_chunk_size)]
+
+# E-step statistics of rows [_start,_end)
+def chunk_stats(_rows,_start,_end,_pi,_mu,_var,_INDEP):
+    x = np.asarray(_rows[_start:_end],dtype=np.float64)
+    log_resp,log_liks = e_step(x,_pi,_mu,_var,_INDEP=_INDEP)
+    s0,s1,s2 = suff_stats(x,np.exp(log_resp),_INDEP=_INDEP)
+    return s0,s1,s2,np.sum(log_liks),log_liks.size
+
+# Pool workers: the rows are opened once per process, tasks only carry offsets and parameters
+_WORKER = {}
+
+def init_worker(_data):
+    _WORKER['rows'] = open_rows(_data)
+
+def worker_chunk_stats(_args):
+    return chunk_stats(_WORKER['rows'],*_args)
+
+# Sample rows for the k-means++ initialization without loading the whole array
+def sample_rows(_data,_n_sample,_rng=np.random):
+    rows = open_rows(_data)
+    n = rows.shape[0]
+    idx = np.sort(_rng.choice(n,size=min(n,_n_sample),replace=False))
+    return np.asarray(rows[idx],dtype=np.float64)
+
+# Statistics of all chunks summed in chunk order (identical to the serial pass), with at most
+#  2*n_proc chunks in flight
+def pass_stats(_pool,_n_proc,_rows,_ranges,_pi,_mu,_var,_INDEP):
+    if _pool is None:
+        results = (chunk_stats(_rows,start,end,_pi,_mu,_var,_INDEP) for start,end in _ranges)
+    else:
+        def pool_results():
+            pending = collections.deque()
+            for start,end in _ranges:
+                pending.append(_pool.apply_async(worker_chunk_stats,((start,end,_pi,_mu,_var,_INDEP),)))
+                if len(pending) >= 2*_n_proc:
+                    yield pending.popleft().get()
+            while len(pending) > 0:
+                yield pending.popleft().get()
+        results = pool_results()
+    acc = None
+    for res in results:
+        acc = list(res) if acc is None else [a+b for a,b in zip(acc,res)]
+    return acc
+
+# Batch (exact) EM over chunks, or stepwise online EM with _ONLINE=True
+#  _n_proc>1 spreads the chunks of each pass across a process pool and reduces the statistics;
+#  workers read their own chunks, so memory stays bounded by about _chunk_size*2*_n_proc rows
+#  beyond the data itself.
+#  _ONLINE: update the parameters after every chunk with step size (t+2)^-_decay (0.5<_decay<=1);
+#           the running statistics carry over from pass to pass. The updates are sequential,
+#           so _ONLINE runs in this process only (_n_proc>1 is an error).
+#           Chunks are visited in random order but rows are not shuffled across chunks,
+#           so the rows on disk should be shuffled for the online mode.
+def fit_em_stream(_data,_k,_INDEP=False,_chunk_size=100000,_max_iter=100,_tol=1e-6,
+                  _n_proc=1,_var_floor=1e-6,_n_init_sample=10000,_ONLINE=False,_decay=0.6,
+                  _seed=None,_VERBOSE=False):
+    if _ONLINE and (_n_proc > 1):
+        raise ValueError('online EM updates after every chunk and cannot use _n_proc>1')
+    rng = np.random.RandomState(_seed)
+    rows = open_rows(_data)
+    n = rows.shape[0]
+    pi,mu,var = init_params(sample_rows(rows,_n_init_sample,rng),_k,_INDEP=_INDEP,_rng=rng)
+    pool = None
+    if _n_proc > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes=_n_proc,initializer=init_worker,initargs=(memmap_spec(_data),))
+    ranges = chunk_ranges(n,_chunk_size)
+    log_lik_prev,log_lik_hist = -np.inf,[]
+    t,stats_avg = 0,None # online EM: step count and running (per-row) sufficient statistics
+    try:
+        for it in range(_max_iter):
+            if _ONLINE: # stepwise EM: one parameter update per chunk
+                sum_log_lik,cnt = 0.0,0
+                for c_idx in rng.permutation(len(ranges)):
+                    start,end = ranges[c_idx]
+                    s0,s1,s2,ll,c = chunk_stats(rows,start,end,pi,mu,var,_INDEP)
+                    stats = [s/(end-start) for s in (s0,s1,s2)]
+                    eta = (t+2.0)**(-_decay)
+                    stats_avg = stats if stats_avg is None else [(1-eta)*a+eta*b for a,b in zip(stats_avg,stats)]
+                    pi,mu,var = m_step(*stats_avg,_var_floor=_var_floor)
+                    sum_log_lik,cnt,t = sum_log_lik+ll,cnt+c,t+1
+            else: # exact EM: accumulate the statistics of all chunks, then one M-step
+                s0,s1,s2,sum_log_lik,cnt = pass_stats(pool,_n_proc,rows,ranges,pi,mu,var,_INDEP)
+                pi,mu,var = m_step(s0,s1,s2,_var_floor=_var_floor)
+            log_lik = sum_log_lik/cnt
+            log_lik_hist.append(log_lik)
+            if _VERBOSE:
+                print ("[%d/%d] log_lik:%.4f"%(it,_max_iter,log_lik))
+            if abs(log_lik-log_lik_prev) < _tol*max(1.0,abs(log_lik)):
+                break
+            log_lik_prev = log_lik
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return pi,mu,var,log_lik_hist
@@ -0,0 +1,149 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.gridspec as gridspec
+
+# Visualization layer, imported lazily by the model classes (keeps matplotlib out of
+# processes that only train or score)
+
+def plot_1d_graphs(_x1_list,_y1_list,_linestyles1,_markers1,_colors1,
+                   _x2_list=None,_y2_list=None,_linestyles2=None,_markers2=None,_colors2=None,
+                   _nR=1,_nC=10,_figsize=(15,2),
+                   _title=None,_titles=None,_tfs=15,
+                   _wspace=0.05,_hspace=0.05):
+    nr,nc = _nR,_nC
+    fig = plt.figure(figsize=_figsize)
+    if _title is not None:
+        fig.suptitle(_title, size=15)
+    gs  = gridspec.GridSpec(nr,nc)
+    gs.update(wspace=_wspace, hspace=_hspace)
+    for i in range(_nR*_nC):
+        ax = plt.subplot(gs[i])
+        plt.plot(_x1_list[i],_y1_list[i],
+                 linestyle=_linestyles1[i],marker=_markers1[i],color=_colors1[i])
+        if _x2_list is not None:
+            plt.plot(_x2_list[i],_y2_list[i],
+                     linestyle=_linestyles2[i],marker=_markers2[i],color=_colors2[i])
+        if _titles is not None:
+            plt.title(_titles[i],size=_tfs)
+    plt.show()
+
+# MDN results (MDN_reg_class: pi is [n x k] / MDN_reg_indep_class: pi is [n x y_dim x k])
+def plot_mdn_result(_M,_x_test,_title='MDN result',_fontsize=18,
+                    _figsize=(15,5),_wspace=0.1,_hspace=0.05,_sig_rate=1.0,_pi_th=0.0,
+                    _x_train=None,_y_train=None,
+                    _ylim=[-3,+3]):
+    # sample
+    out = _M.predict(_x_test,_fetch=['y_sample','mu','var','pi'],_sig_rate=_sig_rate)
+    y_sample,mu,var,pi = out['y_sample'],out['mu'],out['var'],out['pi'] # [n x y_dim], ...
+    # plot per each output dimensions (_M.y_dim)
+    nr,nc = 1,_M.y_dim
+    if nc>2: nc=2 # Upper limit on the number of columns
+    gs  = gridspec.GridSpec(nr,nc)
+    gs.update(wspace=_wspace, hspace=_hspace)
+    fig = plt.figure(figsize=_figsize)
+    fig.suptitle(_title, size=_fontsize)
+    for i in range(nr*nc): # per each dimension
+        ax = plt.subplot(gs[i])
+        cmap = plt.get_cmap('gist_rainbow')
+        colors = [cmap(ii) for ii in np.linspace(0,1,_M.k)]
+        pi_i = pi if pi.ndim == 2 else pi[:,i,:] # [n x k]
+        if _x_train is not None:
+            plt.plot(_x_train[:,0],_y_train[:,i],'k.')
+        plt.plot(_x_test[:,0],y_sample[:,i],'rx') # plot samples per each dimension
+        for j in range(_M.k): # per each mixture, plot variance
+            idx = np.where(pi_i[:,j]<_pi_th)[0]
+            plt.fill_between(_x_test[idx,0],mu[idx,i,j]-2*np.sqrt(var[idx,i,j]),mu[idx,i,j]+2*np.sqrt(var[idx,i,j]),
+                         facecolor='k', interpolate=True, alpha=0.05)
+            idx = np.where(pi_i[:,j]>_pi_th)[0]
+            plt.fill_between(_x_test[idx,0],mu[idx,i,j]-2*np.sqrt(var[idx,i,j]),mu[idx,i,j]+2*np.sqrt(var[idx,i,j]),
+                         facecolor=colors[j], interpolate=True, alpha=0.3)
+        for j in range(_M.k): # per each mixture, plot mu
+            idx = np.where(pi_i[:,j]>_pi_th)[0]
+            plt.plot(_x_test[:,0],mu[:,i,j],'-',color=[0.8,0.8,0.8],linewidth=1)
+            plt.plot(_x_test[idx,0],mu[idx,i,j],'-',color=colors[j],linewidth=3)
+        plt.xlim([_x_test.min(),_x_test.max()])
+        plt.ylim(_ylim)
+        plt.xlabel('Input',fontsize=13)
+        plt.ylabel('Output',fontsize=13)
+        plt.title('[%d]-th dimension'%(i+1),fontsize=13)
+    plt.show()
+
+# Epistemic (VE) and aleatoric (EV) uncertainties of an MDN
+def plot_mdn_variances(_M,_x_test,_title='blue:Var[E[y|x]] / red:E[Var[y|x]]',_fontsize=18,
+                       _figsize=(15,5),_wspace=0.1,_hspace=0.05):
+    # Plot EV and VE
+    out = _M.predict(_x_test,_fetch=['VEs','EVs'],_sig_rate=1.0) # sig_rate
+    VEs,EVs = out['VEs'],out['EVs']
+    VEs = 0.1*VEs # scale V[E[y|x]] to match that of E[V[y|x]]
+    # plot per each output dimensions (_M.y_dim)
+    nr,nc = 1,_M.y_dim
+    if nc>2: nc=2 # Upper limit on the number of columns
+    gs  = gridspec.GridSpec(nr,nc)
+    gs.update(wspace=_wspace, hspace=_hspace)
+    fig = plt.figure(figsize=_figsize)
+    fig.suptitle(_title, size=_fontsize)
+    for i in range(nr*nc): # per each dimension
+        ax = plt.subplot(gs[i])
+        plt.plot(_x_test.squeeze(),VEs[:,i],'b-')
+        plt.plot(_x_test.squeeze(),EVs[:,i],'r-')
+        plt.xlim([_x_test.min(),_x_test.max()])
+        plt.xlabel('Input',fontsize=13)
+        plt.ylabel('Output',fontsize=13)
+        plt.title('[%d]-th dimension'%(i+1),fontsize=13)
+    plt.show()
+
+# Samples of MoG_class (first two dimensions)
+def plot_mog_samples(_M,_n_sample=1000,_x_train=None,_title_str=None):
+    x_sample = _M.sess.run(_M.x_sample,feed_dict={_M.n_sample:_n_sample})
+    plt.figure(figsize=(8,6));plt.grid(True)
+    if _x_train is not None:
+        plt.plot(_x_train[:,0],_x_train[:,1],'r.') # plot training data
+    plt.plot(x_sample[:,0],x_sample[:,1],'bx') # plot samples
+    if _title_str is not None:
+        plt.title(_title_str,fontsize=15)
+    plt.axis('equal'); plt.show()
+
+def pdf_Gaussian(_in,_mu,_var):
+    prob = 1/(np.sqrt(2*np.pi*_var))*np.exp(-0.5/_var*(_in-_mu)**2)
+    return prob
+
+def pdf_GMM(_ins,_pis,_mus,_vars):
+    # [n x 1] against [k] -> [n x k] -> [n]
+    return np.sum(_pis*pdf_Gaussian(_ins[:,np.newaxis],_mus,_vars),axis=1)
+
+# Per-dimension histograms and pdfs of MoG_indep_class
+def plot_mog_indep_samples(_M,_n_sample=1000,_x_train=None,_title_str=None,_fontsize=15,
+                           _figsize=(12,5),_wspace=0.1,_hspace=0.05):
+    x_sample = _M.sess.run(_M.x_sample,feed_dict={_M.n_sample:_n_sample}) # [n x d]
+    pi,mu,var = _M.sess.run([_M.pi,_M.mu,_M.var]) # [d x k], [d x k], [d x k]
+    dim = x_sample.shape[1] # dimension
+    nr,nc = 1,dim
+    if nc>2: nc=2 # Upper limit on the number of columns
+    gs = gridspec.GridSpec(nr,nc)
+    gs.update(wspace=_wspace, hspace=_hspace)
+    fig = plt.figure(figsize=_figsize)
+    if _title_str is not None:
+        fig.suptitle(_title_str, size=_fontsize)
+    for i in range(nr*nc): # per each dimension
+        ax = plt.subplot(gs[i])
+        # Plot GMM
+        x_min,x_max = x_sample[:,i].min(),x_sample[:,i].max()
+        xs = np.linspace(x_min,x_max,1000)
+        curr_pi = pi[i,:] # [k]
+        curr_mu = mu[i,:] # [k]
+        curr_var = var[i,:] # [k]
+        # Plot histogram
+        x_train_i = _x_train[:,i]
+        x_sample_i = x_sample[:,i]
+        plt.hist([x_train_i,x_sample_i],bins=20,
+                 color=['r','b'],label=['train','sample'],density=True,alpha=0.5)
+        plt.title('[%d]-th dimension'%(i+1),fontsize=13)
+        # Plot each mixture Gaussian pdf
+        for j in range(_M.k): # per each mixture
+            j_th_probs = curr_pi[j]*pdf_Gaussian(xs,curr_mu[j],curr_var[j])
+            plt.plot(xs,j_th_probs,'-',color='k',linewidth=1)
+        # Plot the total GMM pdf
+        gmm_probs = pdf_GMM(xs,curr_pi,curr_mu,curr_var) # compute GMM pdf
+        plt.fill_between(xs,np.zeros_like(gmm_probs),gmm_probs,
+                         facecolor='g',interpolate=True, alpha=0.3)
+    plt.show()
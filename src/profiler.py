@@ -0,0 +1,111 @@
+import os
+import time
+import json
+import numpy as np
+
+# Per-step instrumentation for train_mdn() (pass as _profiler; None means no timing at all)
+#  Phases: 'batch' (next batch from the loader), 'run' (feed + optm/cost sess.run),
+#  'callbacks' (on_step), 'ckpt' (periodic save) and 'eval' (plots, on_eval, print-out).
+#  Every _TRACE_EVERY steps the sess.run is traced (RunMetadata) and written as a chrome
+#  timeline ('chrome://tracing') to _trace_dir. Every _EXPORT_EVERY steps _export_func(stats)
+#  gets the window averages (e.g., to push them to a metrics system).
+PHASES = ['batch','run','callbacks','ckpt','eval']
+
+class train_profiler_class(object):
+    def __init__(self,_TRACE_EVERY=0,_trace_dir='traces',_export_func=None,_EXPORT_EVERY=100,
+                 _VERBOSE=False):
+        self.TRACE_EVERY = _TRACE_EVERY
+        self.trace_dir = _trace_dir
+        self.export_func = _export_func
+        self.EXPORT_EVERY = _EXPORT_EVERY
+        self.VERBOSE = _VERBOSE
+        self.totals = dict((phase,0.0) for phase in PHASES) # cumulative seconds
+        self.window = dict((phase,0.0) for phase in PHASES) # seconds since the last export
+        self.n_step,self.n_example = 0,0
+        self.window_step,self.window_example = 0,0
+        self.iters,self.step_secs,self.costs = [],[],[]
+        self.traces = [] # paths of the written timelines
+        self.t_step,self.t_lap = None,None
+
+    def start_step(self,_iter):
+        self.iter = _iter
+        self.t_step = self.t_lap = time.time()
+
+    # Charge the time since the previous lap to _phase
+    def lap(self,_phase):
+        t = time.time()
+        sec = t-self.t_lap
+        self.totals[_phase] += sec
+        self.window[_phase] += sec
+        self.t_lap = t
+
+    # RunOptions / RunMetadata for the optimization step (both None when not tracing)
+    def trace_args(self):
+        if (self.TRACE_EVERY <= 0) or ((self.iter%self.TRACE_EVERY) != 0):
+            return None,None
+        import tensorflow as tf
+        return tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),tf.RunMetadata()
+
+    def write_trace(self,_run_metadata):
+        from tensorflow.python.client import timeline
+        if not os.path.exists(self.trace_dir):
+            os.makedirs(self.trace_dir)
+        path = os.path.join(self.trace_dir,'timeline_%08d.json'%(self.iter))
+        with open(path,'w') as f:
+            f.write(timeline.Timeline(_run_metadata.step_stats).generate_chrome_trace_format())
+        self.traces.append(path)
+        self.t_lap = time.time() # writing the trace is not charged to any phase
+
+    def end_step(self,_n_example,_cost_val):
+        step_sec = time.time()-self.t_step
+        self.n_step += 1
+        self.n_example += _n_example
+        self.window_step += 1
+        self.window_example += _n_example
+        self.iters.append(self.iter)
+        self.step_secs.append(step_sec)
+        self.costs.append(float(_cost_val))
+        if (self.export_func is not None) and (self.window_step >= self.EXPORT_EVERY):
+            self.export_func(self.window_stats())
+            self.window = dict((phase,0.0) for phase in PHASES)
+            self.window_step,self.window_example = 0,0
+
+    def window_stats(self):
+        total = sum(self.window.values())
+        stats = {'iter':self.iter,'n_step':self.window_step,
+                 'examples_per_sec':self.window_example/max(total,1e-12),
+                 'cost':float(np.mean(self.costs[-self.window_step:])) if self.window_step > 0 else None}
+        for phase in PHASES:
+            stats['%s_ms'%(phase)] = 1e3*self.window[phase]/max(self.window_step,1)
+        return stats
+
+    def summary(self):
+        total = sum(self.totals.values())
+        res = {'n_step':self.n_step,'n_example':self.n_example,'sec':total,
+               'examples_per_sec':self.n_example/max(total,1e-12)}
+        for phase in PHASES:
+            res['%s_sec'%(phase)] = self.totals[phase]
+            res['%s_frac'%(phase)] = self.totals[phase]/max(total,1e-12)
+        if self.n_step > 0:
+            res['step_ms_p50'] = 1e3*float(np.percentile(self.step_secs,50))
+            res['step_ms_p99'] = 1e3*float(np.percentile(self.step_secs,99))
+        return res
+
+    def print_summary(self):
+        res = self.summary()
+        print ("[%d steps] %.1f examples/sec, step p50:%.2fms p99:%.2fms"%
+               (res['n_step'],res['examples_per_sec'],res.get('step_ms_p50',0),res.get('step_ms_p99',0)))
+        for phase in PHASES:
+            print (" %10s: %8.3fs (%5.1f%%)"%(phase,res['%s_sec'%(phase)],100*res['%s_frac'%(phase)]))
+
+    def save(self,_path):
+        with open(_path,'w') as f:
+            json.dump({'summary':self.summary(),'iters':self.iters,
+                       'step_secs':self.step_secs,'costs':self.costs,'traces':self.traces},f)
+
+# Export hook that appends the window stats as json lines (e.g., tailed by a metrics agent)
+def jsonl_exporter(_path):
+    def export(_stats):
+        with open(_path,'a') as f:
+            f.write(json.dumps(_stats)+'\n')
+    return export
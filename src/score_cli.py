@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import argparse
+import resource
+import itertools
+import collections
+import numpy as np
+import multiprocessing
+from mdn_np import MDN_np_class,mog_log_prob,mog_moments,log_softmax
+
+# Bulk scoring of large files without TensorFlow
+#  mog / mog_indep : per-row log_liks under a MoG checkpoint (MoG_class.save)
+#  mdn / mdn_indep : EV, VE, EVs, VEs (and pi, mu, var with --params, log_liks with --y_cols) under
+#                    exported params (export_params) or a checkpoint (MDN_reg_class.save); normalizers
+#                    stored with the model (util.nzrs_to_dict) are applied, so inputs and outputs
+#                    are in the original units
+#  Input: '.npy' (memory-mapped), raw binary (--raw_dtype/--n_col, memory-mapped) or CSV (streamed).
+#  Chunks are scored on a process pool with a bounded number of chunks in flight, and every
+#  output column is written in input order to its own '.npy' in --out_dir as the chunks complete.
+#  Memory use is bounded by --chunk_size*(--n_proc*2) rows, independent of the file size.
+MODEL_TYPES = ['mog','mog_indep','mdn','mdn_indep']
+
+# Parameters of a MoG checkpoint from the reparameterized variables (sums of the *_mtx rows)
+def load_mog(_path):
+    with np.load(_path) as npz:
+        pi_logits = np.sum(npz['pi_mtx'],axis=0) # [k] or [x_dim x k]
+        mu = np.sum(npz['mu_mtx'],axis=0) # [x_dim x k]
+        var = np.exp(np.sum(npz['logvar_mtx'],axis=0)) # [x_dim x k]
+    return {'log_pi':log_softmax(pi_logits,axis=-1),'mu':mu,'var':var}
+
+# MDN_np_class from exported params or from a checkpoint written by save() ('__nzr__/' keys are kept)
+def load_mdn(_path,_INDEP):
+    with np.load(_path) as npz:
+        params = dict((key,npz[key]) for key in npz.files)
+    if 'n_hid' not in params: # checkpoint: rebuild the export_params header from the hyperparameters
+        hyper = json.loads(str(params['__hyper__']))
+        params = dict((key,val) for key,val in params.items() if not key.startswith('__optm__/'))
+        params.update({'INDEP':_INDEP,'x_dim':hyper['x_dim'],'y_dim':hyper['y_dim'],'k':hyper['k'],
+                       'n_hid':len(hyper['hids']),'sig_max':hyper['sig_max'],'actv':hyper['actv']})
+    return MDN_np_class(params)
+
+def score_mog(_model,_x,_y):
+    p = _model
+    INDEP = (p['log_pi'].ndim == 2)
+    log_liks = mog_log_prob(_x,p['log_pi'],p['mu'],p['var'],_INDEP=INDEP) # [n] or [n x x_dim]
+    return {'log_liks':log_liks.astype(np.float32)}
+
+def score_mdn(_model,_x,_y,_PARAMS=False):
+    pi,mu,var = _model.forward(_x)
+    EVs,VEs = mog_moments(pi,mu,var,_INDEP=_model.INDEP)
+    outs = {'EVs':EVs,'VEs':VEs,'EV':np.sum(EVs,axis=1),'VE':np.sum(VEs,axis=1)}
+    if _PARAMS:
+        outs.update({'pi':pi,'mu':mu,'var':var})
+    if _y is not None:
+        outs['log_liks'] = _model.log_liks(_x,_y)
+    return dict((name,np.asarray(val,dtype=np.float32)) for name,val in outs.items())
+
+# Input readers: chunks are either (start,end) row ranges of a memory map opened in the worker,
+#  or parsed arrays (CSV)
+def open_input(_args):
+    if _args.input.endswith('.npy'):
+        return np.load(_args.input,mmap_mode='r')
+    if _args.raw_dtype is not None:
+        arr = np.memmap(_args.input,dtype=_args.raw_dtype,mode='r')
+        return arr.reshape((-1,_args.n_col))
+    return None # CSV
+
+# Data lines of a CSV: blank and '#' comment lines are not rows (same rule for counting and parsing)
+def is_csv_row(_line):
+    return len(_line.split('#',1)[0].strip()) > 0
+
+def count_csv_rows(_path,_skip):
+    with open(_path) as f:
+        return sum(1 for line in itertools.islice(f,_skip,None) if is_csv_row(line))
+
+def csv_chunks(_path,_chunk_size,_skip,_delimiter):
+    with open(_path) as f:
+        rows = (line for line in itertools.islice(f,_skip,None) if is_csv_row(line))
+        start = 0
+        while True:
+            lines = list(itertools.islice(rows,_chunk_size))
+            if len(lines) == 0:
+                break
+            data = np.loadtxt(lines,delimiter=_delimiter,dtype=np.float32,ndmin=2)
+            yield start,start+data.shape[0],data
+            start += data.shape[0]
+
+# Worker state (one model per process)
+_WORKER = {}
+
+def init_worker(_args):
+    os.environ['OMP_NUM_THREADS'] = '1'
+    _WORKER['args'] = _args
+    if _args.model.startswith('mog'):
+        _WORKER['model'],_WORKER['func'] = load_mog(_args.path),score_mog
+    else:
+        _WORKER['model'] = load_mdn(_args.path,_INDEP=(_args.model=='mdn_indep'))
+        _WORKER['func'] = lambda M,x,y:score_mdn(M,x,y,_PARAMS=_args.params)
+    _WORKER['data'] = open_input(_args)
+
+def score_chunk(_task):
+    start,end,data = _task
+    args = _WORKER['args']
+    if data is None:
+        data = _WORKER['data'][start:end]
+    data = np.asarray(data,dtype=np.float32)
+    x = data[:,args.x_cols] if args.x_cols is not None else data
+    y = data[:,args.y_cols] if args.y_cols is not None else None
+    return start,end,_WORKER['func'](_WORKER['model'],x,y)
+
+def peak_rss_mb():
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return self_kb/1024.0,child_kb/1024.0 # Linux reports KB
+
+def run(_args):
+    if not os.path.exists(_args.out_dir):
+        os.makedirs(_args.out_dir)
+    data = open_input(_args)
+    if data is not None:
+        n = data.shape[0]
+        tasks = ((start,min(start+_args.chunk_size,n),None) for start in range(0,n,_args.chunk_size))
+    else:
+        n = count_csv_rows(_args.input,_args.skip_rows)
+        tasks = csv_chunks(_args.input,_args.chunk_size,_args.skip_rows,_args.delimiter)
+    del data
+    outs = {} # column name -> open_memmap, created from the first result
+    t_start = time.time()
+    n_done = 0
+    def write(_start,_end,_res):
+        for name,val in _res.items():
+            if name not in outs:
+                outs[name] = np.lib.format.open_memmap(os.path.join(_args.out_dir,'%s.npy'%(name)),
+                                                       mode='w+',dtype=val.dtype,shape=(n,)+val.shape[1:])
+            outs[name][_start:_end] = val
+    if _args.n_proc <= 1:
+        init_worker(_args)
+        for task in tasks:
+            start,end,res = score_chunk(task)
+            write(start,end,res)
+            n_done += end-start
+    else:
+        ctx = multiprocessing.get_context('spawn')
+        pool = ctx.Pool(processes=_args.n_proc,initializer=init_worker,initargs=(_args,))
+        pending = collections.deque() # results in input order, at most 2*n_proc chunks in flight
+        try:
+            for task in tasks:
+                pending.append(pool.apply_async(score_chunk,(task,)))
+                if len(pending) >= 2*_args.n_proc:
+                    start,end,res = pending.popleft().get()
+                    write(start,end,res)
+                    n_done += end-start
+            while len(pending) > 0:
+                start,end,res = pending.popleft().get()
+                write(start,end,res)
+                n_done += end-start
+        finally:
+            pool.close()
+            pool.join()
+    for out in outs.values():
+        out.flush()
+    if n_done != n:
+        raise RuntimeError('scored %d rows but the input has %d, outputs in [%s] are incomplete'%
+                           (n_done,n,_args.out_dir))
+    sec = time.time()-t_start
+    self_mb,child_mb = peak_rss_mb()
+    print ("scored %d rows in %.2fs (%.0f rows/sec), columns:%s -> [%s]"%
+           (n_done,sec,n_done/max(sec,1e-12),sorted(outs.keys()),_args.out_dir))
+    print ("peak rss: main %.1fMB / largest worker %.1fMB"%(self_mb,child_mb))
+    return n_done
+
+def parse_cols(_str):
+    return None if _str is None else [int(c) for c in _str.split(',')]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score large files with a saved MoG / MDN model')
+    parser.add_argument('--model',required=True,choices=MODEL_TYPES)
+    parser.add_argument('--path',required=True,help='checkpoint (save) or exported params (MDN)')
+    parser.add_argument('--input',required=True,help='.npy, raw binary (with --raw_dtype) or CSV')
+    parser.add_argument('--out_dir',default='scores')
+    parser.add_argument('--x_cols',type=parse_cols,default=None,help='e.g., 0,1 (default: all columns)')
+    parser.add_argument('--y_cols',type=parse_cols,default=None,help='MDN targets for log_liks')
+    parser.add_argument('--params',action='store_true',help='also write pi, mu, var (MDN)')
+    parser.add_argument('--chunk_size',type=int,default=65536)
+    parser.add_argument('--n_proc',type=int,default=1)
+    parser.add_argument('--raw_dtype',default=None)
+    parser.add_argument('--n_col',type=int,default=None)
+    parser.add_argument('--delimiter',default=',')
+    parser.add_argument('--skip_rows',type=int,default=0)
+    args = parser.parse_args()
+    run(args)
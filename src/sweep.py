@@ -0,0 +1,190 @@
+import os
+import csv
+import json
+import time
+import shutil
+import argparse
+import itertools
+import numpy as np
+import multiprocessing
+
+# Hyperparameter sweep runner: one worker process (own graph and session) per configuration
+#  Search space: {name:[values]} for grid search; for random search a value can also be
+#  ('uniform',lo,hi), ('log_uniform',lo,hi) or ('int',lo,hi) (inclusive), lists are sampled uniformly.
+MODEL_NAMES = ['MDN_reg_class','MDN_reg_indep_class','MoG_class','MoG_indep_class']
+THREAD_ENV_KEYS = ['OMP_NUM_THREADS','MKL_NUM_THREADS','OPENBLAS_NUM_THREADS']
+
+def grid_configs(_space):
+    names = sorted(_space.keys())
+    return [dict(zip(names,vals)) for vals in itertools.product(*[_space[name] for name in names])]
+
+def sample_value(_spec,_rng):
+    if isinstance(_spec,tuple):
+        kind,lo,hi = _spec
+        if kind == 'uniform':
+            return float(_rng.uniform(lo,hi))
+        if kind == 'log_uniform':
+            return float(np.exp(_rng.uniform(np.log(lo),np.log(hi))))
+        if kind == 'int':
+            return int(_rng.randint(lo,hi+1))
+        raise ValueError('unknown search space type [%s]'%(kind))
+    return _spec[_rng.randint(len(_spec))]
+
+def random_configs(_space,_n_config,_seed=0):
+    rng = np.random.RandomState(_seed)
+    names = sorted(_space.keys())
+    return [dict((name,sample_value(_space[name],rng)) for name in names) for _ in range(_n_config)]
+
+# Pin the thread pools of a worker before TensorFlow (and the BLAS) get imported
+def init_worker(_n_thread):
+    for key in THREAD_ENV_KEYS:
+        os.environ[key] = str(_n_thread)
+
+def open_data(_data):
+    if isinstance(_data,str):
+        return np.load(_data,mmap_mode='r')
+    return _data
+
+# Train and score one configuration (runs inside a worker process); a failing configuration
+#  becomes a row with log_lik nan and the error instead of aborting the sweep
+def run_config(_args):
+    t_start = time.time()
+    try:
+        return train_config(_args)
+    except Exception as e:
+        return {'run':_args[0],'log_lik':float('nan'),'time':time.time()-t_start,'ckpt':'',
+                'config':json.dumps(_args[2]),'error':'%s: %s'%(type(e).__name__,e)}
+
+# Reject a bad configuration or mismatched data before building a graph
+def check_config(_model_name,_config,_x_train,_y_train,_x_val,_y_val):
+    k = _config.get('k',5)
+    if (not isinstance(k,(int,np.integer))) or (k < 1):
+        raise ValueError('k must be a positive integer, got [%r]'%(k,))
+    arrays = [('x_train',_x_train),('x_val',_x_val)]
+    if _model_name.startswith('MDN'):
+        arrays += [('y_train',_y_train),('y_val',_y_val)]
+    for name,arr in arrays:
+        if arr is None:
+            raise ValueError('%s is missing'%(name))
+    checks = [('x_train','x_val',_x_train.shape[1],_x_val.shape[1])] # input dims
+    if _model_name.startswith('MDN'):
+        checks += [('y_train','y_val',_y_train.shape[1],_y_val.shape[1]), # output dims
+                   ('x_train','y_train',_x_train.shape[0],_y_train.shape[0]), # rows
+                   ('x_val','y_val',_x_val.shape[0],_y_val.shape[0])]
+    for name_a,name_b,size_a,size_b in checks:
+        if size_a != size_b:
+            raise ValueError('%s and %s do not match: %d vs %d'%(name_a,name_b,size_a,size_b))
+
+def train_config(_args):
+    run_idx,model_name,config,data,n_thread,out_dir,seed = _args
+    x_train,y_train,x_val,y_val = [open_data(d) if d is not None else None for d in data]
+    check_config(model_name,config,x_train,y_train,x_val,y_val)
+    import tensorflow as tf
+    import mdn_class,mog_class
+    from util import cpu_sess
+    config = dict(config)
+    t_start = time.time()
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.set_random_seed(seed+run_idx)
+        np.random.seed(seed+run_idx)
+        sess = cpu_sess(_n_intra=n_thread,_n_inter=1,_graph=graph)
+        if model_name.startswith('MDN'):
+            cls = getattr(mdn_class,model_name)
+            M = cls(_name='mdn',_x_dim=x_train.shape[1],_y_dim=y_train.shape[1],
+                    _k=config.get('k',5),_hids=config.get('hids',[32,32]),
+                    _actv=mdn_class.get_actv(config.get('actv','tanh')),
+                    _sig_max=config.get('sig_max',0),_SCHEDULE_SIG_MAX=config.get('SCHEDULE_SIG_MAX',False),
+                    _l2_reg_coef=config.get('l2_reg_coef',1e-3),_VECTORIZED=config.get('VECTORIZED',True),
+                    _sess=sess,_VERBOSE=False)
+            M.train(_x_train=x_train,_y_train=y_train,_max_iter=config.get('max_iter',10000),
+                    _batch_size=config.get('batch_size',256),_PLOT=False,_n_prefetch=0)
+            log_lik = M.eval_log_lik(x_val,y_val)
+        else:
+            cls = getattr(mog_class,model_name)
+            M = cls(_name='mog',_x_dim=x_train.shape[1],_k=config.get('k',5),_sess=sess)
+            M.fit_em(x_train,_max_iter=config.get('max_iter',100),_n_restart=config.get('n_restart',3),
+                     _seed=seed+run_idx)
+            log_lik = M.eval_log_lik(x_val)
+        ckpt_path = os.path.join(out_dir,'run_%04d.npz'%(run_idx))
+        M.save(ckpt_path)
+        sess.close()
+    return {'run':run_idx,'log_lik':float(log_lik),'time':time.time()-t_start,
+            'ckpt':ckpt_path,'config':json.dumps(config),'error':''}
+
+# Finite log likelihoods first (best first), then diverged (nan/inf) and failed runs
+def rank_rows(_rows):
+    return sorted(_rows,key=lambda row:(not np.isfinite(row['log_lik']),
+                                        -row['log_lik'] if np.isfinite(row['log_lik']) else 0.0,row['run']))
+
+# Run a sweep and write results.csv (sorted by held-out log likelihood) and best.npz to _out_dir
+#  best.npz is the best run with a finite log likelihood (not written if there is none)
+#  _data: (x_train,y_train,x_val,y_val) as arrays or '.npy' paths (MoG models: y_* are None)
+#  _n_worker*_n_thread should not exceed the number of cores
+def run_sweep(_model_name,_space,_data,_out_dir,_mode='grid',_n_config=20,_n_worker=None,
+              _n_thread=1,_KEEP_ALL=False,_seed=0,_VERBOSE=True):
+    assert _model_name in MODEL_NAMES, 'unknown model [%s]'%(_model_name)
+    if not os.path.exists(_out_dir):
+        os.makedirs(_out_dir)
+    if _mode == 'grid':
+        configs = grid_configs(_space)
+    else:
+        configs = random_configs(_space,_n_config,_seed=_seed)
+    if _n_worker is None:
+        _n_worker = max(1,multiprocessing.cpu_count()//_n_thread)
+    args = [(run_idx,_model_name,config,_data,_n_thread,_out_dir,_seed)
+            for run_idx,config in enumerate(configs)]
+    ctx = multiprocessing.get_context('spawn') # fresh interpreter, no TF state inherited
+    rows = []
+    pool = ctx.Pool(processes=_n_worker,initializer=init_worker,initargs=(_n_thread,),maxtasksperchild=1)
+    try:
+        for row in pool.imap_unordered(run_config,args):
+            rows.append(row)
+            if _VERBOSE:
+                print ("[%d/%d] run:%d log_lik:%.4f time:%.1fs config:%s%s"%
+                       (len(rows),len(args),row['run'],row['log_lik'],row['time'],row['config'],
+                        ' error:%s'%(row['error']) if row['error'] else ''))
+    finally:
+        pool.close()
+        pool.join()
+    rows = rank_rows(rows)
+    with open(os.path.join(_out_dir,'results.csv'),'w') as f:
+        writer = csv.DictWriter(f,fieldnames=['run','log_lik','time','ckpt','config','error'])
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+    if (len(rows) > 0) and np.isfinite(rows[0]['log_lik']):
+        shutil.copyfile(rows[0]['ckpt'],os.path.join(_out_dir,'best.npz'))
+    elif _VERBOSE:
+        print ("no run finished with a finite log_lik, best.npz not written")
+    if not _KEEP_ALL:
+        for row in rows:
+            if row['ckpt'] and os.path.exists(row['ckpt']):
+                os.remove(row['ckpt'])
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep for the MDN / MoG classes')
+    parser.add_argument('--model',default='MDN_reg_class',choices=MODEL_NAMES)
+    parser.add_argument('--space',required=True,help='json search space, e.g., {"k":[5,10,20],"hids":[[64,64]]}')
+    parser.add_argument('--x_train',required=True)
+    parser.add_argument('--y_train',default=None)
+    parser.add_argument('--x_val',required=True)
+    parser.add_argument('--y_val',default=None)
+    parser.add_argument('--out_dir',default='sweep_out')
+    parser.add_argument('--mode',default='grid',choices=['grid','random'])
+    parser.add_argument('--n_config',type=int,default=20)
+    parser.add_argument('--n_worker',type=int,default=None)
+    parser.add_argument('--n_thread',type=int,default=1)
+    parser.add_argument('--keep_all',action='store_true')
+    parser.add_argument('--seed',type=int,default=0)
+    args = parser.parse_args()
+    space = json.loads(args.space)
+    space = dict((key,tuple(val) if (isinstance(val,list) and len(val)==3 and isinstance(val[0],str)
+                                     and val[0] in ['uniform','log_uniform','int']) else val)
+                 for key,val in space.items())
+    rows = run_sweep(args.model,space,(args.x_train,args.y_train,args.x_val,args.y_val),args.out_dir,
+                     _mode=args.mode,_n_config=args.n_config,_n_worker=args.n_worker,
+                     _n_thread=args.n_thread,_KEEP_ALL=args.keep_all,_seed=args.seed)
+    if (len(rows) > 0) and np.isfinite(rows[0]['log_lik']):
+        print ("best run:%d log_lik:%.4f config:%s"%(rows[0]['run'],rows[0]['log_lik'],rows[0]['config']))
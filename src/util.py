@@ -1,52 +1,196 @@
+import os
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-import tensorflow as tf
-
-def plot_1d_graphs(_x1_list,_y1_list,_linestyles1,_markers1,_colors1,
-                   _x2_list=None,_y2_list=None,_linestyles2=None,_markers2=None,_colors2=None,
-                   _nR=1,_nC=10,_figsize=(15,2),
-                   _title=None,_titles=None,_tfs=15,
-                   _wspace=0.05,_hspace=0.05):
-    nr,nc = _nR,_nC
-    fig = plt.figure(figsize=_figsize)
-    if _title is not None:
-        fig.suptitle(_title, size=15)
-    gs  = gridspec.GridSpec(nr,nc)
-    gs.update(wspace=_wspace, hspace=_hspace)
-    for i in range(_nR*_nC):
-        ax = plt.subplot(gs[i])
-        plt.plot(_x1_list[i],_y1_list[i],
-                 linestyle=_linestyles1[i],marker=_markers1[i],color=_colors1[i])
-        if _x2_list is not None:
-            plt.plot(_x2_list[i],_y2_list[i],
-                     linestyle=_linestyles2[i],marker=_markers2[i],color=_colors2[i])
-        if _titles is not None:
-            plt.title(_titles[i],size=_tfs)
-    plt.show() 
+
+# Plotting lives in plot_util (imported lazily so that util stays free of matplotlib)
+def plot_1d_graphs(*args,**kwargs):
+    from plot_util import plot_1d_graphs as _plot_1d_graphs
+    _plot_1d_graphs(*args,**kwargs)
+    
+    
+# Mean of _log_liks over the rows of the arrays in _data_dict ({placeholder:array}), in chunks
+def eval_log_lik(_sess,_log_liks,_data_dict,_batch_size=8192,_feed_dict={}):
+    n = list(_data_dict.values())[0].shape[0]
+    sum_log_lik,cnt = 0.0,0
+    for start in range(0,n,_batch_size):
+        feed_dict = dict(_feed_dict)
+        for ph,data in _data_dict.items():
+            feed_dict[ph] = data[start:start+_batch_size]
+        log_liks = _sess.run(_log_liks,feed_dict=feed_dict)
+        sum_log_lik += np.sum(log_liks,dtype=np.float64)
+        cnt += log_liks.size
+    return sum_log_lik/cnt
+    
+    
+# Patience-based early stopping on a validation score (higher is better, e.g., mean log likelihood)
+#  update() returns (IMPROVED,STOP); snapshots of the best weights are kept by the caller
+class early_stopping_class(object):
+    def __init__(self,_patience=None,_min_delta=0.0):
+        self.patience = _patience # number of evaluations without improvement (None: never stop)
+        self.min_delta = _min_delta
+        self.best_val,self.best_iter = -np.inf,None
+        self.n_bad = 0
+        self.hist = [] # (iter,val)
+    def update(self,_iter,_val):
+        self.hist.append((_iter,float(_val)))
+        if _val > self.best_val+self.min_delta:
+            self.best_val,self.best_iter = float(_val),_iter
+            self.n_bad = 0
+            return True,False
+        self.n_bad += 1
+        return False,(self.patience is not None) and (self.n_bad >= self.patience)
     
     
 def gpu_sess(): 
+    import tensorflow as tf
     config = tf.ConfigProto(); 
     config.gpu_options.allow_growth=True
     sess = tf.Session(config=config)
     return sess    
 
 
+# Session for CPU-only boxes with explicit thread pools and graph optimization options
+#  _n_intra/_n_inter: intra-op / inter-op thread pool sizes (0: TF default, i.e., all cores)
+#  _XLA: JIT-compile the graph with XLA / _opt_level: 'L0' (no) or 'L1' (default) graph optimizer
+#  _cores: pin this process to the given core ids (Linux only) before the pools are created
+def cpu_sess(_n_intra=0,_n_inter=0,_XLA=False,_opt_level='L1',_cores=None,_graph=None,_CPU_ONLY=True):
+    import tensorflow as tf
+    if _cores is not None:
+        os.sched_setaffinity(0,_cores)
+    config = tf.ConfigProto(intra_op_parallelism_threads=_n_intra,
+                            inter_op_parallelism_threads=_n_inter)
+    if _CPU_ONLY:
+        config.device_count['GPU'] = 0
+    optimizer_options = config.graph_options.optimizer_options
+    optimizer_options.opt_level = getattr(tf.OptimizerOptions,_opt_level)
+    if _XLA:
+        optimizer_options.global_jit_level = tf.OptimizerOptions.ON_1
+    sess = tf.Session(graph=_graph,config=config)
+    return sess
+
+
+# One-pass (streaming) normalizer: mean/std by Welford updates per chunk, mergeable across
+#  chunks and processes (Chan et al.), without holding the data
+#  mu/std come out in the dtype of the data (float64 for non-float data), as np.mean/np.std do
+class nzr_stream(object):
+    def __init__(self,_eps=1e-8):
+        self.eps = _eps
+        self.n = 0
+        self.mean = None # float64 running mean
+        self.m2 = None # float64 running sum of squared deviations
+        self.dtype = None # dtype of mu/std
+
+    def partial_fit(self,_data):
+        data = np.asarray(_data)
+        n_b = data.shape[0]
+        if n_b == 0:
+            return self
+        mean_b = np.mean(data,axis=0,dtype=np.float64)
+        m2_b = np.sum(np.square(data-mean_b),axis=0,dtype=np.float64)
+        dtype = data.dtype if np.issubdtype(data.dtype,np.floating) else np.dtype(np.float64)
+        return self._merge_stats(n_b,mean_b,m2_b,dtype)
+
+    def _merge_stats(self,_n,_mean,_m2,_dtype):
+        self.dtype = _dtype if self.dtype is None else np.promote_types(self.dtype,_dtype)
+        if self.n == 0:
+            self.n,self.mean,self.m2 = _n,np.array(_mean,dtype=np.float64),np.array(_m2,dtype=np.float64)
+            return self
+        n = self.n+_n
+        delta = _mean-self.mean
+        self.mean = self.mean+delta*(_n/float(n))
+        self.m2 = self.m2+_m2+np.square(delta)*(self.n*_n/float(n))
+        self.n = n
+        return self
+
+    def merge(self,_other):
+        if _other.n == 0:
+            return self
+        return self._merge_stats(_other.n,_other.mean,_other.m2,_other.dtype)
+
+    # One pass over an array or memory map in chunks
+    def fit(self,_data,_chunk_size=100000):
+        for start in range(0,_data.shape[0],_chunk_size):
+            self.partial_fit(_data[start:start+_chunk_size])
+        return self
+
+    @property
+    def mu(self):
+        if self.n == 0:
+            raise ValueError('nzr_stream has no data (call fit or partial_fit first)')
+        return self.mean.astype(self.dtype)
+
+    @property
+    def std(self):
+        if self.n == 0:
+            raise ValueError('nzr_stream has no data (call fit or partial_fit first)')
+        return np.sqrt(self.m2/max(self.n,1)).astype(self.dtype) # same as np.std (ddof=0)
+
+    # Normalize with broadcasting; pass _out=_data to normalize in place
+    def get_nzdval(self,_data,_out=None):
+        out = np.subtract(_data,self.mu,out=_out)
+        return np.divide(out,self.std+self.eps,out=out)
+
+    def get_orgval(self,_data,_out=None):
+        out = np.multiply(_data,self.std+self.eps,out=_out)
+        return np.add(out,self.mu,out=out)
+
+    # Normalize chunk by chunk (e.g., from a memory map); yields (start,end,normalized chunk)
+    def nzd_chunks(self,_data,_chunk_size=100000):
+        for start in range(0,_data.shape[0],_chunk_size):
+            chunk = _data[start:start+_chunk_size]
+            yield start,start+chunk.shape[0],self.get_nzdval(chunk)
+
+    # Plain arrays (e.g., to be stored next to the model variables in a checkpoint)
+    def to_dict(self,_prefix=''):
+        return {_prefix+'n':np.array(self.n),_prefix+'mean':self.mean,_prefix+'m2':self.m2,
+                _prefix+'eps':np.array(self.eps),_prefix+'dtype':np.array(np.dtype(self.dtype).str)}
+
+    @classmethod
+    def from_dict(cls,_dict,_prefix=''):
+        N = cls(_eps=float(_dict[_prefix+'eps']))
+        N.n = int(_dict[_prefix+'n'])
+        N.mean = np.asarray(_dict[_prefix+'mean'],dtype=np.float64)
+        N.m2 = np.asarray(_dict[_prefix+'m2'],dtype=np.float64)
+        N.dtype = np.dtype(str(_dict[_prefix+'dtype'])) if (_prefix+'dtype') in _dict else np.dtype(np.float64)
+        return N
+
+    def save(self,_path):
+        np.savez(_path,**self.to_dict())
+
+    @classmethod
+    def load(cls,_path):
+        with np.load(_path) as npz:
+            return cls.from_dict(npz)
+
+# Normalizers attached to a model (_M.nzrs = {'x':nzr_stream,'y':...}) are saved with its checkpoints
+NZR_PREFIX = '__nzr__/'
+
+def nzrs_to_dict(_nzrs):
+    arrays = {}
+    for name,N in _nzrs.items():
+        arrays.update(N.to_dict(_prefix='%s%s/'%(NZR_PREFIX,name)))
+    return arrays
+
+def nzrs_from_dict(_dict):
+    names = set(key[len(NZR_PREFIX):].split('/')[0] for key in _dict.keys() if key.startswith(NZR_PREFIX))
+    return dict((name,nzr_stream.from_dict(_dict,_prefix='%s%s/'%(NZR_PREFIX,name))) for name in names)
+
+
+# Normalizer over an in-memory array (statistics from nzr_stream; the data is not copied)
 class nzr(object):
     def __init__(self,_rawdata,_eps=1e-8):
         self.rawdata = _rawdata
         self.eps     = _eps
-        self.mu      = np.mean(self.rawdata,axis=0)
-        self.std     = np.std(self.rawdata,axis=0)
+        self.stats   = nzr_stream(_eps=_eps).fit(_rawdata)
+        self.mu      = self.stats.mu
+        self.std     = self.stats.std
         self.nzd_data = self.get_nzdval(self.rawdata)
-        self.org_data = self.get_orgval(self.nzd_data)
-        self.maxerr = np.max(self.rawdata-self.org_data)
+    @property
+    def org_data(self):
+        return self.get_orgval(self.nzd_data)
+    @property
+    def maxerr(self):
+        return np.max(self.rawdata-self.org_data)
     def get_nzdval(self,_data):
-        _n = _data.shape[0]
-        _nzddata = (_data - np.tile(self.mu,(_n,1))) / np.tile(self.std+self.eps,(_n,1))
-        return _nzddata
+        return (_data-self.mu)/(self.std+self.eps)
     def get_orgval(self,_data):
-        _n = _data.shape[0]
-        _orgdata = _data*np.tile(self.std+self.eps,(_n,1))+np.tile(self.mu,(_n,1))
-        return _orgdata
\ No newline at end of file
+        return _data*(self.std+self.eps)+self.mu
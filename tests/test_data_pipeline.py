@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from data_pipeline import batch_loader_class
+
+def epoch_rows(_loader,_n_batch):
+    return np.concatenate([_loader.next_batch()[0][:,0] for _ in range(_n_batch)])
+
+@pytest.mark.parametrize('block_size',[None,20])
+@pytest.mark.parametrize('n_prefetch',[0,2])
+def test_full_epoch(block_size,n_prefetch):
+    x = np.arange(100,dtype=np.float32).reshape((100,1))
+    y = 2*x
+    loader = batch_loader_class([x,y],_batch_size=10,_block_size=block_size,_n_prefetch=n_prefetch,_seed=0)
+    try:
+        for _ in range(2): # every row exactly once per epoch, reshuffled between epochs
+            rows = epoch_rows(loader,10)
+            assert np.array_equal(np.sort(rows),x[:,0])
+        x_batch,y_batch = loader.next_batch()
+        assert np.array_equal(y_batch,2*x_batch)
+    finally:
+        loader.close()
+
+def test_producer_error_is_raised():
+    x = np.arange(20,dtype=np.float32).reshape((10,2))
+    loader = batch_loader_class([x],_batch_size=5,_n_prefetch=2,_seed=0)
+    try:
+        loader.arrays[0] = None # reads fail from the next epoch on
+        with pytest.raises(TypeError):
+            for _ in range(10):
+                loader.next_batch()
+        with pytest.raises(TypeError):
+            loader.next_batch()
+    finally:
+        loader.close()
+
+@pytest.mark.parametrize('SHUFFLE',[True,False])
+def test_block_mode_reaches_tail_rows(SHUFFLE):
+    x = np.arange(105,dtype=np.float32).reshape((105,1)) # 5 rows beyond the last full batch
+    loader = batch_loader_class([x],_batch_size=10,_block_size=30,_SHUFFLE=SHUFFLE,_n_prefetch=0,_seed=0)
+    seen = np.concatenate([epoch_rows(loader,10) for _ in range(30)]) # 10 full batches per epoch
+    assert np.array_equal(np.unique(seen),x[:,0])
@@ -0,0 +1,12 @@
+import pytest
+tf = pytest.importorskip('tensorflow')
+from mdn_class import MDN_reg_class,MDN_reg_indep_class,compare_heads
+
+# The vectorized log-sum-exp head gives the same log_liks/EVs/VEs as the tfd.Mixture head
+@pytest.mark.parametrize('cls',[MDN_reg_class,MDN_reg_indep_class])
+@pytest.mark.parametrize('k',[1,5,20])
+def test_vectorized_head_matches_mixture_head(cls,k):
+    err_log_liks,err_EVs,err_VEs = compare_heads(cls,k)
+    assert err_log_liks < 1e-4
+    assert err_EVs < 1e-5
+    assert err_VEs < 1e-5
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from mdn_np import MDN_np_class,random_params
+from util import nzr_stream,nzrs_to_dict
+
+def direct_mixture(_M,_x):
+    pi,mu,var = _M.forward(_x)
+    if not _M.INDEP:
+        pi = np.tile(pi[:,np.newaxis,:],(1,_M.y_dim,1)) # [n x y_dim x k]
+    return pi.astype(np.float64),mu.astype(np.float64),var.astype(np.float64)
+
+# log_liks / moments against a direct (non-log-space) evaluation of the same mixture
+def test_log_liks_and_moments_direct():
+    M = MDN_np_class(random_params(_x_dim=2,_y_dim=2,_k=5,_hids=[16,16]))
+    rng = np.random.RandomState(0)
+    x = rng.randn(200,2).astype(np.float32)
+    y = rng.randn(200,2).astype(np.float32)
+    pi,mu,var = direct_mixture(M,x)
+    dens = np.exp(-0.5*np.square(y[:,:,np.newaxis]-mu)/var)/np.sqrt(2*np.pi*var) # [n x y_dim x k]
+    log_liks = np.log(np.sum(pi[:,0,:]*np.prod(dens,axis=1),axis=1)) # joint mixture
+    np.testing.assert_allclose(M.log_liks(x,y),log_liks,rtol=1e-4,atol=1e-4)
+    mean = np.sum(pi*mu,axis=2)
+    EVs,VEs = M.moments(x)
+    np.testing.assert_allclose(EVs,np.sum(pi*var,axis=2),rtol=1e-4)
+    np.testing.assert_allclose(VEs,np.sum(pi*np.square(mu-mean[:,:,np.newaxis]),axis=2),rtol=1e-4,atol=1e-6)
+
+# The NumPy engine matches the TensorFlow session path within float32 tolerance
+@pytest.mark.parametrize('cls_name',['MDN_reg_class','MDN_reg_indep_class'])
+def test_matches_tf(tmp_path,cls_name):
+    tf = pytest.importorskip('tensorflow')
+    import mdn_class
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.set_random_seed(0)
+        sess = tf.Session(graph=graph)
+        M = getattr(mdn_class,cls_name)(_name='mdn',_x_dim=1,_y_dim=2,_k=10,_hids=[32,32],
+                                          _sig_max=1.0,_sess=sess,_VERBOSE=False)
+        rng = np.random.RandomState(0)
+        for var in M.c_vars: # away from the initialization, so that the comparison is not trivial
+            var.load(sess.run(var)+0.3*rng.randn(*var.get_shape().as_list()),sess)
+        path = str(tmp_path/'params.npz')
+        M.export_params(_path=path)
+        x = rng.randn(1000,1).astype(np.float32)
+        y = rng.randn(1000,2).astype(np.float32)
+        log_liks,EVs,VEs = sess.run([M.log_liks,M.EVs,M.VEs],feed_dict={M.x:x,M.y:y,M.sig_rate:1.0})
+        sess.close()
+    M_np = MDN_np_class.load(path)
+    EVs_np,VEs_np = M_np.moments(x)
+    np.testing.assert_allclose(M_np.log_liks(x,y),log_liks,rtol=1e-5,atol=1e-5)
+    np.testing.assert_allclose(EVs_np,EVs,rtol=1e-5,atol=1e-6)
+    np.testing.assert_allclose(VEs_np,VEs,rtol=1e-5,atol=1e-6)
+
+# Exported normalizers: x is normalized on the way in, the mixture is reported in the units of y
+#  and log_liks includes the log-Jacobian of the y normalization
+@pytest.mark.parametrize('INDEP',[False,True])
+def test_normalizers_applied(INDEP):
+    params = random_params(_x_dim=2,_y_dim=2,_k=5,_hids=[16,16],_INDEP=INDEP)
+    rng = np.random.RandomState(0)
+    x = (10.0+5.0*rng.randn(300,2)).astype(np.float32)
+    y = (np.array([-3.0,4.0])+np.array([0.5,20.0])*rng.randn(300,2)).astype(np.float32)
+    N_x,N_y = nzr_stream().fit(x),nzr_stream().fit(y)
+    M_raw = MDN_np_class(params)
+    params.update(nzrs_to_dict({'x':N_x,'y':N_y}))
+    M = MDN_np_class(params)
+    x_nzd,y_nzd = N_x.get_nzdval(x),N_y.get_nzdval(y)
+    scale = N_y.std+N_y.eps
+    pi_raw,mu_raw,var_raw = M_raw.forward(x_nzd)
+    pi,mu,var = M.forward(x)
+    np.testing.assert_allclose(pi,pi_raw,rtol=1e-5,atol=1e-6)
+    np.testing.assert_allclose(mu,mu_raw*scale[:,np.newaxis]+N_y.mu[:,np.newaxis],rtol=1e-4,atol=1e-4)
+    np.testing.assert_allclose(var,var_raw*np.square(scale)[:,np.newaxis],rtol=1e-4)
+    log_jac = -np.log(scale) if INDEP else -np.sum(np.log(scale))
+    np.testing.assert_allclose(M.log_liks(x,y),M_raw.log_liks(x_nzd,y_nzd)+log_jac,rtol=1e-4,atol=1e-4)
+    samples = M.sample(x,_rng=np.random.RandomState(1),_n_sample=200) # [n x S x y_dim]
+    mean = np.mean(np.sum((pi if INDEP else pi[:,np.newaxis,:])*mu,axis=2),axis=0) # [y_dim]
+    assert np.all(np.abs(np.mean(samples,axis=(0,1))-mean)/scale < 0.02)
+
+# retained_mass and per-call _top_m leave the model's top-m mode alone (safe to share across threads)
+def test_top_m_per_call():
+    params = random_params(_x_dim=2,_y_dim=2,_k=6,_hids=[16])
+    M,M_full = MDN_np_class(params,_top_m=2),MDN_np_class(params)
+    x = np.random.RandomState(0).randn(100,2).astype(np.float32)
+    pi_full = M_full.forward(x)[0]
+    np.testing.assert_allclose(M.retained_mass(x),np.sum(np.sort(pi_full,axis=-1)[:,-2:],axis=-1),rtol=1e-5)
+    np.testing.assert_allclose(M.retained_mass(x,_top_m=6),1.0)
+    assert M.top_m == 2
+    assert M.forward(x)[0].shape == (100,2)
+    np.testing.assert_allclose(M.forward(x,_top_m=6)[0],pi_full)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(4) as pool:
+        futs = [pool.submit(M.retained_mass if i%2 else M.forward,x) for i in range(40)]
+        shapes = [fut.result()[0].shape for i,fut in enumerate(futs) if i%2 == 0]
+    assert all(shape == (100,2) for shape in shapes)
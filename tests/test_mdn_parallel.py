@@ -0,0 +1,33 @@
+import time
+import multiprocessing
+import pytest
+from mdn_parallel import get_result
+
+def crash():
+    raise SystemExit(3)
+
+def test_dead_worker_raises():
+    ctx = multiprocessing.get_context('fork')
+    out_queue = ctx.Queue()
+    proc = ctx.Process(target=crash)
+    proc.start()
+    with pytest.raises(RuntimeError,match='exited with code 3'):
+        get_result(out_queue,[proc],_poll=0.1)
+
+def test_timeout_raises():
+    ctx = multiprocessing.get_context('fork')
+    out_queue = ctx.Queue()
+    proc = ctx.Process(target=time.sleep,args=(30,))
+    proc.start()
+    try:
+        with pytest.raises(RuntimeError,match='no worker result'):
+            get_result(out_queue,[proc],_timeout=0.3,_poll=0.1)
+    finally:
+        proc.terminate()
+        proc.join()
+
+def test_result_is_returned():
+    ctx = multiprocessing.get_context('fork')
+    out_queue = ctx.Queue()
+    out_queue.put((0,'grads'))
+    assert get_result(out_queue,[],_poll=0.1) == (0,'grads')
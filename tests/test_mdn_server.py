@@ -0,0 +1,20 @@
+import asyncio
+import numpy as np
+from mdn_server import micro_batcher_class
+
+def test_cache_holds_row_copies():
+    def predict_func(_x): # a large per-batch output, rows are views of it
+        return {'out':np.tile(_x,(1,1000))}
+    async def run():
+        batcher = micro_batcher_class(predict_func,2,_max_batch=8,_max_wait=0.01,_cache_size=4)
+        await batcher.start()
+        x = np.random.randn(8,2).astype(np.float32)
+        outs = await asyncio.gather(*[batcher.predict(x_row) for x_row in x])
+        hit = await batcher.predict(x[7]) # most recent entry of the LRU
+        await batcher.stop()
+        return batcher,x,outs,hit
+    batcher,x,outs,hit = asyncio.run(run())
+    assert batcher.n_hit == 1
+    assert np.array_equal(hit['out'],outs[7]['out'])
+    for row in batcher.cache.values(): # not views keeping the whole batch output alive
+        assert row['out'].base is None
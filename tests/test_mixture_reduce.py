@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from mdn_np import softmax,mog_moments
+from mixture_reduce import reduce_mixture,to_csr,from_csr
+
+def random_mixture(_INDEP,_n=300,_d=2,_k=12,_seed=0):
+    rng = np.random.RandomState(_seed)
+    logits = 2*rng.randn(_n,_d,_k) if _INDEP else 2*rng.randn(_n,_k)
+    logits[...,:2] = -60 # (near) dead components
+    pi = softmax(logits).astype(np.float32)
+    pi[...,0] = 0.0
+    mu = rng.randn(_n,_d,_k).astype(np.float32)
+    var = np.exp(rng.randn(_n,_d,_k)-1).astype(np.float32)
+    return pi,mu,var
+
+def total_moments(_pi,_mu,_var,_INDEP):
+    pi = _pi.astype(np.float64) if _INDEP else _pi.astype(np.float64)[:,np.newaxis,:]
+    mean = np.sum(pi*_mu,axis=2)
+    EVs,VEs = mog_moments(_pi.astype(np.float64),_mu.astype(np.float64),_var.astype(np.float64),_INDEP=_INDEP)
+    return mean,EVs+VEs
+
+@pytest.mark.parametrize('INDEP',[False,True])
+@pytest.mark.parametrize('k_target,max_kl',[(1,None),(3,None),(1,0.05)])
+def test_mean_and_total_variance_preserved(INDEP,k_target,max_kl):
+    pi,mu,var = random_mixture(INDEP)
+    reduced = reduce_mixture(pi,mu,var,_INDEP=INDEP,_k_target=k_target,_max_kl=max_kl,_batch_size=128)
+    mean,total_var = total_moments(pi,mu,var,INDEP)
+    mean_r,total_var_r = total_moments(reduced['pi'],reduced['mu'],reduced['var'],INDEP)
+    np.testing.assert_allclose(mean_r,mean,rtol=1e-6,atol=1e-6) # float32 outputs
+    np.testing.assert_allclose(total_var_r,total_var,rtol=1e-6,atol=1e-6)
+    np.testing.assert_allclose(np.sum(reduced['pi'],axis=-1),1.0,atol=1e-6)
+    if max_kl is None:
+        assert np.all(reduced['counts'] == k_target)
+    else:
+        assert np.all(reduced['kl'] <= max_kl)
+
+def test_float64_exact():
+    pi,mu,var = [a.astype(np.float64) for a in random_mixture(False)]
+    reduced = reduce_mixture(pi,mu,var,_k_target=2)
+    mean,total_var = total_moments(pi,mu,var,False)
+    mean_r,total_var_r = total_moments(reduced['pi'],reduced['mu'],reduced['var'],False)
+    np.testing.assert_allclose(mean_r,mean,rtol=1e-12,atol=1e-12)
+    np.testing.assert_allclose(total_var_r,total_var,rtol=1e-12,atol=1e-12)
+
+@pytest.mark.parametrize('INDEP',[False,True])
+def test_csr_round_trip(INDEP):
+    pi,mu,var = random_mixture(INDEP)
+    reduced = reduce_mixture(pi,mu,var,_INDEP=INDEP,_k_target=1,_max_kl=0.1)
+    csr = to_csr(reduced,_INDEP=INDEP)
+    assert csr['offsets'][-1] == np.sum(reduced['counts']) == csr['pi'].shape[0]
+    decoded = from_csr(csr,_d=mu.shape[1],_INDEP=INDEP)
+    for key in ['pi','mu','var','counts']:
+        assert np.array_equal(decoded[key],reduced[key])
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from mog_em import fit_em_stream,memmap_spec,e_step
+
+def make_data(_n=3000,_seed=0):
+    rng = np.random.RandomState(_seed)
+    centers = np.array([[-3.0,0.0],[3.0,1.0],[0.0,-4.0]])
+    return (centers[rng.randint(3,size=_n)]+rng.randn(_n,2)).astype(np.float32)
+
+@pytest.mark.parametrize('INDEP',[False,True])
+@pytest.mark.parametrize('source',['path','memmap','memmap_view','array'])
+def test_pool_equals_serial(tmp_path,INDEP,source):
+    x = make_data()
+    path = str(tmp_path/'x.npy')
+    np.save(path,x)
+    data = {'path':path,'memmap':np.load(path,mmap_mode='r'),
+            'memmap_view':np.load(path,mmap_mode='r')[500:],'array':x}[source]
+    kwargs = dict(_k=3,_INDEP=INDEP,_chunk_size=400,_max_iter=5,_seed=1)
+    serial = fit_em_stream(data,_n_proc=1,**kwargs)
+    pooled = fit_em_stream(data,_n_proc=2,**kwargs)
+    for a,b in zip(serial,pooled):
+        assert np.array_equal(np.asarray(a),np.asarray(b))
+
+def test_memmap_spec(tmp_path):
+    path = str(tmp_path/'x.npy')
+    np.save(path,make_data(100))
+    rows = np.load(path,mmap_mode='r')
+    assert isinstance(memmap_spec(rows),tuple)
+    assert not isinstance(memmap_spec(rows[10:]),tuple) # views go through the initializer
+
+# Stepwise online EM ends close to exact EM on the same (shuffled) rows
+@pytest.mark.parametrize('INDEP',[False,True])
+def test_online_close_to_exact(INDEP):
+    x = make_data(20000)
+    def mean_log_lik(_params):
+        return np.mean(e_step(x.astype(np.float64),*_params[:3],_INDEP=INDEP)[1])
+    exact = fit_em_stream(x,3,_INDEP=INDEP,_chunk_size=500,_max_iter=200,_seed=0)
+    online = fit_em_stream(x,3,_INDEP=INDEP,_chunk_size=500,_max_iter=50,_ONLINE=True,_tol=0,_seed=0)
+    assert abs(mean_log_lik(online)-mean_log_lik(exact)) < 2e-3
+
+def test_online_rejects_pool():
+    with pytest.raises(ValueError):
+        fit_em_stream(make_data(),3,_ONLINE=True,_n_proc=2)
@@ -0,0 +1,23 @@
+import argparse
+import numpy as np
+from mdn_np import MDN_np_class,random_params
+from score_cli import count_csv_rows,run
+
+# Blank, whitespace-only and comment lines are not rows: every parsed row gets a score
+def test_csv_with_blank_lines(tmp_path):
+    params = random_params(_x_dim=2,_y_dim=2,_k=3,_hids=[8])
+    path = str(tmp_path/'params.npz')
+    np.savez(path,**params)
+    x = np.random.RandomState(0).randn(7,2).astype(np.float32)
+    lines = ['x0,x1','# comment']+['%r,%r'%(float(a),float(b)) for a,b in x[:3]]+['','   ']+ \
+            ['%r,%r'%(float(a),float(b)) for a,b in x[3:]]+['','']
+    csv_path = str(tmp_path/'x.csv')
+    with open(csv_path,'w') as f:
+        f.write('\n'.join(lines))
+    assert count_csv_rows(csv_path,1) == 7
+    args = argparse.Namespace(model='mdn',path=path,input=csv_path,out_dir=str(tmp_path/'out'),
+                              x_cols=None,y_cols=None,params=False,chunk_size=2,n_proc=1,
+                              raw_dtype=None,n_col=None,delimiter=',',skip_rows=1)
+    assert run(args) == 7
+    EVs = np.load(str(tmp_path/'out'/'EVs.npy'))
+    np.testing.assert_allclose(EVs,MDN_np_class(params).moments(x)[0],rtol=1e-5)
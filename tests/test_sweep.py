@@ -0,0 +1,19 @@
+import numpy as np
+from sweep import rank_rows,run_config
+
+def test_rank_rows_finite_first():
+    rows = [{'run':0,'log_lik':float('nan')},{'run':1,'log_lik':-2.0},{'run':2,'log_lik':1.0},
+            {'run':3,'log_lik':float('inf')}]
+    assert [row['run'] for row in rank_rows(rows)] == [2,1,0,3]
+
+def test_failed_config_is_recorded():
+    x = np.random.randn(50,2).astype(np.float32)
+    data = (x,x[:,:1],x,x[:,:1])
+    row = run_config((7,'MoG_class',{'k':0},data,1,'unused',0)) # invalid k
+    assert row['run'] == 7
+    assert np.isnan(row['log_lik'])
+    assert row['error'] == 'ValueError: k must be a positive integer, got [0]'
+    row = run_config((8,'MDN_reg_class',{'k':2},(x,x[:40],x,x),1,'unused',0)) # 50 x rows, 40 y rows
+    assert row['run'] == 8
+    assert np.isnan(row['log_lik'])
+    assert row['error'] == 'ValueError: x_train and y_train do not match: 50 vs 40'
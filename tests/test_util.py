@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from util import nzr,nzr_stream,nzrs_to_dict,nzrs_from_dict
+
+@pytest.mark.parametrize('dtype',[np.float32,np.float64])
+def test_merge_equals_one_pass(dtype):
+    rng = np.random.RandomState(0)
+    data = (3.0+2.0*rng.randn(1000,3)).astype(dtype)
+    parts = [nzr_stream().partial_fit(chunk) for chunk in np.array_split(data,7)] # e.g., one per process
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.n == 1000
+    assert merged.mu.dtype == dtype
+    np.testing.assert_allclose(merged.mean,np.mean(data.astype(np.float64),axis=0),rtol=1e-12)
+    np.testing.assert_allclose(np.sqrt(merged.m2/merged.n),np.std(data.astype(np.float64),axis=0),rtol=1e-12)
+
+def test_nzr_matches_baseline_float64():
+    rng = np.random.RandomState(1)
+    data = 5.0+rng.randn(500,2)
+    N = nzr(data)
+    assert N.mu.dtype == np.float64
+    assert np.array_equal(N.mu,np.mean(data,axis=0))
+    assert np.array_equal(N.std,np.std(data,axis=0))
+    assert np.array_equal(N.nzd_data,(data-np.mean(data,axis=0))/(np.std(data,axis=0)+1e-8))
+
+def test_dict_round_trip():
+    N = nzr_stream().fit(np.random.randn(100,2).astype(np.float32))
+    N2 = nzrs_from_dict(nzrs_to_dict({'x':N}))['x']
+    assert N2.n == N.n
+    assert N2.mu.dtype == np.float32
+    assert np.array_equal(N2.mu,N.mu) and np.array_equal(N2.std,N.std)
+
+def test_empty_stream_raises():
+    N = nzr_stream().partial_fit(np.zeros((0,2)))
+    with pytest.raises(ValueError,match='no data'):
+        N.mu
+    with pytest.raises(ValueError,match='no data'):
+        N.get_nzdval(np.zeros((3,2)))